@@ -255,8 +255,11 @@ EOF
 # DNS server
 echo "nameserver 8.8.8.8" >${work_dir}/etc/resolv.conf
 
-# Copy directory bsp into build dir.
-cp -rp bsp ${work_dir}
+# Copy directory bsp into build dir, with the firmware from the blob store
+# rather than the store itself (as copy_bsp() in ./common.d/functions.sh).
+mkdir -p "${work_dir}/bsp"
+find bsp -mindepth 1 -maxdepth 1 ! -name blobs -exec cp -rp {} "${work_dir}/bsp/" \;
+python3 ./bin/blob-store.py -m materialise -s bsp -d "${work_dir}/bsp"
 
 export MALLOC_CHECK_=0 # workaround for LP: #520465
 
@@ -186,8 +186,8 @@ mount "${rootp}" "${base_dir}"/root
 mkdir -p "${base_dir}"/root/boot
 mount "${bootp}" "${base_dir}"/root/boot
 
-status "Rsyncing rootfs into image file"
-rsync -HPavz -q --exclude boot "${work_dir}"/ "${base_dir}"/root/
+status "Copying rootfs into image file"
+copy_rootfs "${work_dir}" "${base_dir}"/root boot
 sync
 
 status "Rsyncing rootfs into image file (/boot)"
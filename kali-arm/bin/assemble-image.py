@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to assemble a Kali ARM disk image without loop devices or mounts.
+#
+# This is the "rootless" image backend (image_backend="rootless" in builder.txt).
+# It should be run after the rootfs (work_dir) has been finished and /etc/fstab
+# written, in place of parted/make_loop/mkfs_partitions/mount/rsync.
+#
+# For each partition it:
+# - builds the filesystem straight into a partition image file
+#   (ext2/3/4: mke2fs -d <dir>, vfat: mkfs.vfat -C + mcopy)
+# - checks it (e2fsck/fsck.vfat)
+# Then it writes a MBR (msdos) or GPT partition table into the disk image and
+# splices the partition images in, copying only the allocated extents.
+#
+# The disk image must already exist (see make_image), as "100%" ends are worked
+# out from its size.
+# The filesystem UUIDs are passed in, so /etc/fstab stays as make_fstab wrote it.
+#
+# Partitions are given as comma separated key=value pairs:
+#   name=<name>,fs=<vfat|ext2|ext3|ext4>,start=<offset>,end=<offset>,dir=<path>[,uuid=<uuid>][,label=<label>][,partuuid=<guid>][,seed=<uuid>]
+# Offsets may be in s(ectors), B, KiB, MiB, GiB or % of the disk image.
+# "dir" is relative to the work directory. Any partition which is not "/" is
+# left out of the root filesystem (only its empty mount point is kept).
+#
+# Dependencies:
+# sudo apt -y install python3 e2fsprogs dosfstools mtools
+#
+# Usage:
+# ./bin/assemble-image.py -i <image> -w <work directory> -l <msdos|gpt> -p <partition> [-p <partition>] [-d <disk id>] [-t <temp directory>]
+#
+# E.g.:
+# ./bin/assemble-image.py -i images/kali.img -w base/rpi/working -l msdos \
+#   -p name=boot,fs=vfat,start=1MiB,end=256MiB,dir=boot/firmware,uuid=1A2B3C4D,label=BOOT \
+#   -p name=root,fs=ext4,start=256MiB,end=100%,dir=/,uuid=<uuid>,label=ROOTFS
+
+import datetime
+import getopt
+import os
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import uuid
+import zlib
+
+image = ""
+
+workdir = ""
+
+label = ""
+
+diskid = ""
+
+tempdir = ""
+
+partitions = []
+
+SECTOR = 512
+
+GPT_ENTRIES = 128
+GPT_ENTRY_SIZE = 128
+GPT_TABLE_SECTORS = GPT_ENTRIES * GPT_ENTRY_SIZE // SECTOR
+
+# Same features as mkfs_partitions() in ./common.d/functions.sh
+ext_features = {
+    "ext2": "^64bit",
+    "ext3": "^64bit",
+    "ext4": "^64bit,^metadata_csum"
+    }
+
+mbr_types = {
+    "vfat": 0x0c,
+    "ext2": 0x83,
+    "ext3": 0x83,
+    "ext4": 0x83
+    }
+
+gpt_types = {
+    "vfat": "EBD0A0A2-B9E5-4433-87C0-68B6B72699C7",
+    "ext2": "0FC63DAF-8483-4772-8E79-3D69D8477DE4",
+    "ext3": "0FC63DAF-8483-4772-8E79-3D69D8477DE4",
+    "ext4": "0FC63DAF-8483-4772-8E79-3D69D8477DE4"
+    }
+
+units = {
+    "s": SECTOR,
+    "b": 1,
+    "kib": 1024,
+    "mib": 1024 ** 2,
+    "gib": 1024 ** 3
+    }
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -i <image> -w <work directory> -l <msdos|gpt> -p <partition> [-p <partition>] [-d <disk id>] [-t <temp directory>]"
+        outstr += f"\nE.g. : {prog} -i images/kali-linux-{datetime.datetime.now().year}.1-raspberry-pi-armhf.img -w base/raspberry-pi-xfce-armhf/working -l msdos -p name=root,fs=ext4,start=1MiB,end=100%,dir=/\n"
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global image, workdir, label, diskid, tempdir
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hi:w:l:p:d:t:",
+            [
+                "image=",
+                "workdir=",
+                "label=",
+                "partition=",
+                "diskid=",
+                "tempdir="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-i", "--image"):
+                image = arg
+
+            elif opt in ("-w", "--workdir"):
+                workdir = arg.rstrip("/")
+
+            elif opt in ("-l", "--label"):
+                label = arg
+
+            elif opt in ("-p", "--partition"):
+                partitions.append(parse_partition(arg))
+
+            elif opt in ("-d", "--diskid"):
+                diskid = arg
+
+            elif opt in ("-t", "--tempdir"):
+                tempdir = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if not image or not workdir or not partitions:
+        bail("Missing required argument: -i/--image, -w/--workdir and -p/--partition")
+
+    if label not in ("msdos", "gpt"):
+        bail(f"Unknown partition table label: '{label}' (msdos or gpt)")
+
+    return 0
+
+
+def parse_partition(spec):
+    part = {}
+
+    for item in spec.split(","):
+        if "=" not in item:
+            bail(f"Invalid partition option: '{item}' in '{spec}'")
+
+        key, value = item.split("=", 1)
+        part[key.strip()] = value.strip()
+
+    for key in ("name", "fs", "start", "end", "dir"):
+        if key not in part:
+            bail(f"Partition '{spec}' is missing: {key}")
+
+    if part["fs"] not in mbr_types:
+        bail(f"Unsupported filesystem: {part['fs']}")
+
+    part["dir"] = part["dir"].strip("/")
+
+    return part
+
+
+def parse_offset(value, disk_size):
+    value = value.strip().lower()
+
+    if value.endswith("%"):
+        return disk_size * int(value[:-1]) // 100
+
+    match = re.fullmatch(r"(\d+)\s*([a-z]*)", value)
+
+    if not match or match.group(2) not in units:
+        bail(f"Invalid offset: '{value}'")
+
+    return int(match.group(1)) * units[match.group(2)]
+
+
+def layout(disk_size):
+    """Turn the partition offsets into [first, last] sectors, parted style"""
+    sectors = disk_size // SECTOR
+
+    if label == "gpt":
+        first_usable = 2 + GPT_TABLE_SECTORS
+        last_usable = sectors - 2 - GPT_TABLE_SECTORS
+
+    else:
+        first_usable = 1
+        last_usable = sectors - 1
+
+    for part in partitions:
+        part["first"] = max(parse_offset(part["start"], disk_size) // SECTOR, first_usable)
+        part["last"] = min(parse_offset(part["end"], disk_size) // SECTOR - 1, last_usable)
+
+        if part["last"] <= part["first"]:
+            bail(f"Partition {part['name']} does not fit in {image}")
+
+        part["size"] = (part["last"] - part["first"] + 1) * SECTOR
+
+    ordered = sorted(partitions, key=lambda p: p["first"])
+
+    for a, b in zip(ordered, ordered[1:]):
+        if a["last"] >= b["first"]:
+            bail(f"Partitions {a['name']} and {b['name']} overlap")
+
+
+def chs(lba):
+    cylinder, rest = divmod(lba, 255 * 63)
+
+    if cylinder > 1023:
+        return b"\xfe\xff\xff"
+
+    head, sector = divmod(rest, 63)
+
+    return bytes([head, ((cylinder >> 2) & 0xc0) | (sector + 1), cylinder & 0xff])
+
+
+def mbr_entry(status, ptype, first, count):
+    return (
+        bytes([status]) + chs(first) + bytes([ptype]) + chs(first + count - 1) +
+        struct.pack("<II", first, count)
+        )
+
+
+def write_mbr(f, entries, signature):
+    f.seek(0)
+    mbr = bytearray(f.read(SECTOR).ljust(SECTOR, b"\0"))
+
+    mbr[440:446] = struct.pack("<IH", signature, 0)
+    mbr[446:510] = b"".join(entries).ljust(64, b"\0")
+    mbr[510:512] = b"\x55\xaa"
+
+    f.seek(0)
+    f.write(mbr)
+
+
+def write_msdos(f, disk_size):
+    signature = int(diskid, 16) if diskid else int.from_bytes(os.urandom(4), "little")
+
+    entries = []
+
+    for num, part in enumerate(partitions, start=1):
+        entries.append(mbr_entry(0, mbr_types[part["fs"]], part["first"], part["last"] - part["first"] + 1))
+        part["partuuid"] = f"{signature:08x}-{num:02x}"
+
+    write_mbr(f, entries, signature)
+
+
+def gpt_header(current, backup, entries_lba, last_usable, disk_guid, entries_crc):
+    header = struct.pack(
+        "<8sIIIIQQQQ16sQIII",
+        b"EFI PART",
+        0x00010000,
+        92,
+        0,
+        0,
+        current,
+        backup,
+        2 + GPT_TABLE_SECTORS,
+        last_usable,
+        disk_guid.bytes_le,
+        entries_lba,
+        GPT_ENTRIES,
+        GPT_ENTRY_SIZE,
+        entries_crc
+        )
+
+    header = header[:16] + struct.pack("<I", zlib.crc32(header)) + header[20:]
+
+    return header.ljust(SECTOR, b"\0")
+
+
+def write_gpt(f, disk_size):
+    sectors = disk_size // SECTOR
+    disk_guid = uuid.UUID(diskid) if diskid else uuid.uuid4()
+
+    table = bytearray(GPT_ENTRIES * GPT_ENTRY_SIZE)
+
+    for num, part in enumerate(partitions):
+        part_guid = uuid.UUID(part["partuuid"]) if part.get("partuuid") else uuid.uuid4()
+        part["partuuid"] = str(part_guid)
+
+        table[num * GPT_ENTRY_SIZE:(num + 1) * GPT_ENTRY_SIZE] = struct.pack(
+            "<16s16sQQQ72s",
+            uuid.UUID(gpt_types[part["fs"]]).bytes_le,
+            part_guid.bytes_le,
+            part["first"],
+            part["last"],
+            0,
+            part["name"].encode("utf-16-le")[:72]
+            )
+
+    table_crc = zlib.crc32(table)
+    last_usable = sectors - 2 - GPT_TABLE_SECTORS
+
+    write_mbr(f, [mbr_entry(0, 0xee, 1, min(sectors - 1, 0xffffffff))], 0)
+
+    f.seek(SECTOR)
+    f.write(gpt_header(1, sectors - 1, 2, last_usable, disk_guid, table_crc))
+    f.write(table)
+
+    f.seek((sectors - 1 - GPT_TABLE_SECTORS) * SECTOR)
+    f.write(table)
+    f.write(gpt_header(sectors - 1, 1, sectors - 1 - GPT_TABLE_SECTORS, last_usable, disk_guid, table_crc))
+
+
+def run(cmd, ok=(0,)):
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=dict(os.environ, MTOOLS_SKIP_CHECK="1"))
+
+    except FileNotFoundError as e:
+        bail(f"Missing command: {cmd[0]}", str(e))
+
+    if result.returncode not in ok:
+        bail(f"Command failed: {' '.join(cmd)}", result.stdout.decode(errors="replace"))
+
+    return result
+
+
+def make_ext(part, src, dest):
+    cmd = ["mke2fs", "-q", "-F", "-t", part["fs"], "-O", ext_features[part["fs"]], "-d", src]
+
+    if part.get("uuid"):
+        cmd += ["-U", part["uuid"]]
+
+    # Directory hash seed, random otherwise
+    if part.get("seed"):
+        cmd += ["-E", f"hash_seed={part['seed']}"]
+
+    if part.get("label"):
+        cmd += ["-L", part["label"]]
+
+    run(cmd + [dest])
+
+    # 1 = errors corrected, which is fine for a filesystem we just created
+    run(["e2fsck", "-y", "-f", dest], ok=(0, 1))
+
+
+def make_vfat(part, src, dest):
+    os.unlink(dest)
+
+    cmd = ["mkfs.vfat", "-C", "-F", "32"]
+
+    if part.get("uuid"):
+        cmd += ["-i", part["uuid"].replace("-", "")]
+
+    if part.get("label"):
+        cmd += ["-n", part["label"]]
+
+    run(cmd + [dest, str(part["size"] // 1024)])
+
+    entries = [os.path.join(src, entry) for entry in sorted(os.listdir(src))]
+
+    if entries:
+        run(["mcopy", "-s", "-p", "-m", "-Q", "-i", dest] + entries + ["::/"])
+
+    run(["fsck.vfat", "-n", dest])
+
+
+def build_filesystem(part, src, dest):
+    print(f"[i] Creating {part['fs']} filesystem for {part['name']} ({part['size'] // 1024 ** 2} MiB) from: {src}")
+
+    with open(dest, "wb") as f:
+        f.truncate(part["size"])
+
+    if part["fs"] == "vfat":
+        make_vfat(part, src, dest)
+
+    else:
+        make_ext(part, src, dest)
+
+
+def splice(src, dest_fd, offset):
+    """Copy only the allocated extents of src into dest_fd at offset"""
+    with open(src, "rb") as f:
+        fd = f.fileno()
+        end = os.fstat(fd).st_size
+        pos = 0
+
+        while pos < end:
+            try:
+                pos = os.lseek(fd, pos, os.SEEK_DATA)
+                hole = os.lseek(fd, pos, os.SEEK_HOLE)
+
+            except OSError:
+                # Filesystem without SEEK_DATA support (or nothing left), copy the rest
+                hole = end
+
+            while pos < hole:
+                length = min(hole - pos, 64 * 1024 ** 2)
+
+                try:
+                    copied = os.copy_file_range(fd, dest_fd, length, pos, offset + pos)
+
+                except (AttributeError, OSError):
+                    copied = os.pwrite(dest_fd, os.pread(fd, length, pos), offset + pos)
+
+                if copied == 0:
+                    break
+
+                pos += copied
+
+
+def assemble():
+    disk_size = os.path.getsize(image)
+
+    layout(disk_size)
+
+    # Partitions that are not the rootfs are mounted inside of it, so keep them out of the rootfs
+    root = [p for p in partitions if p["dir"] == ""]
+    others = [p for p in partitions if p["dir"] != ""]
+
+    work = tempfile.mkdtemp(prefix=".assemble-", dir=tempdir or os.path.dirname(os.path.abspath(image)))
+    stash = os.path.join(work, "stash")
+    moved = []
+
+    try:
+        os.mkdir(stash)
+
+        for part in others:
+            src = os.path.join(workdir, part["dir"])
+            dest = os.path.join(work, f"{part['name']}.part")
+
+            if not os.path.isdir(src):
+                os.makedirs(src)
+
+            build_filesystem(part, src, dest)
+            part["file"] = dest
+
+        if root:
+            for num, part in enumerate(others):
+                src = os.path.join(workdir, part["dir"])
+                aside = os.path.join(stash, str(num))
+                st = os.stat(src)
+
+                os.rename(src, aside)
+                moved.append((aside, src))
+                os.mkdir(src, st.st_mode & 0o7777)
+
+            for part in root:
+                part["file"] = os.path.join(work, f"{part['name']}.part")
+                build_filesystem(part, workdir, part["file"])
+
+        # Put the partition table in place, then the filesystems
+        with open(image, "r+b") as f:
+            if label == "gpt":
+                write_gpt(f, disk_size)
+
+            else:
+                write_msdos(f, disk_size)
+
+            for part in partitions:
+                print(f"[i] Writing {part['name']} at sector {part['first']} (PARTUUID={part['partuuid']})")
+                splice(part["file"], f.fileno(), part["first"] * SECTOR)
+
+            f.flush()
+            os.fsync(f.fileno())
+
+    finally:
+        for aside, src in reversed(moved):
+            os.rmdir(src)
+            os.rename(aside, src)
+
+        shutil.rmtree(work, ignore_errors=True)
+
+    return 0
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isfile(image):
+        bail(f"Missing: '{image}'! Please create the image before running (make_image)")
+
+    if not os.path.isdir(workdir):
+        bail(f"Missing work directory: '{workdir}'")
+
+    assemble()
+
+    # Print result and exit
+    print(f"\nImage assembled\t: {image}")
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
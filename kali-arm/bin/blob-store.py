@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to manage the firmware/BSP blob store.
+#
+# Rather than a copy of every firmware file per board, ./bsp/ keeps:
+# - "blobs/<sha256>": each file content once (content-addressed)
+# - "firmware/<board>.manifest": one line per file of the board
+#   ("<sha256>  <mode>  <path>", path relative to firmware/<board>/)
+#
+# The per-board trees (firmware/<board>/) are materialised from the store when
+# bsp is copied into work_dir (see copy_bsp() in ./common.d/functions.sh), as
+# hardlinks to the blobs, reflinks when the mode differs or the store is on
+# another filesystem and it supports them, or plain copies otherwise.
+#
+# Modes:
+# - "import": move a board tree (firmware/<board>/) into the store & write its manifest
+# - "materialise": create firmware/<board>/ under the destination from the manifests
+# - "report": duplicates & space saved by the store, or duplicate files under
+#   any other directory (e.g. a rootfs), which could be hardlinked
+# - "verify": blobs match their name, manifests only reference blobs which exist
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/blob-store.py -m import -n <board> [-s <bsp directory>]
+# ./bin/blob-store.py -m materialise -d <destination bsp directory> [-n <board>] [-s <bsp directory>]
+# ./bin/blob-store.py -m report [-d <directory>] [-s <bsp directory>]
+# ./bin/blob-store.py -m verify [-s <bsp directory>]
+#
+# E.g.:
+# ./bin/blob-store.py -m materialise -s bsp/ -d base/rpi-arm64/working/bsp/ -n rpi
+
+import errno
+import fcntl
+import getopt
+import hashlib
+import os
+import shutil
+import stat
+import sys
+
+mode = ""
+
+source = os.path.join(os.getcwd(), "bsp")
+
+destinations = []
+
+boards = []
+
+modes = ("import", "materialise", "report", "verify")
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+stats = {"linked": 0, "reflinked": 0, "copied": 0}
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m <{'|'.join(modes)}> [-s <bsp directory>] [-d <directory>] [-n <board>]"
+        outstr += f"\nE.g. : {prog} -m report -s bsp/\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, source
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:s:d:n:",
+            [
+                "mode=",
+                "source=",
+                "destination=",
+                "name="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-s", "--source"):
+                source = os.path.abspath(arg)
+
+            elif opt in ("-d", "--destination"):
+                destinations.append(os.path.abspath(arg))
+
+            elif opt in ("-n", "--name"):
+                boards.append(arg)
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if mode == "import" and not boards:
+        bail("Missing required argument: -n/--name")
+
+    if mode == "materialise" and len(destinations) != 1:
+        bail("Missing required argument: -d/--destination (once)")
+
+    return 0
+
+
+def sha256(path):
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 ** 2), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def blobdir():
+    return os.path.join(source, "blobs")
+
+
+def manifests():
+    """{board: path of its manifest}, all of them or only -n"""
+    firmware = os.path.join(source, "firmware")
+    found = {}
+
+    if os.path.isdir(firmware):
+        for name in sorted(os.listdir(firmware)):
+            if name.endswith(".manifest"):
+                found[name[:-len(".manifest")]] = os.path.join(firmware, name)
+
+    if boards:
+        for board in boards:
+            if board not in found:
+                bail(f"No manifest for: '{board}'", f"Missing: {os.path.join(firmware, board + '.manifest')}")
+
+        found = {board: found[board] for board in boards}
+
+    return found
+
+
+def read_manifest(path):
+    """[(sha256, mode, path)]"""
+    entries = []
+
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+
+            try:
+                digest, perms, name = line.rstrip("\n").split("  ", 2)
+                entries.append((digest, int(perms, 8), name))
+
+            except ValueError:
+                bail(f"Cannot read manifest: {path}", f"Line {number}: {line.strip()}")
+
+    return entries
+
+
+def import_board(board):
+    tree = os.path.join(source, "firmware", board)
+
+    if not os.path.isdir(tree):
+        bail(f"Missing: '{tree}'")
+
+    os.makedirs(blobdir(), exist_ok=True)
+    entries = []
+
+    for root, dirs, files in os.walk(tree):
+        dirs.sort()
+
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest = sha256(path)
+            # Like git, only the executable bit is kept
+            perms = 0o755 if os.stat(path).st_mode & stat.S_IXUSR else 0o644
+            blob = os.path.join(blobdir(), digest)
+
+            # The first file with this content keeps its mode, so it can be hardlinked
+            if not os.path.exists(blob):
+                os.rename(path, blob)
+
+            entries.append((digest, perms, os.path.relpath(path, tree)))
+
+    with open(os.path.join(source, "firmware", board + ".manifest"), "w") as f:
+        f.write(f"# {board}: <sha256>  <mode>  <path>, see ./bin/blob-store.py\n")
+
+        for digest, perms, name in entries:
+            f.write(f"{digest}  {perms:04o}  {name}\n")
+
+    shutil.rmtree(tree)
+
+    print(f"[+] {board}: {len(entries)} files, {len(set(e[0] for e in entries))} blobs")
+
+
+def reflink(src, dest):
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def place(blob, dest, perms):
+    """Hardlink, else reflink, else copy blob to dest"""
+    if os.path.lexists(dest):
+        os.unlink(dest)
+
+    # A hardlink shares the mode, only when it is (as far as git knows) the one wanted
+    if bool(os.stat(blob).st_mode & stat.S_IXUSR) == bool(perms & stat.S_IXUSR):
+        try:
+            os.link(blob, dest)
+            stats["linked"] += 1
+            return
+
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+    try:
+        reflink(blob, dest)
+        stats["reflinked"] += 1
+
+    except OSError:
+        shutil.copyfile(blob, dest)
+        stats["copied"] += 1
+
+    os.chmod(dest, perms)
+
+
+def materialise(destination):
+    for board, path in manifests().items():
+        tree = os.path.join(destination, "firmware", board)
+
+        for digest, perms, name in read_manifest(path):
+            blob = os.path.join(blobdir(), digest)
+
+            if not os.path.isfile(blob):
+                bail(f"Missing blob: {digest}", f"{board}: {name}")
+
+            dest = os.path.join(tree, name)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            place(blob, dest, perms)
+
+    print(f"[i] Materialised: {stats['linked']} linked, {stats['reflinked']} reflinked, {stats['copied']} copied")
+
+
+def report_store():
+    refs = {}
+
+    for board, path in manifests().items():
+        for digest, perms, name in read_manifest(path):
+            refs.setdefault(digest, []).append(f"{board}/{name}")
+
+    sizes = {digest: os.path.getsize(os.path.join(blobdir(), digest)) for digest in refs if os.path.isfile(os.path.join(blobdir(), digest))}
+    logical = sum(sizes.get(digest, 0) * len(paths) for digest, paths in refs.items())
+    stored = sum(sizes.values())
+
+    print("| Blob | Size | Files |")
+    print("|------|------|-------|")
+
+    for digest, paths in sorted(refs.items(), key=lambda r: -sizes.get(r[0], 0) * (len(r[1]) - 1)):
+        if len(paths) > 1:
+            print(f"| {digest[:12]} | {sizes.get(digest, 0)} | {', '.join(paths)} |")
+
+    print("\nStats:")
+    print(f"  - Files\t: {sum(len(paths) for paths in refs.values())}")
+    print(f"  - Blobs\t: {len(refs)}")
+    print(f"  - Size (files)\t: {logical}")
+    print(f"  - Size (store)\t: {stored}")
+    print(f"  - Saved\t: {logical - stored}")
+
+
+def report_tree(directory):
+    """Duplicate regular files (by size, then sha256) under directory"""
+    by_size = {}
+
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+
+            if stat.S_ISREG(st.st_mode) and st.st_size:
+                by_size.setdefault(st.st_size, []).append((path, (st.st_dev, st.st_ino)))
+
+    groups = 0
+    reclaimable = 0
+    linked = 0
+
+    print(f"\n{directory}:")
+    print("| Size | Copies | Files |")
+    print("|------|--------|-------|")
+
+    for size, candidates in sorted(by_size.items(), reverse=True):
+        if len(candidates) < 2:
+            continue
+
+        by_hash = {}
+
+        for path, inode in candidates:
+            by_hash.setdefault(sha256(path), []).append((path, inode))
+
+        for copies in by_hash.values():
+            inodes = set(inode for _, inode in copies)
+
+            if len(copies) < 2:
+                continue
+
+            linked += (len(copies) - len(inodes)) * size
+
+            if len(inodes) < 2:
+                continue
+
+            groups += 1
+            reclaimable += (len(inodes) - 1) * size
+            print(f"| {size} | {len(inodes)} | {', '.join(os.path.relpath(p, directory) for p, _ in copies[:4])}{' ...' if len(copies) > 4 else ''} |")
+
+    print("\nStats:")
+    print(f"  - Duplicate groups\t: {groups}")
+    print(f"  - Reclaimable\t\t: {reclaimable}")
+    print(f"  - Already hardlinked\t: {linked}")
+
+
+def verify():
+    problems = 0
+    referenced = set()
+
+    for board, path in manifests().items():
+        for digest, perms, name in read_manifest(path):
+            referenced.add(digest)
+
+            if not os.path.isfile(os.path.join(blobdir(), digest)):
+                print(f"[-] {board}: missing blob {digest} ({name})")
+                problems += 1
+
+    if os.path.isdir(blobdir()):
+        for digest in sorted(os.listdir(blobdir())):
+            if sha256(os.path.join(blobdir(), digest)) != digest:
+                print(f"[-] Blob does not match its name: {digest}")
+                problems += 1
+
+            if digest not in referenced and not boards:
+                print(f"[i] Unreferenced blob: {digest}")
+
+    print(f"[{'-' if problems else '+'}] {problems} problem(s)")
+
+    return 1 if problems else 0
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isdir(source):
+        bail(f"Missing: '{source}'")
+
+    if mode == "import":
+        for board in boards:
+            import_board(board)
+
+    elif mode == "materialise":
+        materialise(destinations[0])
+
+    elif mode == "report":
+        if destinations:
+            for directory in destinations:
+                report_tree(directory)
+
+        else:
+            report_store()
+
+    elif mode == "verify":
+        exit(verify())
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to report where build time goes, across many builds.
+#
+# It reads the stage telemetry written by the build-scripts (telemetry="yes",
+# see telemetry() in ./common.d/functions.sh), one or more JSON lines files, and
+# creates a markdown report with:
+# - the slowest stages per board & architecture (percentiles of wall time, CPU, IO)
+# - the slowest builds
+# - regressions: stages whose latest build is slower than the median of the
+#   previous builds by more than the threshold
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/build-report.py -i <telemetry file> [-i <telemetry file>] [-o <output file>] [-n <top>] [-t <threshold %>]
+#
+# E.g.:
+# ./bin/build-report.py -i logs/telemetry.jsonl -o build-report.md -n 20 -t 25
+
+import datetime
+import getopt
+import json
+import os
+import re
+import statistics
+import sys
+
+inputfiles = []
+
+outputfile = ""
+
+top = 20
+
+threshold = 25
+
+qty_records = 0
+qty_builds = 0
+qty_stages = 0
+
+# Status messages that include the image name, mirror, ...
+normalise = [
+    (re.compile(r"kali-linux-\S+"), "<image>"),
+    (re.compile(r"\w+://\S+"), "<url>"),
+    (re.compile(r"\s+\(.*?\)\s*$"), "")
+    ]
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -i <telemetry file> [-i <telemetry file>] [-o <output file>] [-n <top>] [-t <threshold %>]"
+        outstr += f"\nE.g. : {prog} -i logs/telemetry.jsonl -o build-report-{datetime.datetime.now().year}.md\n"
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global outputfile, top, threshold
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hi:o:n:t:",
+            [
+                "inputfile=",
+                "outputfile=",
+                "top=",
+                "threshold="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-i", "--inputfile"):
+                inputfiles.append(arg)
+
+            elif opt in ("-o", "--outputfile"):
+                outputfile = arg
+
+            elif opt in ("-n", "--top"):
+                try:
+                    top = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid number of stages: {arg}")
+
+            elif opt in ("-t", "--threshold"):
+                try:
+                    threshold = float(arg)
+
+                except ValueError:
+                    bail(f"Invalid threshold: {arg}")
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if not inputfiles:
+        bail("Missing required argument: -i/--inputfile")
+
+    return 0
+
+
+def stage_name(stage):
+    for pattern, replace in normalise:
+        stage = pattern.sub(replace, stage)
+
+    return stage.strip()
+
+
+def read_records(files):
+    global qty_records
+
+    records = []
+
+    for file in files:
+        try:
+            with open(file) as f:
+                for num, line in enumerate(f, start=1):
+                    line = line.strip()
+
+                    if not line:
+                        continue
+
+                    try:
+                        records.append(json.loads(line))
+                        qty_records += 1
+
+                    except json.JSONDecodeError:
+                        # A build killed while writing leaves half a line
+                        print(f"[i] Skipping invalid record: {file}:{num}")
+
+        except OSError as e:
+            bail(f"Cannot open input file: {file}", str(e))
+
+    return records
+
+
+def pair_stages(records):
+    """Match start/end records, returning one dict per finished stage"""
+    global qty_builds, qty_stages
+
+    started = {}
+    stages = []
+    builds = set()
+
+    for rec in records:
+        key = (rec.get("build"), rec.get("step"), rec.get("stage"))
+
+        if rec.get("event") == "start":
+            started[key] = rec
+
+        elif rec.get("event") == "end" and key in started:
+            start = started.pop(key)
+            hz = rec.get("hz") or 100
+
+            stages.append({
+                "build": rec["build"],
+                "board": rec.get("board", ""),
+                "arch": rec.get("arch", ""),
+                "host": rec.get("host", ""),
+                "stage": stage_name(rec.get("stage", "")),
+                "time": start["time"],
+                "wall": rec["time"] - start["time"],
+                "cpu": (rec["cpu_user"] + rec["cpu_sys"] - start["cpu_user"] - start["cpu_sys"]) / hz,
+                "io": rec["read_bytes"] + rec["write_bytes"] - start["read_bytes"] - start["write_bytes"]
+                })
+            builds.add(rec["build"])
+
+    qty_builds = len(builds)
+    qty_stages = len(stages)
+
+    return stages
+
+
+def percentile(values, pct):
+    values = sorted(values)
+
+    if len(values) == 1:
+        return values[0]
+
+    pos = (len(values) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def fmt_time(seconds):
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def fmt_bytes(size):
+    return f"{size / 1024 ** 3:.1f} GiB" if size >= 1024 ** 3 else f"{size / 1024 ** 2:.0f} MiB"
+
+
+def group(stages, keys):
+    groups = {}
+
+    for stage in stages:
+        groups.setdefault(tuple(stage[k] for k in keys), []).append(stage)
+
+    return groups
+
+
+def slowest_stages(stages):
+    table = "| Board | Arch | Stage | Builds | p50 | p90 | p95 | Max | Total | CPU (p50) | IO (p50) |\n"
+    table += "|-------|------|-------|--------|-----|-----|-----|-----|-------|-----------|----------|\n"
+
+    rows = []
+
+    for (board, arch, stage), items in group(stages, ("board", "arch", "stage")).items():
+        walls = [s["wall"] for s in items]
+
+        rows.append((
+            sum(walls),
+            f"| {board} | {arch} | {stage} | {len(items)} | {fmt_time(percentile(walls, 50))} | {fmt_time(percentile(walls, 90))} | "
+            f"{fmt_time(percentile(walls, 95))} | {fmt_time(max(walls))} | {fmt_time(sum(walls))} | "
+            f"{fmt_time(percentile([s['cpu'] for s in items], 50))} | {fmt_bytes(percentile([s['io'] for s in items], 50))} |\n"
+            ))
+
+    for _, row in sorted(rows, key=lambda r: r[0], reverse=True)[:top]:
+        table += row
+
+    return table
+
+
+def slowest_builds(stages):
+    table = "| Build | Board | Arch | Host | Wall | CPU | IO |\n"
+    table += "|-------|-------|------|------|------|-----|----|\n"
+
+    rows = []
+
+    for (build, board, arch, host), items in group(stages, ("build", "board", "arch", "host")).items():
+        wall = sum(s["wall"] for s in items)
+
+        rows.append((
+            wall,
+            f"| {build} | {board} | {arch} | {host} | {fmt_time(wall)} | {fmt_time(sum(s['cpu'] for s in items))} | {fmt_bytes(sum(s['io'] for s in items))} |\n"
+            ))
+
+    for _, row in sorted(rows, key=lambda r: r[0], reverse=True)[:top]:
+        table += row
+
+    return table
+
+
+def regressions(stages):
+    table = "| Board | Arch | Stage | Latest | Previous (median) | Change |\n"
+    table += "|-------|------|-------|--------|-------------------|--------|\n"
+
+    rows = []
+
+    for (board, arch, stage), items in group(stages, ("board", "arch", "stage")).items():
+        if len(items) < 2:
+            continue
+
+        items = sorted(items, key=lambda s: s["time"])
+        latest = items[-1]["wall"]
+        previous = statistics.median(s["wall"] for s in items[:-1])
+
+        # Ignore stages which are too quick to matter
+        if previous < 1 or latest < 10:
+            continue
+
+        change = (latest - previous) / previous * 100
+
+        if change > threshold:
+            rows.append((
+                latest - previous,
+                f"| {board} | {arch} | {stage} | {fmt_time(latest)} | {fmt_time(previous)} | +{change:.0f}% |\n"
+                ))
+
+    for _, row in sorted(rows, key=lambda r: r[0], reverse=True)[:top]:
+        table += row
+
+    return table
+
+
+def generate_report(stages):
+    report = "---\n"
+    report += "title: Kali ARM Build Report\n"
+    report += "---\n\n"
+    report += f"- **{qty_builds}** builds, **{qty_stages}** stages ({qty_records} records)\n"
+    report += f"- Generated on {datetime.datetime.now().strftime('%Y-%B-%d %H:%M:%S')}\n\n"
+    report += f"## Slowest stages (top {top}, by total time)\n\n"
+    report += slowest_stages(stages)
+    report += f"\n## Slowest builds (top {top})\n\n"
+    report += slowest_builds(stages)
+    report += f"\n## Regressions (latest build > {threshold:g}% slower than the previous median)\n\n"
+    report += regressions(stages)
+
+    return report
+
+
+def writefile(data, file):
+    try:
+        with open(file, "w") as f:
+            f.write(str(data))
+
+    except:
+        bail(f"Cannot write to output file: {file}")
+
+    return 0
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    # Get data
+    stages = pair_stages(read_records(inputfiles))
+
+    if not stages:
+        bail("No finished stages found in: " + ", ".join(inputfiles), "Is telemetry enabled in builder.txt?")
+
+    report = generate_report(stages)
+
+    # Create report file
+    if outputfile:
+        if os.path.dirname(outputfile):
+            os.makedirs(os.path.dirname(outputfile), exist_ok=True)
+
+        writefile(report, outputfile)
+        print(f"Report file created\t: {outputfile}")
+
+    else:
+        print(report)
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
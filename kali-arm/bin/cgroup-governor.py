@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to run a whole build in its own cgroup (v2), so several builds can share
+# a host without starving each other, and to account for what each one used.
+#
+# - create: a cgroup for the build, under a delegated parent (default: "kali-arm"
+#   at the top of the cgroup v2 hierarchy), with the controllers enabled on the
+#   way down, and its limits set:
+#   - cpu.max: -c <% of -j cores> (as cpu_limit/num_cores)
+#   - cpuset.cpus: -C <cpus>
+#   - memory.high / memory.max: -H / -M (e.g. 8G)
+#   - io.max: -I "<path|MAJ:MIN> rbps=<n> wbps=<n> riops=<n> wiops=<n>" (e.g. rbps=200M);
+#     a path is the disk it is on
+#   then moves -p <pid> (and so all of its future children) into it, and prints its path.
+#   A limit whose controller is not available is skipped, with a warning
+# - stats: reads back cpu.stat, memory.peak, memory.events & io.stat, prints them,
+#   -e as shell variables (cgroup_<key>=<value>, for eval), and -o appends them
+#   as a JSON line (event "cgroup", e.g. to the telemetry file)
+# - remove: moves whatever is left in the cgroup to -O <cgroup> (e.g. where the
+#   build was before), and removes it
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/cgroup-governor.py -m create -n <name> -p <pid> [-P <parent>] [-c <cpu %> -j <cores>] [-C <cpus>] [-H <memory.high>] [-M <memory.max>] [-I <io.max>]
+# ./bin/cgroup-governor.py -m stats -n <name> [-P <parent>] [-e] [-o <output file>]
+# ./bin/cgroup-governor.py -m remove -n <name> [-P <parent>] [-O <cgroup>]
+#
+# E.g.:
+# ./bin/cgroup-governor.py -m create -n rpi-arm64 -p $$ -c 85 -j 8 -M 8G -I "images/ wbps=200M"
+
+import errno
+import getopt
+import json
+import os
+import re
+import stat
+import sys
+import time
+
+mode = ""
+
+name = ""
+
+parent = ""
+
+pid = 0
+
+cpu_limit = -1
+
+cores = os.cpu_count() or 1
+
+cpuset = ""
+
+memory_high = ""
+
+memory_max = ""
+
+io_limits = []
+
+shell = False
+
+outputfile = ""
+
+origin = ""
+
+modes = ("create", "stats", "remove")
+
+# cpu.max period (microseconds)
+CPU_PERIOD = 100000
+
+# Controllers a build can be limited by
+CONTROLLERS = ("cpu", "cpuset", "memory", "io")
+
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m create -n <name> -p <pid> [-P <parent>] [-c <cpu %> -j <cores>] [-C <cpus>] [-H <memory.high>] [-M <memory.max>] [-I <io.max>]"
+        outstr += f"\n       {prog} -m stats -n <name> [-P <parent>] [-e] [-o <output file>]"
+        outstr += f"\n       {prog} -m remove -n <name> [-P <parent>] [-O <cgroup>]"
+        outstr += f"\nE.g. : {prog} -m create -n rpi-arm64 -p $$ -c 85 -j 8 -M 8G -I \"images/ wbps=200M\"\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, name, parent, pid, cpu_limit, cores, cpuset, memory_high, memory_max, shell, outputfile, origin
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:n:P:p:c:j:C:H:M:I:eo:O:",
+            [
+                "mode=",
+                "name=",
+                "parent=",
+                "pid=",
+                "cpu=",
+                "jobs=",
+                "cpuset=",
+                "memory-high=",
+                "memory-max=",
+                "io=",
+                "shell",
+                "outputfile=",
+                "origin="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-H", "--memory-high"):
+                memory_high = arg
+
+            elif opt in ("-n", "--name"):
+                name = arg
+
+            elif opt in ("-P", "--parent"):
+                parent = arg.rstrip("/")
+
+            elif opt in ("-p", "--pid"):
+                try:
+                    pid = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid PID: {arg}")
+
+            elif opt in ("-c", "--cpu"):
+                try:
+                    cpu_limit = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid CPU limit: {arg}")
+
+            elif opt in ("-j", "--jobs"):
+                try:
+                    cores = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of jobs: {arg}")
+
+            elif opt in ("-C", "--cpuset"):
+                cpuset = arg
+
+            elif opt in ("-M", "--memory-max"):
+                memory_max = arg
+
+            elif opt in ("-I", "--io"):
+                io_limits.append(arg)
+
+            elif opt in ("-e", "--shell"):
+                shell = True
+
+            elif opt in ("-o", "--outputfile"):
+                outputfile = arg
+
+            elif opt in ("-O", "--origin"):
+                origin = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if not name or "/" in name or name in (".", ".."):
+        bail(f"Invalid name: '{name}'")
+
+    if mode == "create" and not pid:
+        bail("Missing required argument: -p/--pid")
+
+    return 0
+
+
+def mountpoint():
+    """Where the cgroup v2 hierarchy is mounted"""
+    with open("/proc/self/mounts") as f:
+        for line in f:
+            fields = line.split()
+
+            if fields[2] == "cgroup2":
+                return fields[1]
+
+    bail("Cannot find cgroup v2", "Not mounted (a cgroup v1 only host?)")
+
+
+def write(cgroup, key, value):
+    with open(os.path.join(cgroup, key), "w") as f:
+        f.write(value)
+
+
+def read(cgroup, key):
+    try:
+        with open(os.path.join(cgroup, key)) as f:
+            return f.read()
+
+    except OSError:
+        return ""
+
+
+def size(value):
+    """Bytes, from e.g. 8G (binary units), or "max" """
+    if value == "max":
+        return value
+
+    match = re.fullmatch(r"(\d+)([KMGT]?)i?B?", value.upper())
+
+    if not match:
+        bail(f"Invalid size: '{value}'")
+
+    return str(int(match.group(1)) * UNITS[match.group(2)])
+
+
+def device(target):
+    """MAJ:MIN of the disk a path is on (io.max is per disk, not per partition)"""
+    if re.fullmatch(r"\d+:\d+", target):
+        return target
+
+    try:
+        st = os.stat(target)
+
+    except OSError as e:
+        bail(f"Cannot find: {target}", e.strerror)
+
+    dev = st.st_rdev if stat.S_ISBLK(st.st_mode) else st.st_dev
+    sysfs = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+
+    if os.path.exists(os.path.join(sysfs, "partition")):
+        with open(os.path.join(os.path.realpath(sysfs), "..", "dev")) as f:
+            return f.read().strip()
+
+    return f"{os.major(dev)}:{os.minor(dev)}"
+
+
+def io_max(spec):
+    """io.max line, from "<path|MAJ:MIN> rbps=200M wbps=100M ..." """
+    target, *limits = spec.split()
+    values = []
+
+    for limit in limits:
+        key, _, value = limit.partition("=")
+
+        if key not in ("rbps", "wbps", "riops", "wiops"):
+            bail(f"Invalid io.max limit: '{limit}'")
+
+        values.append(f"{key}={size(value) if key.endswith('bps') else value}")
+
+    return f"{device(target)} {' '.join(values)}"
+
+
+def enable(root, cgroup):
+    """Enable the controllers from the root down to cgroup's subtree, return those which are"""
+    available = read(root, "cgroup.controllers").split()
+    wanted = [c for c in CONTROLLERS if c in available]
+    path = root
+    parts = [part for part in os.path.relpath(cgroup, root).split(os.sep) if part != "."]
+
+    for part in [""] + parts:
+        path = os.path.join(path, part)
+        os.makedirs(path, exist_ok=True)
+        missing = [c for c in wanted if c not in read(path, "cgroup.subtree_control").split()]
+
+        if missing:
+            try:
+                write(path, "cgroup.subtree_control", " ".join(f"+{c}" for c in missing))
+
+            # It has processes of its own (not delegated), or is not ours
+            except OSError as e:
+                bail(f"Cannot enable {', '.join(missing)} in: {path}", e.strerror)
+
+    return wanted
+
+
+def create(root, cgroup):
+    controllers = enable(root, parent)
+    os.makedirs(cgroup, exist_ok=True)
+
+    limits = []
+
+    if 0 < cpu_limit < 100:
+        limits.append(("cpu", "cpu.max", f"{CPU_PERIOD * cores * cpu_limit // 100} {CPU_PERIOD}"))
+
+    if cpuset:
+        limits.append(("cpuset", "cpuset.cpus", cpuset))
+
+    if memory_high:
+        limits.append(("memory", "memory.high", size(memory_high)))
+
+    if memory_max:
+        limits.append(("memory", "memory.max", size(memory_max)))
+
+    for spec in io_limits:
+        limits.append(("io", "io.max", io_max(spec)))
+
+    for controller, key, value in limits:
+        if controller not in controllers:
+            print(f"[i] No {controller} controller, not setting: {key}", file=sys.stderr)
+            continue
+
+        try:
+            write(cgroup, key, value)
+
+        except OSError as e:
+            bail(f"Cannot set {key}: {value}", e.strerror)
+
+        print(f"[i] {key}: {value}", file=sys.stderr)
+
+    try:
+        write(cgroup, "cgroup.procs", str(pid))
+
+    except OSError as e:
+        bail(f"Cannot move {pid} into: {cgroup}", e.strerror)
+
+    print(cgroup)
+
+
+def flat(text):
+    """{key: int} of "key value" lines"""
+    values = {}
+
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+
+        if value.strip().isdigit():
+            values[key] = int(value)
+
+    return values
+
+
+def stats(cgroup):
+    cpu = flat(read(cgroup, "cpu.stat"))
+    events = flat(read(cgroup, "memory.events"))
+    io = {"rbytes": 0, "wbytes": 0, "rios": 0, "wios": 0}
+
+    for line in read(cgroup, "io.stat").splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+
+            if key in io:
+                io[key] += int(value)
+
+    peak = read(cgroup, "memory.peak").strip()
+
+    record = {
+        "cpu_usec": cpu.get("usage_usec", 0),
+        "cpu_user_usec": cpu.get("user_usec", 0),
+        "cpu_system_usec": cpu.get("system_usec", 0),
+        "throttled_usec": cpu.get("throttled_usec", 0),
+        "nr_throttled": cpu.get("nr_throttled", 0),
+        # memory.peak is Linux 5.19+, else the current usage is the best there is
+        "memory_peak": int(peak) if peak.isdigit() else int(read(cgroup, "memory.current").strip() or 0),
+        "memory_high_events": events.get("high", 0),
+        "memory_max_events": events.get("max", 0),
+        "oom_kill": events.get("oom_kill", 0),
+        "read_bytes": io["rbytes"],
+        "write_bytes": io["wbytes"],
+        "read_ios": io["rios"],
+        "write_ios": io["wios"]
+        }
+
+    if outputfile:
+        os.makedirs(os.path.dirname(os.path.abspath(outputfile)), exist_ok=True)
+
+        with open(outputfile, "a") as f:
+            f.write(json.dumps({"event": "cgroup", "cgroup": name, "time": time.time(), **record}) + "\n")
+
+    if shell:
+        for key, value in record.items():
+            print(f"cgroup_{key}={value}")
+
+        return
+
+    print("\nStats:")
+    print(f"  - CPU\t\t: {record['cpu_usec'] / 1e6:.1f}s (user {record['cpu_user_usec'] / 1e6:.1f}s, system {record['cpu_system_usec'] / 1e6:.1f}s)")
+    print(f"  - Throttled\t: {record['throttled_usec'] / 1e6:.1f}s ({record['nr_throttled']} periods)")
+    print(f"  - Memory peak\t: {record['memory_peak'] // 1024 ** 2} MiB ({record['memory_high_events']} over memory.high, {record['oom_kill']} OOM kills)")
+    print(f"  - IO\t\t: {record['read_bytes'] // 1024 ** 2} MiB read, {record['write_bytes'] // 1024 ** 2} MiB written")
+
+
+def remove(root, cgroup):
+    if not os.path.isdir(cgroup):
+        return
+
+    target = os.path.join(root, origin.lstrip("/")) if origin else root
+
+    # Anything still in there (e.g. the build's shell), back to where it came from
+    for _ in range(10):
+        procs = read(cgroup, "cgroup.procs").split()
+
+        if not procs:
+            break
+
+        for proc in procs:
+            try:
+                write(target, "cgroup.procs", proc)
+
+            except OSError as e:
+                # It has just exited
+                if e.errno != errno.ESRCH:
+                    bail(f"Cannot move {proc} to: {target}", e.strerror)
+
+    try:
+        os.rmdir(cgroup)
+
+    except OSError as e:
+        bail(f"Cannot remove: {cgroup}", e.strerror)
+
+    print(f"[+] Removed: {cgroup}", file=sys.stderr)
+
+
+def main(argv):
+    global parent
+
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    root = mountpoint()
+    parent = parent or os.path.join(root, "kali-arm")
+    cgroup = os.path.join(parent, name)
+
+    if os.path.commonpath([root, os.path.abspath(parent)]) != root:
+        bail(f"Not in the cgroup v2 hierarchy: {parent}", f"Mounted at: {root}")
+
+    if mode == "create":
+        create(root, cgroup)
+
+    elif mode == "stats":
+        if not os.path.isdir(cgroup):
+            bail(f"Missing: '{cgroup}'")
+
+        stats(cgroup)
+
+    elif mode == "remove":
+        remove(root, cgroup)
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
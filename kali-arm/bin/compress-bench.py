@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to benchmark image compression backends & levels, and pick one.
+#
+# A sample of the image's mapped (non-hole) blocks is taken, evenly spread over
+# the image, and compressed & decompressed with every candidate, using the same
+# tools as compress_img() in ./common.d/functions.sh:
+# - "xz:<0-9>": ./bin/xz-blocks.py (multi-block xz, -b MiB blocks as xz_blocksize)
+# - "zstd:<1-22>": zstd -T<jobs>
+# - "none"
+# For each candidate it records the ratio, compress & decompress throughput, and
+# the projected time to compress the whole image (mapped data + holes), appended
+# to the results file (JSON lines), one record per image & candidate.
+#
+# It then picks a candidate from the policy:
+# - "ratio": best ratio
+# - "ratio:<minutes>": best ratio, which compresses the image in under <minutes>
+# - "time": quickest to compress
+# The table goes to stderr, the choice ("<backend>:<level>") to stdout, for
+# compress="auto" in builder.txt.
+#
+# Dependencies:
+# sudo apt -y install python3 xz-utils zstd
+#
+# Usage:
+# ./bin/compress-bench.py -f <image> [-c <candidates>] [-p <policy>] [-s <sample MiB>] [-b <xz block MiB>] [-j <jobs>] [-o <results file>]
+#
+# E.g.:
+# ./bin/compress-bench.py -f images/kali-linux-2022.3-raspberry-pi-arm64.img -c xz:6,xz:9,zstd:3,zstd:19 -p ratio:30 -o logs/compress-bench.jsonl
+
+import datetime
+import getopt
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+imagefile = ""
+
+candidates = "xz:6,xz:9,zstd:3,zstd:19"
+
+policy = "ratio"
+
+sample_size = 256 * 1024 ** 2
+
+# Size of the xz blocks (MiB), as compress_img() writes them (xz_blocksize)
+xz_blocksize = 16
+
+jobs = os.cpu_count() or 1
+
+resultsfile = ""
+
+# Size of each piece of the sample (the sample is this many pieces, spread over the image)
+PIECE = 4 * 1024 ** 2
+
+# Holes are read back as zeros by every backend, timed with this much
+ZEROS = 16 * 1024 ** 2
+
+xz_blocks = os.path.join(os.path.dirname(os.path.abspath(__file__)), "xz-blocks.py")
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -f <image> [-c <candidates>] [-p <policy>] [-s <sample MiB>] [-b <xz block MiB>] [-j <jobs>] [-o <results file>]"
+        outstr += f"\nE.g. : {prog} -f images/kali-linux-{datetime.datetime.now().year}.1-raspberry-pi-arm64.img -p ratio:30\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global imagefile, candidates, policy, sample_size, xz_blocksize, jobs, resultsfile
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hf:c:p:s:b:j:o:",
+            [
+                "file=",
+                "candidates=",
+                "policy=",
+                "sample=",
+                "xz-blocksize=",
+                "jobs=",
+                "outputfile="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-f", "--file"):
+                imagefile = arg
+
+            elif opt in ("-c", "--candidates"):
+                candidates = arg
+
+            elif opt in ("-p", "--policy"):
+                policy = arg
+
+            elif opt in ("-s", "--sample"):
+                try:
+                    sample_size = int(float(arg) * 1024 ** 2)
+
+                except ValueError:
+                    bail(f"Invalid sample size: {arg}")
+
+            elif opt in ("-b", "--xz-blocksize"):
+                try:
+                    xz_blocksize = float(arg)
+
+                except ValueError:
+                    bail(f"Invalid xz block size: {arg}")
+
+            elif opt in ("-j", "--jobs"):
+                try:
+                    jobs = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of jobs: {arg}")
+
+            elif opt in ("-o", "--outputfile"):
+                resultsfile = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if not imagefile:
+        bail("Missing required argument: -f/--file")
+
+    if policy.split(":")[0] not in ("ratio", "time"):
+        bail(f"Unknown policy: '{policy}'")
+
+    return 0
+
+
+def log(message):
+    print(f"[i] {message}", file=sys.stderr)
+
+
+def parse_candidates(value):
+    parsed = []
+
+    for candidate in value.split(","):
+        backend, _, level = candidate.strip().partition(":")
+
+        if backend == "none":
+            parsed.append(("none", 0))
+
+        elif backend == "xz" and level.isdigit() and 0 <= int(level) <= 9:
+            parsed.append(("xz", int(level)))
+
+        elif backend == "zstd" and level.isdigit() and 1 <= int(level) <= 22:
+            parsed.append(("zstd", int(level)))
+
+        else:
+            bail(f"Unknown candidate: '{candidate}'", "Use xz:<0-9>, zstd:<1-22> or none")
+
+    return parsed
+
+
+def data_extents(fd, size):
+    """(offset, length) of the mapped data of a (sparse) file"""
+    extents = []
+    pos = 0
+
+    while pos < size:
+        try:
+            pos = os.lseek(fd, pos, os.SEEK_DATA)
+            hole = os.lseek(fd, pos, os.SEEK_HOLE)
+
+        except OSError:
+            # ENXIO: no more data, or no SEEK_DATA support (then it is all data)
+            if not extents and pos == 0:
+                extents.append((0, size))
+
+            break
+
+        extents.append((pos, hole - pos))
+        pos = hole
+
+    return extents
+
+
+def take_sample(output):
+    """Pieces of the mapped data, evenly spread over it, written to output"""
+    size = os.path.getsize(imagefile)
+
+    with open(imagefile, "rb") as f:
+        extents = data_extents(f.fileno(), size)
+        mapped = sum(length for _, length in extents)
+        pieces = max(1, min(sample_size, mapped) // PIECE)
+        step = mapped / pieces
+        taken = 0
+
+        with open(output, "wb") as out:
+            for i in range(pieces):
+                # Position i * step in the mapped data, to an offset in the image
+                want = int(i * step)
+
+                for start, length in extents:
+                    if want < length:
+                        data = os.pread(f.fileno(), min(PIECE, length - want), start + want)
+                        out.write(data)
+                        taken += len(data)
+                        break
+
+                    want -= length
+
+    return size, mapped, taken
+
+
+def commands(backend, level, src, dest):
+    if backend == "xz":
+        return (
+            [sys.executable, xz_blocks, "-m", "compress", "-f", src, "-o", dest, "-b", str(xz_blocksize), "-l", str(level), "-j", str(jobs)],
+            [sys.executable, xz_blocks, "-m", "decompress", "-f", dest, "-o", os.devnull, "-j", str(jobs)]
+            )
+
+    ultra = ["--ultra"] if level > 19 else []
+
+    return (
+        ["zstd", "-q", "-f", f"-T{jobs}", f"-{level}", *ultra, src, "-o", dest],
+        ["zstd", "-q", "-d", "-f", f"-T{jobs}", dest, "-o", os.devnull]
+        )
+
+
+def timed(cmd):
+    start = time.monotonic()
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    if result.returncode != 0:
+        bail(f"Command failed: {' '.join(cmd)}", result.stderr.strip())
+
+    return max(time.monotonic() - start, 1e-6)
+
+
+def benchmark(backend, level, sample, zeros, tmpdir):
+    if backend == "none":
+        return {"ratio": 1.0, "compress_mbps": 0, "decompress_mbps": 0, "zeros_mbps": 0, "compressed": os.path.getsize(sample)}
+
+    dest = os.path.join(tmpdir, "sample.out")
+    compress_cmd, decompress_cmd = commands(backend, level, sample, dest)
+    compress_time = timed(compress_cmd)
+    compressed = os.path.getsize(dest)
+    decompress_time = timed(decompress_cmd)
+
+    zeros_cmd, _ = commands(backend, level, zeros, dest)
+    zeros_time = timed(zeros_cmd)
+
+    size = os.path.getsize(sample)
+
+    return {
+        "ratio": size / compressed if compressed else 0,
+        "compress_mbps": size / compress_time / 1024 ** 2,
+        "decompress_mbps": size / decompress_time / 1024 ** 2,
+        "zeros_mbps": ZEROS / zeros_time / 1024 ** 2,
+        "compressed": compressed
+        }
+
+
+def projected_time(result, size, mapped):
+    if not result["compress_mbps"]:
+        return 0
+
+    return mapped / 1024 ** 2 / result["compress_mbps"] + (size - mapped) / 1024 ** 2 / result["zeros_mbps"]
+
+
+def choose(results):
+    name, _, minutes = policy.partition(":")
+
+    if name == "time":
+        return min(results, key=lambda r: r["projected_seconds"])
+
+    allowed = [r for r in results if not minutes or r["projected_seconds"] <= float(minutes) * 60]
+
+    if not allowed:
+        log(f"No candidate compresses the image in under {minutes} minutes, using the quickest")
+        return min(results, key=lambda r: r["projected_seconds"])
+
+    return max(allowed, key=lambda r: (r["ratio"], -r["projected_seconds"]))
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isfile(imagefile):
+        bail(f"Missing: '{imagefile}'! Please create the image before running")
+
+    tested = parse_candidates(candidates)
+
+    if any(backend == "zstd" for backend, _ in tested) and not shutil.which("zstd"):
+        bail("Missing: zstd", "sudo apt -y install zstd")
+
+    results = []
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(imagefile))) as tmpdir:
+        sample = os.path.join(tmpdir, "sample")
+        zeros = os.path.join(tmpdir, "zeros")
+        size, mapped, taken = take_sample(sample)
+
+        with open(zeros, "wb") as f:
+            f.write(b"\0" * ZEROS)
+
+        log(f"Sample: {taken / 1024 ** 2:.0f} MiB of {mapped / 1024 ** 2:.0f} MiB mapped ({size / 1024 ** 2:.0f} MiB image)")
+
+        for backend, level in tested:
+            result = benchmark(backend, level, sample, zeros, tmpdir)
+            result["candidate"] = f"{backend}:{level}"
+            result["projected_seconds"] = projected_time(result, size, mapped)
+            results.append(result)
+
+    choice = choose(results)
+
+    print("| Candidate | Ratio | Compress | Decompress | Projected |", file=sys.stderr)
+    print("|-----------|-------|----------|------------|-----------|", file=sys.stderr)
+
+    for r in results:
+        mark = " *" if r is choice else ""
+        print(f"| {r['candidate']}{mark} | {r['ratio']:.2f} | {r['compress_mbps']:.0f} MiB/s | {r['decompress_mbps']:.0f} MiB/s | "
+              f"{datetime.timedelta(seconds=round(r['projected_seconds']))} |", file=sys.stderr)
+
+    if resultsfile:
+        if os.path.dirname(resultsfile):
+            os.makedirs(os.path.dirname(resultsfile), exist_ok=True)
+
+        now = time.time()
+
+        with open(resultsfile, "a") as f:
+            for r in results:
+                f.write(json.dumps({
+                    "image": os.path.basename(imagefile),
+                    "time": now,
+                    "size": size,
+                    "mapped": mapped,
+                    "sample": taken,
+                    "jobs": jobs,
+                    "xz_blocksize": xz_blocksize,
+                    "policy": policy,
+                    "chosen": r is choice,
+                    **r
+                    }) + "\n")
+
+    log(f"Selected: {choice['candidate']} (policy: {policy})")
+    print(choice["candidate"])
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
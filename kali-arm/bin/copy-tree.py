@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to copy the rootfs (work_dir) into the mounted image file.
+#
+# This replaces "rsync -HPavz" for a purely local copy (no compression, no
+# delta transfer):
+# - walks the source with os.scandir
+# - copies regular files on a thread pool, using copy_file_range (falling back
+#   to sendfile and then read/write), only copying data extents so sparse files
+#   stay sparse
+# - keeps hardlinks, symlinks, device nodes, fifos, sockets, ownership,
+#   permissions, xattrs (e.g. security.capability) and timestamps
+# - applies directory metadata in a final pass (deepest first), so directory
+#   mtimes and read-only directories do not get in the way of the copy
+#
+# Excludes are relative to the source directory (e.g. "boot/firmware"), and
+# only the contents are skipped - the directory itself is created, as it is
+# needed as a mount point.
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/copy-tree.py -s <source directory> -d <destination directory> [-e <exclude>] [-j <threads>]
+#
+# E.g.:
+# ./bin/copy-tree.py -s base/rpi/working -d base/rpi/root -e boot/firmware
+
+import datetime
+import errno
+import getopt
+import os
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+source = ""
+
+destination = ""
+
+excludes = set()
+
+threads = min(32, (os.cpu_count() or 1) + 4)
+
+qty_files = 0
+qty_bytes = 0
+qty_links = 0
+qty_dirs = 0
+qty_other = 0
+
+lock = threading.Lock()
+
+errors = []
+
+CHUNK = 64 * 1024 ** 2
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -s <source directory> -d <destination directory> [-e <exclude>] [-j <threads>]"
+        outstr += f"\nE.g. : {prog} -s base/raspberry-pi-xfce-armhf/working -d base/raspberry-pi-xfce-armhf/root -e boot/firmware\n"
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global source, destination, threads
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hs:d:e:j:",
+            [
+                "source=",
+                "destination=",
+                "exclude=",
+                "threads="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-s", "--source"):
+                source = arg.rstrip("/") or "/"
+
+            elif opt in ("-d", "--destination"):
+                destination = arg.rstrip("/") or "/"
+
+            elif opt in ("-e", "--exclude"):
+                excludes.add(arg.strip("/"))
+
+            elif opt in ("-j", "--threads"):
+                try:
+                    threads = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of threads: {arg}")
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if not source or not destination:
+        bail("Missing required argument: -s/--source and -d/--destination")
+
+    return 0
+
+
+def copy_xattrs(src, dest, follow_symlinks=True):
+    try:
+        names = os.listxattr(src, follow_symlinks=follow_symlinks)
+
+    except OSError:
+        return
+
+    for name in names:
+        try:
+            os.setxattr(dest, name, os.getxattr(src, name, follow_symlinks=follow_symlinks), follow_symlinks=follow_symlinks)
+
+        except OSError:
+            # e.g. user.* on symlinks, or trusted.* when not root
+            pass
+
+
+def set_metadata(src, dest, st, follow_symlinks=True):
+    # chown first, as it clears setuid/setgid bits and security.capability
+    try:
+        os.chown(dest, st.st_uid, st.st_gid, follow_symlinks=follow_symlinks)
+
+    except PermissionError:
+        pass
+
+    if follow_symlinks:
+        os.chmod(dest, stat.S_IMODE(st.st_mode))
+
+    copy_xattrs(src, dest, follow_symlinks)
+
+    os.utime(dest, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=follow_symlinks)
+
+
+def copy_range(fd_in, fd_out, pos, end):
+    while pos < end:
+        length = min(end - pos, CHUNK)
+
+        try:
+            copied = os.copy_file_range(fd_in, fd_out, length, pos, pos)
+
+        except (AttributeError, OSError):
+            try:
+                os.lseek(fd_out, pos, os.SEEK_SET)
+                copied = os.sendfile(fd_out, fd_in, pos, length)
+
+            except OSError:
+                copied = os.pwrite(fd_out, os.pread(fd_in, length, pos), pos)
+
+        if copied == 0:
+            break
+
+        pos += copied
+
+
+def copy_file(src, dest, st):
+    with open(src, "rb") as f_in, open(dest, "wb") as f_out:
+        fd_in = f_in.fileno()
+        fd_out = f_out.fileno()
+        pos = 0
+
+        # Only copy data extents, holes are left as holes
+        while pos < st.st_size:
+            try:
+                pos = os.lseek(fd_in, pos, os.SEEK_DATA)
+                hole = os.lseek(fd_in, pos, os.SEEK_HOLE)
+
+            except OSError as e:
+                # ENXIO: no more data after pos
+                if e.errno == errno.ENXIO:
+                    break
+
+                hole = st.st_size
+
+            copy_range(fd_in, fd_out, pos, hole)
+            pos = hole
+
+        os.ftruncate(fd_out, st.st_size)
+
+    set_metadata(src, dest, st)
+
+
+def copy_worker(src, dest, st):
+    global qty_files, qty_bytes
+
+    try:
+        copy_file(src, dest, st)
+
+    except OSError as e:
+        with lock:
+            errors.append(f"{src}: {e}")
+
+        return
+
+    with lock:
+        qty_files += 1
+        qty_bytes += st.st_size
+
+
+def remove(path):
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            return
+
+        os.unlink(path)
+
+    except FileNotFoundError:
+        pass
+
+
+def copy_tree():
+    global qty_links, qty_dirs, qty_other
+
+    dirs = []
+    inodes = {}
+    hardlinks = []
+
+    # Limit the number of queued files, so memory does not grow with the rootfs
+    slots = threading.BoundedSemaphore(threads * 64)
+
+    def release(future):
+        slots.release()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        st = os.lstat(source)
+        os.makedirs(destination, exist_ok=True)
+        dirs.append((source, destination, st))
+
+        stack = [("", source, destination)]
+
+        while stack:
+            rel, src_dir, dest_dir = stack.pop()
+
+            if rel in excludes:
+                continue
+
+            with os.scandir(src_dir) as it:
+                entries = list(it)
+
+            for entry in entries:
+                src = entry.path
+                dest = os.path.join(dest_dir, entry.name)
+                rel_path = f"{rel}/{entry.name}" if rel else entry.name
+                st = entry.stat(follow_symlinks=False)
+
+                if stat.S_ISDIR(st.st_mode):
+                    try:
+                        os.mkdir(dest, 0o700)
+
+                    except FileExistsError:
+                        if not os.path.isdir(dest) or os.path.islink(dest):
+                            os.unlink(dest)
+                            os.mkdir(dest, 0o700)
+
+                        else:
+                            os.chmod(dest, 0o700)
+
+                    dirs.append((src, dest, st))
+                    stack.append((rel_path, src, dest))
+                    qty_dirs += 1
+                    continue
+
+                remove(dest)
+
+                # Second (or later) name for an inode: link it once everything is copied
+                if st.st_nlink > 1:
+                    key = (st.st_dev, st.st_ino)
+
+                    if key in inodes:
+                        hardlinks.append((inodes[key], dest))
+                        continue
+
+                    inodes[key] = dest
+
+                if stat.S_ISREG(st.st_mode):
+                    slots.acquire()
+                    pool.submit(copy_worker, src, dest, st).add_done_callback(release)
+
+                elif stat.S_ISLNK(st.st_mode):
+                    os.symlink(os.readlink(src), dest)
+                    set_metadata(src, dest, st, follow_symlinks=False)
+                    qty_other += 1
+
+                else:
+                    # Device nodes, fifos and sockets
+                    try:
+                        os.mknod(dest, st.st_mode, st.st_rdev)
+                        set_metadata(src, dest, st)
+                        qty_other += 1
+
+                    except OSError as e:
+                        errors.append(f"{src}: {e}")
+
+    for target, dest in hardlinks:
+        try:
+            os.link(target, dest)
+            qty_links += 1
+
+        except OSError as e:
+            errors.append(f"{dest}: {e}")
+
+    # Directory metadata last, deepest first
+    for src, dest, st in reversed(dirs):
+        set_metadata(src, dest, st)
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isdir(source):
+        bail(f"Missing source directory: '{source}'")
+
+    start = time.monotonic()
+
+    copy_tree()
+
+    for error in errors:
+        print(f"[-] {error}")
+
+    if errors:
+        bail(f"Failed to copy {len(errors)} entries from {source}", "See above")
+
+    # Print result and exit
+    print("\nStats:")
+    print(f"  - Directories\t: {qty_dirs}")
+    print(f"  - Files\t: {qty_files} ({qty_bytes / 1024 ** 2:.1f} MiB)")
+    print(f"  - Hardlinks\t: {qty_links}")
+    print(f"  - Other\t: {qty_other}")
+    print(f"  - Time\t: {datetime.timedelta(seconds=round(time.monotonic() - start))} ({threads} threads)")
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to manage the shared package (.deb) cache, used by every build on the
+# host (deb_cache="yes" in builder.txt).
+#
+# It keeps, under the cache directory (default: ./cache/deb):
+# - "pool/": every .deb downloaded by a build, stored once by sha256
+# - "index.json": (name, version, arch, sha256) of each package, with its control
+#   fields, when it was added, last used and how many times it was used
+# - "history.jsonl": one record per build (cache hits & misses)
+# - "dists/": a local stand-in repository made from the pool (-m repo), for
+#   rebuilding fully offline (deb_cache_offline="yes")
+#
+# Packages are seeded into the build's /var/cache/apt/archives (as hardlinks) before
+# apt runs, so apt only downloads what is not in the cache, and the downloaded
+# packages are collected into the pool once apt is done.
+# Writers only ever add whole files (written aside, then renamed) and the index
+# is updated under a lock, so builds running at the same time can share the cache.
+#
+# See deb_cache_seed() and deb_cache_collect() in ./common.d/functions.sh
+#
+# Dependencies:
+# sudo apt -y install python3 dpkg
+#
+# Usage:
+# ./bin/deb-cache.py -m seed -a <architecture> -d <archives directory> [-C <cache directory>]
+# ./bin/deb-cache.py -m collect -a <architecture> -d <directory> [-b <build id>] [-C <cache directory>]
+# ./bin/deb-cache.py -m report -r <rootfs> -b <build id> [-n <name>] [-C <cache directory>]
+# ./bin/deb-cache.py -m repo -a <architecture> [-S <suite>] [-c <components>] [-C <cache directory>]
+# ./bin/deb-cache.py -m prune [-s <size cap, e.g. 20G>] [-D <days>] [-C <cache directory>]
+# ./bin/deb-cache.py -m stats [-C <cache directory>]
+#
+# E.g.:
+# ./bin/deb-cache.py -m prune -s 20G -D 90
+
+import datetime
+import fcntl
+import getopt
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+mode = ""
+
+cachedir = os.path.join(os.getcwd(), "cache", "deb")
+
+architecture = ""
+
+directory = ""
+
+rootfs = ""
+
+build = ""
+
+name = ""
+
+suite = "kali-rolling"
+
+components = "main,contrib,non-free,non-free-firmware"
+
+sizecap = ""
+
+days = 0
+
+modes = ("seed", "collect", "report", "repo", "prune", "stats")
+
+size_units = {
+    "": 1,
+    "k": 1024,
+    "m": 1024 ** 2,
+    "g": 1024 ** 3,
+    "t": 1024 ** 4
+    }
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m <{'|'.join(modes)}> [options] (see the top of {prog})"
+        outstr += f"\nE.g. : {prog} -m stats -C cache/deb\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, cachedir, architecture, directory, rootfs, build, name, suite, components, sizecap, days
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:C:a:d:s:r:b:n:S:c:D:",
+            [
+                "mode=",
+                "cachedir=",
+                "arch=",
+                "directory=",
+                "rootfs=",
+                "build=",
+                "name=",
+                "suite=",
+                "components=",
+                "size=",
+                "days="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-C", "--cachedir"):
+                cachedir = os.path.abspath(arg)
+
+            elif opt in ("-a", "--arch"):
+                architecture = arg
+
+            elif opt in ("-d", "--directory"):
+                directory = arg
+
+            elif opt in ("-s", "--size"):
+                sizecap = arg
+
+            elif opt in ("-r", "--rootfs"):
+                rootfs = arg
+
+            elif opt in ("-b", "--build"):
+                build = arg
+
+            elif opt in ("-n", "--name"):
+                name = arg
+
+            elif opt in ("-S", "--suite"):
+                suite = arg
+
+            elif opt in ("-c", "--components"):
+                components = arg
+
+            elif opt in ("-D", "--days"):
+                try:
+                    days = float(arg)
+
+                except ValueError:
+                    bail(f"Invalid number of days: {arg}")
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if mode in ("seed", "collect", "repo") and not architecture:
+        bail("Missing required argument: -a/--arch")
+
+    if mode in ("seed", "collect") and not directory:
+        bail("Missing required argument: -d/--directory")
+
+    if mode == "report" and not (rootfs and build):
+        bail("Missing required argument: -r/--rootfs and -b/--build")
+
+    if mode == "prune" and not (sizecap or days):
+        bail("Missing required argument: -s/--size and/or -D/--days")
+
+    return 0
+
+
+def log(message):
+    print(f"[i] {message}")
+
+
+class Lock:
+    """Cache wide lock, the cache is shared by builds running at the same time"""
+
+    def __enter__(self):
+        os.makedirs(cachedir, exist_ok=True)
+        self.f = open(os.path.join(cachedir, ".lock"), "w")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+def read_index():
+    try:
+        with open(os.path.join(cachedir, "index.json")) as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return {}
+
+
+def write_index(index):
+    path = os.path.join(cachedir, "index.json")
+
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(index, f)
+
+    os.replace(f"{path}.tmp", path)
+
+
+def parse_size(value):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?", value.strip().lower())
+
+    if not match:
+        bail(f"Invalid size: {value}")
+
+    return int(float(match.group(1)) * size_units[match.group(2)])
+
+
+def fmt_size(size):
+    return f"{size / 1024 ** 3:.1f} GiB" if size >= 1024 ** 3 else f"{size / 1024 ** 2:.0f} MiB"
+
+
+def pool_path(sha256):
+    return os.path.join(cachedir, "pool", sha256[:2], f"{sha256}.deb")
+
+
+def file_hash(path):
+    sha256 = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 ** 2), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def control_fields(path):
+    result = subprocess.run(["dpkg-deb", "--field", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    if result.returncode != 0:
+        return None
+
+    return result.stdout.rstrip("\n")
+
+
+def field(control, key):
+    match = re.search(rf"^{key}:\s*(.*)$", control, re.MULTILINE)
+
+    return match.group(1).strip() if match else ""
+
+
+def link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+
+    except OSError:
+        # Not on the same filesystem
+        shutil.copy2(src, dest)
+
+
+def seed():
+    """Hardlink the cached packages for this architecture into an apt archives directory"""
+    index = read_index()
+    os.makedirs(directory, exist_ok=True)
+
+    # Several cached builds of the same (name, version, arch): the latest used wins
+    files = {}
+
+    for sha256, entry in sorted(index.items(), key=lambda e: e[1]["last_used"]):
+        if entry["arch"] in (architecture, "all"):
+            files[entry["file"]] = sha256
+
+    qty = 0
+
+    for file, sha256 in files.items():
+        dest = os.path.join(directory, file)
+
+        if os.path.exists(dest):
+            continue
+
+        try:
+            link_or_copy(pool_path(sha256), dest)
+            qty += 1
+
+        except FileNotFoundError:
+            # Pruned by another build since the index was read
+            pass
+
+    log(f"Package cache: seeded {qty} packages ({architecture}) into {directory}")
+
+
+def collect():
+    """Add the packages in a directory which are not cached yet"""
+    index = read_index()
+    by_file = {e["file"]: sha256 for sha256, e in index.items()}
+    new = {}
+
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".deb") or not entry.is_file(follow_symlinks=False):
+            continue
+
+        # Seeded from the cache (same inode), nothing to do
+        sha256 = by_file.get(entry.name)
+
+        if sha256:
+            try:
+                if os.path.samestat(entry.stat(), os.stat(pool_path(sha256))):
+                    continue
+
+            except FileNotFoundError:
+                pass
+
+        sha256 = file_hash(entry.path)
+
+        if sha256 in index or sha256 in new:
+            continue
+
+        control = control_fields(entry.path)
+
+        if control is None:
+            log(f"Skipping invalid package: {entry.path}")
+            continue
+
+        # Written aside, then renamed, so nobody sees half a file
+        dest = pool_path(sha256)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        link_or_copy(entry.path, tmp)
+        os.replace(tmp, dest)
+
+        new[sha256] = {
+            "name": field(control, "Package"),
+            "version": field(control, "Version"),
+            "arch": field(control, "Architecture") or architecture,
+            "file": entry.name,
+            "size": os.path.getsize(dest),
+            "added": time.time(),
+            "added_by": build,
+            "last_used": time.time(),
+            "hits": 0,
+            "control": control
+            }
+
+    if new:
+        with Lock():
+            index = read_index()
+
+            for sha256, entry in new.items():
+                index.setdefault(sha256, entry)
+
+            write_index(index)
+
+    log(f"Package cache: added {len(new)} packages ({fmt_size(sum(e['size'] for e in new.values()))})")
+
+
+def installed_packages():
+    """(name, version, arch) of every package installed in the rootfs"""
+    installed = set()
+    package = version = arch = ""
+    status = os.path.join(rootfs, "var", "lib", "dpkg", "status")
+
+    try:
+        with open(status) as f:
+            for line in f.read().splitlines() + [""]:
+                if not line:
+                    if package:
+                        installed.add((package, version, arch))
+
+                    package = version = arch = ""
+
+                elif line.startswith("Package:"):
+                    package = line.split(":", 1)[1].strip()
+
+                elif line.startswith("Version:"):
+                    version = line.split(":", 1)[1].strip()
+
+                elif line.startswith("Architecture:"):
+                    arch = line.split(":", 1)[1].strip()
+
+                elif line.startswith("Status:") and "installed" not in line.split():
+                    package = ""
+
+    except OSError as e:
+        bail(f"Cannot read: {status}", str(e))
+
+    return installed
+
+
+def report():
+    """Hits: installed packages which were in the cache before this build"""
+    installed = installed_packages()
+    hits = misses = 0
+    hit_bytes = miss_bytes = 0
+
+    with Lock():
+        index = read_index()
+        found = {}
+
+        for sha256, entry in index.items():
+            found.setdefault((entry["name"], entry["version"], entry["arch"]), []).append(sha256)
+
+        now = time.time()
+
+        for package in installed:
+            cached = [index[s] for s in found.get(package, [])]
+            old = [e for e in cached if e["added_by"] != build]
+
+            if old:
+                hits += 1
+                hit_bytes += old[0]["size"]
+                old[0]["hits"] += 1
+                old[0]["last_used"] = now
+
+            else:
+                misses += 1
+                miss_bytes += cached[0]["size"] if cached else 0
+
+        write_index(index)
+
+        with open(os.path.join(cachedir, "history.jsonl"), "a") as f:
+            f.write(json.dumps({
+                "build": build,
+                "name": name,
+                "time": now,
+                "hits": hits,
+                "misses": misses,
+                "hit_bytes": hit_bytes,
+                "miss_bytes": miss_bytes
+                }) + "\n")
+
+    total = hits + misses
+    log(f"Package cache: {hits} hits, {misses} misses ({hits / total * 100 if total else 0:.0f}%), {fmt_size(hit_bytes)} not downloaded")
+
+
+def repo():
+    """Local stand-in repository (dists/ next to pool/) for offline builds"""
+    with Lock():
+        index = read_index()
+        dists = os.path.join(cachedir, "dists", suite)
+        shutil.rmtree(dists, ignore_errors=True)
+        comps = components.replace(",", " ").split()
+        release_files = []
+
+        for comp in comps:
+            path = os.path.join(comp, f"binary-{architecture}", "Packages")
+            os.makedirs(os.path.join(dists, os.path.dirname(path)), exist_ok=True)
+            stanzas = []
+
+            # Everything goes into the first component, the others are left empty
+            if comp == comps[0]:
+                for sha256, entry in sorted(index.items(), key=lambda e: (e[1]["name"], e[1]["version"])):
+                    if entry["arch"] not in (architecture, "all"):
+                        continue
+
+                    stanzas.append(
+                        f"{entry['control']}\n"
+                        f"Filename: {os.path.relpath(pool_path(sha256), cachedir)}\n"
+                        f"Size: {entry['size']}\n"
+                        f"SHA256: {sha256}\n"
+                        )
+
+            data = "\n".join(stanzas).encode()
+
+            with open(os.path.join(dists, path), "wb") as f:
+                f.write(data)
+
+            release_files.append(f" {hashlib.sha256(data).hexdigest()} {len(data):>16} {path}")
+
+        release = "Origin: Kali ARM package cache\n"
+        release += "Label: Kali ARM package cache\n"
+        release += f"Suite: {suite}\n"
+        release += f"Codename: {suite}\n"
+        release += f"Date: {datetime.datetime.now(datetime.timezone.utc).strftime('%a, %d %b %Y %H:%M:%S UTC')}\n"
+        release += f"Architectures: {architecture} all\n"
+        release += f"Components: {' '.join(comps)}\n"
+        release += "SHA256:\n" + "\n".join(release_files) + "\n"
+
+        with open(os.path.join(dists, "Release"), "w") as f:
+            f.write(release)
+
+    log(f"Package cache: repository {suite} ({architecture}) in {cachedir}")
+
+
+def prune():
+    """Drop packages unused for more than the given days, then least recently used above the size cap"""
+    with Lock():
+        index = read_index()
+        cap = parse_size(sizecap) if sizecap else None
+        now = time.time()
+        removed = []
+        total = sum(e["size"] for e in index.values())
+
+        for sha256, entry in sorted(index.items(), key=lambda e: e[1]["last_used"]):
+            too_old = days and now - entry["last_used"] > days * 86400
+            too_big = cap is not None and total > cap
+
+            if not (too_old or too_big):
+                continue
+
+            try:
+                os.unlink(pool_path(sha256))
+
+            except FileNotFoundError:
+                pass
+
+            total -= entry["size"]
+            removed.append(entry)
+            del index[sha256]
+
+        write_index(index)
+
+    log(f"Package cache: pruned {len(removed)} packages ({fmt_size(sum(e['size'] for e in removed))}), {fmt_size(total)} left")
+
+
+def stats():
+    index = read_index()
+    history = []
+
+    try:
+        with open(os.path.join(cachedir, "history.jsonl")) as f:
+            for line in f:
+                try:
+                    history.append(json.loads(line))
+
+                except json.JSONDecodeError:
+                    pass
+
+    except OSError:
+        pass
+
+    print(f"Package cache: {cachedir}\n")
+    print("| Arch | Packages | Size | Hits |")
+    print("|------|----------|------|------|")
+
+    arches = {}
+
+    for entry in index.values():
+        arch = arches.setdefault(entry["arch"], [0, 0, 0])
+        arch[0] += 1
+        arch[1] += entry["size"]
+        arch[2] += entry["hits"]
+
+    for arch, (qty, size, hits) in sorted(arches.items()):
+        print(f"| {arch} | {qty} | {fmt_size(size)} | {hits} |")
+
+    print("\n| Build | Builds | Hits | Misses | Hit rate | Not downloaded |")
+    print("|-------|--------|------|--------|----------|----------------|")
+
+    builds = {}
+
+    for record in history:
+        total = builds.setdefault(record.get("name") or record["build"], [0, 0, 0, 0])
+        total[0] += 1
+        total[1] += record["hits"]
+        total[2] += record["misses"]
+        total[3] += record["hit_bytes"]
+
+    for build_name, (qty, hits, misses, saved) in sorted(builds.items()):
+        rate = hits / (hits + misses) * 100 if hits + misses else 0
+        print(f"| {build_name} | {qty} | {hits} | {misses} | {rate:.0f}% | {fmt_size(saved)} |")
+
+    hits = sum(r["hits"] for r in history)
+    misses = sum(r["misses"] for r in history)
+    print(f"\nOverall hit rate: {hits / (hits + misses) * 100 if hits + misses else 0:.0f}% ({len(history)} builds)")
+    print(f"Not downloaded: {fmt_size(sum(r['hit_bytes'] for r in history))}")
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if mode == "collect":
+        if not shutil.which("dpkg-deb"):
+            bail("Missing: dpkg-deb", "sudo apt -y install dpkg")
+
+        if not os.path.isdir(directory):
+            bail(f"Missing directory: '{directory}'")
+
+    {
+        "seed": seed,
+        "collect": collect,
+        "report": report,
+        "repo": repo,
+        "prune": prune,
+        "stats": stats
+    }[mode]()
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
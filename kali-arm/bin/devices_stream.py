@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Streaming reader for ./devices.yml, used by the ./bin/generate_*.py scripts.
+#
+# Rather than yaml.safe_load() of the whole file, the YAML parse events are
+# read as the file is read, and one board at a time is built and handed over
+# (with its vendor), so memory is bounded by the biggest board, not the whole
+# catalogue. Each board is built with the same safe loader (types are the same
+# as yaml.safe_load()).
+#
+# Table rows are written to a spool file as they are made, as the page header
+# needs the totals, which are only known at the end (see spool() and write_page()).
+#
+# Dependencies:
+# python3 -m pip install pyyaml --user
+#
+# Usage:
+# import devices_stream
+#
+# for vendor, board in devices_stream.boards("./devices.yml"):
+#     ...
+
+import shutil
+import sys
+import tempfile
+
+import yaml  # python3 -m pip install pyyaml --user
+
+# libyaml when available, it is a lot quicker
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Size of the buffer used to write the tables
+BUFFER_SIZE = 1024 ** 2
+
+
+def node_events(first, events):
+    """All the events of the node starting with first (a scalar, or a whole mapping/sequence)"""
+    node = [first]
+    depth = 1 if isinstance(first, yaml.CollectionStartEvent) else 0
+
+    while depth:
+        event = next(events)
+        node.append(event)
+
+        if isinstance(event, yaml.CollectionStartEvent):
+            depth += 1
+
+        elif isinstance(event, yaml.CollectionEndEvent):
+            depth -= 1
+
+    return node
+
+
+def construct(node):
+    """Python object from the events of one node, with the safe loader"""
+    document = [yaml.StreamStartEvent(), yaml.DocumentStartEvent(), *node, yaml.DocumentEndEvent(), yaml.StreamEndEvent()]
+
+    return yaml.load(yaml.emit(document), Loader=Loader)
+
+
+def boards(file):
+    """Yield (vendor, board) for every board of devices:, one at a time (file: a path, or a text stream)"""
+    try:
+        f = file if hasattr(file, "read") else open(file)
+
+    except OSError as e:
+        print(f"[-] Cannot open input file: {file} - {e}")
+        sys.exit(1)
+
+    with f:
+        events = yaml.parse(f, Loader=Loader)
+
+        # Stream, document and top level mapping
+        for event in events:
+            if isinstance(event, yaml.MappingStartEvent):
+                break
+
+        for event in events:
+            if isinstance(event, yaml.MappingEndEvent):
+                break
+
+            key = event.value if isinstance(event, yaml.ScalarEvent) else None
+            value = next(events)
+
+            if key != "devices" or not isinstance(value, yaml.SequenceStartEvent):
+                node_events(value, events)
+                continue
+
+            # devices: [{vendor: [board, ...]}, ...]
+            for item in events:
+                if isinstance(item, yaml.SequenceEndEvent):
+                    break
+
+                for vendor in events:
+                    if isinstance(vendor, yaml.MappingEndEvent):
+                        break
+
+                    board_list = next(events)
+
+                    if not isinstance(board_list, yaml.SequenceStartEvent):
+                        node_events(board_list, events)
+                        continue
+
+                    for board in events:
+                        if isinstance(board, yaml.SequenceEndEvent):
+                            break
+
+                        yield vendor.value, construct(node_events(board, events))
+
+
+def spool():
+    """Buffered temporary file for the table rows"""
+    return tempfile.TemporaryFile(mode="w+", buffering=BUFFER_SIZE)
+
+
+def write_page(f, header, rows, footer):
+    """header, the spooled rows (copied in chunks), then footer"""
+    f.write(header)
+    rows.seek(0)
+    shutil.copyfileobj(rows, f, BUFFER_SIZE)
+    f.write(footer)
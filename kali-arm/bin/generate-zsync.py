@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to create zsync control files for Kali ARM release images.
+#
+# This should be run after images are created, before ./bin/post-release.py
+# (which then adds "zsync_url" to the rpi-imager.json entry of each image).
+#
+# For every image it reads the UNCOMPRESSED data once (straight from the .img,
+# or streamed out of the .img.xz when there is no .img) and creates:
+# - "<imagedir>/<image>.img.zsync": zsync 0.6.2 control file
+#   (per-block rolling weak checksum + MD4 strong checksum, SHA-1 of the image)
+# Blocks are checksummed in parallel, while the reader carries on streaming.
+#
+# zsync fetches the changed blocks with HTTP range requests from the URL in the
+# control file, so the uncompressed image needs to be published at that URL.
+#
+# Dependencies:
+# sudo apt -y install python3
+# (MD4 from OpenSSL is used when available, then python3-pycryptodome, otherwise
+#  a (slower) built-in implementation)
+#
+# Usage:
+# ./bin/generate-zsync.py -f <image file> [-f <image file>] [-u <base url>] [-b <blocksize>] [-j <jobs>]
+# ./bin/generate-zsync.py -o <image directory> -r <release> [-u <base url>] [-b <blocksize>] [-j <jobs>]
+#
+# E.g.:
+# ./bin/generate-zsync.py -o images/ -r 2022.3
+
+import datetime
+import getopt
+import glob
+import hashlib
+import itertools
+import lzma
+import math
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+imagefiles = []
+
+imagedir = ""
+
+release = ""
+
+baseurl = ""
+
+blocksize = 4096
+
+jobs = os.cpu_count() or 1
+
+# Amount of data handed to a worker at a time (must be a multiple of the blocksize)
+CHUNK_BLOCKS = 4096
+
+ZSYNC_VERSION = "0.6.2"
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -f <image file> [-f <image file>] [-u <base url>] [-b <blocksize>] [-j <jobs>]"
+        outstr += f"\n       {prog} -o <image directory> -r <release> [-u <base url>] [-b <blocksize>] [-j <jobs>]"
+        outstr += f"\nE.g. : {prog} -o images/ -r {datetime.datetime.now().year}.1\n"
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global imagedir, release, baseurl, blocksize, jobs
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hf:o:r:u:b:j:",
+            [
+                "file=",
+                "imagedir=",
+                "release=",
+                "url=",
+                "blocksize=",
+                "jobs="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-f", "--file"):
+                imagefiles.append(arg)
+
+            elif opt in ("-o", "--imagedir"):
+                imagedir = arg.rstrip("/")
+
+            elif opt in ("-r", "--release"):
+                release = arg
+
+            elif opt in ("-u", "--url"):
+                baseurl = arg.rstrip("/")
+
+            elif opt in ("-b", "--blocksize"):
+                try:
+                    blocksize = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid block size: {arg}")
+
+            elif opt in ("-j", "--jobs"):
+                try:
+                    jobs = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of jobs: {arg}")
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if imagedir and not release:
+        bail("Missing required argument: -r/--release")
+
+    if not imagefiles and not imagedir:
+        bail("Missing required argument: -f/--file or -o/--imagedir")
+
+    if blocksize < 512 or blocksize & (blocksize - 1):
+        bail(f"Blocksize must be a power of 2, and at least 512: {blocksize}")
+
+    if release and not baseurl:
+        baseurl = f"https://kali.download/arm-images/kali-{release}"
+
+    return 0
+
+
+def md4_py(data):
+    """Plain MD4 (RFC 1320), for when OpenSSL has it disabled"""
+    def f(x, y, z): return (x & y) | (~x & z)
+    def g(x, y, z): return (x & y) | (x & z) | (y & z)
+    def h(x, y, z): return x ^ y ^ z
+    def rotl(v, s): return ((v << s) | (v >> (32 - s))) & 0xffffffff
+
+    length = len(data)
+    data += b"\x80" + b"\0" * ((55 - length) % 64) + struct.pack("<Q", length * 8)
+    state = [0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476]
+
+    for offset in range(0, len(data), 64):
+        x = struct.unpack_from("<16I", data, offset)
+        a, b, c, d = state
+
+        for i in range(16):
+            k = i
+            a, b, c, d = d, rotl((a + f(b, c, d) + x[k]) & 0xffffffff, (3, 7, 11, 19)[i % 4]), b, c
+
+        for i in range(16):
+            k = (i % 4) * 4 + i // 4
+            a, b, c, d = d, rotl((a + g(b, c, d) + x[k] + 0x5a827999) & 0xffffffff, (3, 5, 9, 13)[i % 4]), b, c
+
+        for i in range(16):
+            k = (0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15)[i]
+            a, b, c, d = d, rotl((a + h(b, c, d) + x[k] + 0x6ed9eba1) & 0xffffffff, (3, 9, 11, 15)[i % 4]), b, c
+
+        state = [(s + v) & 0xffffffff for s, v in zip(state, (a, b, c, d))]
+
+    return struct.pack("<4I", *state)
+
+
+def md4_function():
+    try:
+        hashlib.new("md4", b"")
+        return lambda data: hashlib.new("md4", data).digest()
+
+    except ValueError:
+        pass
+
+    try:
+        from Crypto.Hash import MD4  # python3 -m pip install pycryptodome --user
+        return lambda data: MD4.new(data).digest()
+
+    except ImportError:
+        return md4_py
+
+
+def rsum(block):
+    """zsync weak checksum: a = sum of bytes, b = sum of (bytes left * byte), both 16-bit"""
+    return sum(block) & 0xffff, sum(itertools.accumulate(block)) & 0xffff
+
+
+def checksum_chunk(args):
+    data, size, rsum_len, checksum_len = args
+    md4 = md4_function()
+    out = bytearray()
+
+    # The last block of the image is padded with zeros
+    if len(data) % size:
+        data += b"\0" * (size - len(data) % size)
+
+    for offset in range(0, len(data), size):
+        block = data[offset:offset + size]
+        a, b = rsum(block)
+
+        out += struct.pack(">HH", a, b)[4 - rsum_len:]
+        out += md4(block)[:checksum_len]
+
+    return bytes(out)
+
+
+def hash_lengths(length, size):
+    """Same sums as zsyncmake, so zsync clients get what they expect
+    (its len / blocksize is an integer division, the logs are not)"""
+    seq_matches = 2 if length > size else 1
+    blocks = length // size
+
+    rsum_len = math.ceil(((math.log(length) + math.log(size)) / math.log(2) - 8.6) / seq_matches / 8)
+    rsum_len = min(4, max(2, rsum_len))
+
+    checksum_len = math.ceil((20 + (math.log(length) + math.log(1 + blocks)) / math.log(2)) / seq_matches / 8)
+    checksum_len = max(checksum_len, int((7.9 + (20 + math.log(1 + blocks) / math.log(2))) / 8))
+    checksum_len = min(16, checksum_len)
+
+    return seq_matches, rsum_len, checksum_len
+
+
+def uncompressed_size(file):
+    if not file.endswith(".xz"):
+        return os.path.getsize(file)
+
+    # Read the xz index, rather than decompressing everything twice
+    with open(file, "rb") as f:
+        f.seek(-12, os.SEEK_END)
+        footer = f.read(12)
+        backward_size = (struct.unpack("<I", footer[4:8])[0] + 1) * 4
+        f.seek(-12 - backward_size, os.SEEK_END)
+        index = f.read(backward_size)
+
+    # Index: indicator, number of records, then (unpadded size, uncompressed size) pairs as multibyte integers
+    values = []
+    pos = 1
+
+    while pos < len(index) - 4:
+        value = shift = 0
+
+        while True:
+            byte = index[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+
+            if not byte & 0x80:
+                break
+
+        values.append(value)
+
+        if len(values) == 1 + values[0] * 2:
+            break
+
+    if len(values) < 1 + values[0] * 2:
+        return None
+
+    return sum(values[2::2])
+
+
+def open_image(file):
+    if file.endswith(".xz"):
+        return lzma.open(file, "rb")
+
+    return open(file, "rb")
+
+
+def generate_zsync(file, pool):
+    name = os.path.basename(file)
+
+    if name.endswith(".xz"):
+        name = name[:-3]
+
+    length = uncompressed_size(file)
+
+    if not length:
+        bail(f"Cannot work out the uncompressed size of: {file}")
+
+    seq_matches, rsum_len, checksum_len = hash_lengths(length, blocksize)
+
+    sha1 = hashlib.sha1()
+    pending = []
+    checksums = []
+    total = 0
+
+    with open_image(file) as f:
+        while True:
+            data = f.read(blocksize * CHUNK_BLOCKS)
+
+            if not data:
+                break
+
+            sha1.update(data)
+            total += len(data)
+            pending.append(pool.submit(checksum_chunk, (data, blocksize, rsum_len, checksum_len)))
+
+            # Keep a bounded number of chunks in flight
+            while len(pending) > jobs * 2:
+                checksums.append(pending.pop(0).result())
+
+    checksums.extend(p.result() for p in pending)
+
+    if total != length:
+        bail(f"Size mismatch for {file}: index says {length}, read {total}")
+
+    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file), datetime.timezone.utc)
+    url = f"{baseurl}/{name}" if baseurl else name
+
+    header = f"zsync: {ZSYNC_VERSION}\n"
+    header += f"Filename: {name}\n"
+    header += f"MTime: {mtime.strftime('%a, %d %b %Y %H:%M:%S %z')}\n"
+    header += f"Blocksize: {blocksize}\n"
+    header += f"Length: {length}\n"
+    header += f"Hash-Lengths: {seq_matches},{rsum_len},{checksum_len}\n"
+    header += f"URL: {url}\n"
+    header += f"SHA-1: {sha1.hexdigest()}\n\n"
+
+    output = os.path.join(os.path.dirname(file), f"{name}.zsync")
+
+    try:
+        with open(output, "wb") as f:
+            f.write(header.encode())
+
+            for chunk in checksums:
+                f.write(chunk)
+
+    except OSError as e:
+        bail(f"Cannot write to output file: {output}", str(e))
+
+    print(f"[+] {output} ({math.ceil(length / blocksize)} blocks)")
+
+    return output
+
+
+def find_images():
+    files = []
+
+    for img in sorted(glob.glob(f"{imagedir}/kali-linux-{release}-*.img")) + sorted(glob.glob(f"{imagedir}/kali-linux-{release}-*.img.xz")):
+        # Prefer the uncompressed image, it is much quicker to read
+        if img.endswith(".xz") and img[:-3] in files:
+            continue
+
+        files.append(img)
+
+    return files
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    files = imagefiles + (find_images() if imagedir else [])
+
+    if not files:
+        bail(f"No images found for release {release} in: {imagedir}")
+
+    for file in files:
+        if not os.path.isfile(file):
+            bail(f"Missing: '{file}'! Please create the image before running")
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for file in files:
+            generate_zsync(file, pool)
+
+    # Print result and exit
+    print(f"\nzsync files created\t: {len(files)}")
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -3,7 +3,7 @@
 import sys
 from datetime import datetime
 
-import yaml  # python3 -m pip install pyyaml --user
+import devices_stream  # ./bin/devices_stream.py (python3 -m pip install pyyaml --user)
 
 OUTPUT_FILE = "./device-stats.md"
 INPUT_FILE = "./devices.yml"
@@ -21,48 +21,20 @@ qty_images = 0
 # https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
 
 
-def yaml_parse(content):
-    result = ""
-    lines = content.split("\n")
-
-    for line in lines:
-        if line.strip() and not line.strip().startswith("#"):
-            result += line + "\n"
-
-    return yaml.safe_load(result)
-
-
-def generate_table(data):
+def generate_table(boards, rows):
     global qty_devices, qty_images
 
     default = ""
 
-    table = "| Vendor | [Board](devices.html) | [Images](images.html) |\n"
-    table += "|--------|-----------------------|-----------------------|\n"
-
-    # Iterate over per input (depth 1)
-    for yaml in data["devices"]:
-        # Iterate over vendors
-        for vendor in yaml.keys():
-            # Iterate over board (depth 2)
-            for board in yaml[vendor]:
-                qty_devices += 1
-                qty_images += len(board.get("images", default))
-
-                table += f"| {vendor} | {board.get('name', default)} | {len(board.get('images', default))} |\n"
+    rows.write("| Vendor | [Board](devices.html) | [Images](images.html) |\n")
+    rows.write("|--------|-----------------------|-----------------------|\n")
 
-    return table
+    # Iterate over boards (depth 2), one at a time as they are parsed
+    for vendor, board in boards:
+        qty_devices += 1
+        qty_images += len(board.get("images", default))
 
-
-def read_file(file):
-    try:
-        with open(file) as f:
-            data = f.read()
-
-    except Exception as e:
-        print(f"[-] Cannot open input file: {file} - {e}")
-
-    return data
+        rows.write(f"| {vendor} | {board.get('name', default)} | {len(board.get('images', default))} |\n")
 
 
 def write_file(data, file):
@@ -75,10 +47,7 @@ def write_file(data, file):
             stats = f"- The official [Kali ARM repository](https://gitlab.com/kalilinux/build-scripts/kali-arm) contains [build-scripts]((https://gitlab.com/kalilinux/build-scripts/kali-arm)) to support [**{qty_devices}** Kali ARM devices](devices.html)\n"
             stats += "- [Kali ARM Statistics](index.html)\n\n"
 
-            f.write(str(meta))
-            f.write(str(stats))
-            f.write(str(data))
-            f.write(str(repo_msg))
+            devices_stream.write_page(f, meta + stats, data, repo_msg)
 
             print(f"[+] File: {OUTPUT_FILE} successfully written")
 
@@ -94,15 +63,12 @@ def print_summary():
 
 
 def main(argv):
-    # Assign variables
-    data = read_file(INPUT_FILE)
-
-    # Get data
-    res = yaml_parse(data)
-    generated_markdown = generate_table(res)
+    # Get data, one board at a time, the rows are spooled as they are made
+    with devices_stream.spool() as rows:
+        generate_table(devices_stream.boards(INPUT_FILE), rows)
 
-    # Create markdown file
-    write_file(generated_markdown, OUTPUT_FILE)
+        # Create markdown file
+        write_file(rows, OUTPUT_FILE)
 
     # Print result
     print_summary()
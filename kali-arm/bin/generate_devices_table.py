@@ -4,7 +4,7 @@ import re
 import sys
 from datetime import datetime
 
-import yaml  # python3 -m pip install pyyaml --user
+import devices_stream  # ./bin/devices_stream.py (python3 -m pip install pyyaml --user)
 
 OUTPUT_FILE = "./devices.md"
 INPUT_FILE = "./devices.yml"
@@ -21,16 +21,6 @@ qty_devices = 0
 # https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
 
 
-def yaml_parse(content):
-    result = ""
-    lines = content.split('\n')
-
-    for line in lines:
-        if line.strip() and not line.strip().startswith('#'):
-            result += line + "\n"
-
-    return yaml.safe_load(result)
-
 # https://stackoverflow.com/a/11150413
 
 
@@ -43,60 +33,43 @@ def natural_sort(l):
     return sorted(l, key=alphanum_key)
 
 
-def generate_table(data):
+def generate_table(boards, rows):
     global qty_devices
 
     default = ""
 
-    table = "| Vendor | Board | CPU | CPU Cores | GPU | RAM | RAM Size (MB) | Ethernet | Ethernet Speed (MB) | Wi-Fi | Bluetooth | USB2 | USB3 | Storage |        Notes        |\n"
-    table += "|--------|-------|-----|-----------|-----|-----|---------------|----------|---------------------|-------|-----------|------|------|---------|---------------------|\n"
+    rows.write("| Vendor | Board | CPU | CPU Cores | GPU | RAM | RAM Size (MB) | Ethernet | Ethernet Speed (MB) | Wi-Fi | Bluetooth | USB2 | USB3 | Storage |        Notes        |\n")
+    rows.write("|--------|-------|-----|-----------|-----|-----|---------------|----------|---------------------|-------|-----------|------|------|---------|---------------------|\n")
 
-    # Iterate over per input (depth 1)
-    for yaml in data["devices"]:
-        # Iterate over vendors
-        for vendor in yaml.keys():
-            # Iterate over board (depth 2)
-            for board in yaml[vendor]:
-                qty_devices += 1
+    # Iterate over boards (depth 2), one at a time as they are parsed
+    for vendor, board in boards:
+        qty_devices += 1
 
-                ram_size = ""
+        ram_size = ""
 
-                storage = ""
+        storage = ""
 
-                i = 0
+        i = 0
 
-                for f in natural_sort(board.get("ram-size", default)):
-                    if i > 0:
-                        ram_size += ", "
+        for f in natural_sort(board.get("ram-size", default)):
+            if i > 0:
+                ram_size += ", "
 
-                    ram_size += f
+            ram_size += f
 
-                    i += 1
+            i += 1
 
-                i = 0
+        i = 0
 
-                for f in natural_sort(board.get("storage", default)):
-                    if i > 0:
-                        storage += ", "
+        for f in natural_sort(board.get("storage", default)):
+            if i > 0:
+                storage += ", "
 
-                    storage += f
+            storage += f
 
-                    i += 1
+            i += 1
 
-                table += f"| {vendor} | {board.get('name', default)} | {board.get('cpu', default)} | {board.get('cpu-cores', default)} | {board.get('gpu', default)} | {board.get('ram', default)} | {ram_size} | {board.get('ethernet', default)} | {board.get('ethernet-speed', default)} | {board.get('wifi', default)} | {board.get('bluetooth', default)} | {board.get('usb2', default)} | {board.get('usb3', default)} | {storage} | {board.get('notes', default)} |\n"
-
-    return table
-
-
-def read_file(file):
-    try:
-        with open(file) as f:
-            data = f.read()
-
-    except Exception as e:
-        print(f"[-] Cannot open input file: {file} - {e}")
-
-    return data
+        rows.write(f"| {vendor} | {board.get('name', default)} | {board.get('cpu', default)} | {board.get('cpu-cores', default)} | {board.get('gpu', default)} | {board.get('ram', default)} | {ram_size} | {board.get('ethernet', default)} | {board.get('ethernet-speed', default)} | {board.get('wifi', default)} | {board.get('bluetooth', default)} | {board.get('usb2', default)} | {board.get('usb3', default)} | {storage} | {board.get('notes', default)} |\n")
 
 
 def write_file(data, file):
@@ -109,10 +82,7 @@ def write_file(data, file):
             stats = f"- The official [Kali ARM repository](https://gitlab.com/kalilinux/build-scripts/kali-arm) contains build-scripts to support [**{qty_devices}** Kali ARM devices](device-stats.html)\n"
             stats += "- [Kali ARM Statistics](index.html)\n\n"
 
-            f.write(str(meta))
-            f.write(str(stats))
-            f.write(str(data))
-            f.write(str(repo_msg))
+            devices_stream.write_page(f, meta + stats, data, repo_msg)
 
             print(f"[+] File: {OUTPUT_FILE} successfully written")
 
@@ -127,15 +97,12 @@ def print_summary():
 
 
 def main(argv):
-    # Assign variables
-    data = read_file(INPUT_FILE)
-
-    # Get data
-    res = yaml_parse(data)
-    generated_markdown = generate_table(res)
+    # Get data, one board at a time, the rows are spooled as they are made
+    with devices_stream.spool() as rows:
+        generate_table(devices_stream.boards(INPUT_FILE), rows)
 
-    # Create markdown file
-    write_file(generated_markdown, OUTPUT_FILE)
+        # Create markdown file
+        write_file(rows, OUTPUT_FILE)
 
     # Print result
     print_summary()
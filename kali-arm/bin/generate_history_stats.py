@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to create the trend page of ./devices.yml: devices, images, kernel types,
+# support status & architectures, for every release tag (or every commit of a
+# range which changed ./devices.yml), over time.
+#
+# ./devices.yml is read from the git object store (no checkout), and each blob
+# is parsed once: the totals are cached by blob SHA in <cache dir>/<sha>.json.
+# Blobs not in the cache are parsed in parallel, so re-running it after a new tag
+# only parses the new ./devices.yml (if it changed at all).
+#
+# Dependencies:
+# sudo apt -y install git
+# python3 -m pip install pyyaml --user
+#
+# Usage:
+# ./bin/generate_history_stats.py [-r <revision range>] [-C <cache dir>] [-o <output file>] [-j <jobs>]
+#
+# E.g.:
+# ./bin/generate_history_stats.py
+# ./bin/generate_history_stats.py -r 2022.1..HEAD
+
+import concurrent.futures
+import getopt
+import io
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import devices_stream  # ./bin/devices_stream.py (python3 -m pip install pyyaml --user)
+
+OUTPUT_FILE = "./history-stats.md"
+
+INPUT_FILE = "./devices.yml"
+
+outputfile = OUTPUT_FILE
+
+revisions = ""
+
+cachedir = "./cache/history"
+
+jobs = os.cpu_count() or 1
+
+repo_msg = f"""
+_This table was [generated automatically](https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml) on {datetime.now().strftime('%Y-%B-%d %H:%M:%S')} from the [Kali ARM GitLab repository](https://gitlab.com/kalilinux/build-scripts/kali-arm)_
+"""
+
+qty_revisions = 0
+qty_parsed = 0
+
+# Trend tables: (title, key of the totals)
+TABLES = [
+    ("Kernels", "kernel"),
+    ("Support", "support"),
+    ("Architectures", "architecture")
+    ]
+
+# Bump when the totals change, so the cache is not used
+CACHE_VERSION = 1
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} [-r <revision range>] [-C <cache dir>] [-o <output file>] [-j <jobs>]"
+        outstr += f"\nE.g. : {prog} -r 2022.1..HEAD\n"
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global revisions, cachedir, outputfile, jobs
+
+    try:
+        opts, args = getopt.getopt(argv, "hr:C:o:j:", ["revisions=", "cachedir=", "outputfile=", "jobs="])
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    for opt, arg in opts:
+        if opt == "-h":
+            bail()
+
+        elif opt in ("-r", "--revisions"):
+            revisions = arg
+
+        elif opt in ("-C", "--cachedir"):
+            cachedir = arg
+
+        elif opt in ("-o", "--outputfile"):
+            outputfile = arg
+
+        elif opt in ("-j", "--jobs"):
+            try:
+                jobs = max(1, int(arg))
+
+            except ValueError:
+                bail(f"Invalid number of jobs: {arg}")
+
+        else:
+            bail(f"Unrecognised argument: {opt}")
+
+    return 0
+
+
+def git(*args, stdin=None):
+    try:
+        return subprocess.run(["git", *args], input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+    except (OSError, subprocess.CalledProcessError) as e:
+        bail(f"git {' '.join(args)}", (getattr(e, "stderr", b"") or b"").decode().strip() or str(e))
+
+
+def list_revisions():
+    """[(name, date)] oldest first: every tag, or every commit of the range which changed ./devices.yml"""
+    if revisions:
+        out = git("log", "--reverse", "--date=short", "--format=%h %cd", revisions, "--", INPUT_FILE)
+
+    else:
+        out = git("for-each-ref", "--sort=creatordate", "--format=%(refname:short) %(creatordate:short)", "refs/tags")
+
+    return [tuple(line.split(" ", 1)) for line in out.decode().splitlines() if line]
+
+
+def blob_ids(revs):
+    """{revision: blob SHA} of ./devices.yml, for the revisions which have it"""
+    # Relative to the top of the repository (kali-arm may not be at the top)
+    path = git("rev-parse", "--show-prefix").decode().strip() + os.path.normpath(INPUT_FILE)
+    out = git("cat-file", "--batch-check", stdin="".join(f"{rev}:{path}\n" for rev, _ in revs).encode())
+    blobs = {}
+
+    for (rev, _), line in zip(revs, out.decode().splitlines()):
+        sha, _, kind = line.partition(" ")
+
+        if kind.startswith("blob"):
+            blobs[rev] = sha
+
+    return blobs
+
+
+def read_blobs(shas):
+    """{blob SHA: text}, in one git cat-file"""
+    out = git("cat-file", "--batch", stdin="".join(f"{sha}\n" for sha in shas).encode())
+    texts = {}
+    pos = 0
+
+    for sha in shas:
+        header_end = out.index(b"\n", pos)
+        _, _, size = out[pos:header_end].decode().split(" ")
+        start = header_end + 1
+        texts[sha] = out[start:start + int(size)].decode("utf-8", "replace")
+        pos = start + int(size) + 1
+
+    return texts
+
+
+def totals(text):
+    """Totals of one ./devices.yml (in a worker process)"""
+    default = "unknown"
+    vendors = set()
+    devices = 0
+    images = set()
+    names = set()
+    counts = {key: {} for _, key in TABLES}
+
+    for vendor, board in devices_stream.boards(io.StringIO(text)):
+        vendors.add(vendor)
+        devices += 1
+
+        for image in board.get("images") or []:
+            images.add(f"{image.get('name', default)} ({image.get('architecture', default)})")
+
+            # As ./bin/generate_kernel_stats.py: once per image name
+            if image.get("name") in names:
+                continue
+
+            names.add(image.get("name"))
+
+            for _, key in TABLES:
+                value = str(image.get(key, default)).lower()
+                counts[key][value] = counts[key].get(value, 0) + 1
+
+    return {
+        "version": CACHE_VERSION,
+        "vendors": len(vendors),
+        "devices": devices,
+        "images": len(images),
+        **counts
+        }
+
+
+def load(sha):
+    try:
+        with open(os.path.join(cachedir, f"{sha}.json")) as f:
+            data = json.load(f)
+
+    except (OSError, ValueError):
+        return None
+
+    return data if data.get("version") == CACHE_VERSION else None
+
+
+def save(sha, data):
+    os.makedirs(cachedir, exist_ok=True)
+    tmp = os.path.join(cachedir, f".{sha}.{os.getpid()}")
+
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+
+    os.replace(tmp, os.path.join(cachedir, f"{sha}.json"))
+
+
+def collect(blobs):
+    """{blob SHA: totals}, from the cache, else parsed in parallel"""
+    global qty_parsed
+
+    results = {}
+    missing = []
+
+    for sha in dict.fromkeys(blobs.values()):
+        cached = load(sha)
+
+        if cached:
+            results[sha] = cached
+
+        else:
+            missing.append(sha)
+
+    if missing:
+        texts = read_blobs(missing)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(missing))) as pool:
+            for sha, data in zip(missing, pool.map(totals, [texts[sha] for sha in missing])):
+                save(sha, data)
+                results[sha] = data
+
+    qty_parsed = len(missing)
+
+    return results
+
+
+def generate_table(revs, blobs, results):
+    global qty_revisions
+
+    rows = [(rev, date, results[blobs[rev]]) for rev, date in revs if rev in blobs]
+    qty_revisions = len(rows)
+    column = "Commit" if revisions else "Release"
+
+    table = "## Catalogue\n\n"
+    table += f"| {column} | Date | Vendors | Devices | Images |\n"
+    table += f"|{'-' * (len(column) + 2)}|------|---------|---------|--------|\n"
+
+    for rev, date, data in rows:
+        table += f"| {rev} | {date} | {data['vendors']} | {data['devices']} | {data['images']} |\n"
+
+    for title, key in TABLES:
+        columns = sorted({value for _, _, data in rows for value in data[key]})
+
+        table += f"\n## {title}\n\n"
+        table += f"| {column} | " + " | ".join(c.capitalize() for c in columns) + " |\n"
+        table += f"|{'-' * (len(column) + 2)}|" + "|".join("-" * (len(c) + 2) for c in columns) + "|\n"
+
+        for rev, _, data in rows:
+            table += f"| {rev} | " + " | ".join(str(data[key].get(c, 0)) for c in columns) + " |\n"
+
+    return table
+
+
+def write_file(data, file):
+    try:
+        with open(file, "w") as f:
+            meta = "---\n"
+            meta += "title: Kali ARM History Statistics\n"
+            meta += "---\n\n"
+
+            stats = f"- [`devices.yml`](https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml) over **{qty_revisions}** {'revisions' if revisions else 'releases'}\n"
+            stats += "- [Kali ARM Statistics](index.html)\n\n"
+
+            f.write(str(meta))
+            f.write(str(stats))
+            f.write(str(data))
+            f.write(str(repo_msg))
+
+            print(f"[+] File: {file} successfully written")
+
+    except Exception as e:
+        print(f"[-] Cannot write to output file: {file} - {e}")
+
+    return 0
+
+
+def print_summary(blobs):
+    print(f"Revisions: {qty_revisions}")
+    print(f"Blobs: {len(set(blobs.values()))} ({qty_parsed} parsed, {len(set(blobs.values())) - qty_parsed} cached)")
+
+
+def main(argv):
+    # Parse command-line arguments
+    getargs(argv)
+
+    # Revisions, and the ./devices.yml of each one
+    revs = list_revisions()
+    blobs = blob_ids(revs)
+
+    # Totals of each (unique) ./devices.yml
+    results = collect(blobs)
+
+    # Create markdown file
+    write_file(generate_table(revs, blobs, results), outputfile)
+
+    # Print result
+    print_summary(blobs)
+
+    # Exit
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
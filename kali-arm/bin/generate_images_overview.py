@@ -4,7 +4,7 @@
 import sys
 from datetime import datetime
 
-import yaml  # python3 -m pip install pyyaml --user
+import devices_stream  # ./bin/devices_stream.py (python3 -m pip install pyyaml --user)
 
 OUTPUT_FILE = "./image-overview.md"
 INPUT_FILE = "./devices.yml"
@@ -26,99 +26,71 @@ qty_image_unknown = 0
 # https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
 
 
-def yaml_parse(content):
-    result = ""
-    lines = content.split("\n")
-
-    for line in lines:
-        if line.strip() and not line.strip().startswith("#"):
-            result += line + "\n"
-
-    return yaml.safe_load(result)
-
-
-def generate_table(data):
+def generate_table(boards, rows):
     global qty_devices, qty_images, qty_image_kali, qty_image_community, qty_image_eol, qty_image_unknown
 
     images = []
 
     default = ""
 
-    table = "| [Device Name](https://www.kali.org/docs/arm/) | [Build-Script](https://gitlab.com/kalilinux/build-scripts/kali-arm/) | [Official Image](https://www.kali.org/get-kali/#kali-arm) | Community Image | EOL/Retired Image |\n"
-    table += "|---------------|--------------|----------------|-----------------|---------------|\n"
-
-    # Iterate over per input (depth 1)
-    for yaml in data["devices"]:
-        # Iterate over vendors
-        for vendor in yaml.keys():
-            # Iterate over board (depth 2)
-            for board in yaml[vendor]:
-                qty_devices += 1
-
-                # Iterate over per board
-                for key in board.keys():
-                    # Check if there is an image for the board
-                    if "images" in key:
-                        # Iterate over image (depth 3)
-                        for image in board[key]:
-                            if image["name"] not in images:
-                                # ALT: images.append(image["image"])
-                                images.append(image["name"])
+    rows.write("| [Device Name](https://www.kali.org/docs/arm/) | [Build-Script](https://gitlab.com/kalilinux/build-scripts/kali-arm/) | [Official Image](https://www.kali.org/get-kali/#kali-arm) | Community Image | EOL/Retired Image |\n")
+    rows.write("|---------------|--------------|----------------|-----------------|---------------|\n")
 
-                                qty_images += 1
+    # Iterate over boards (depth 2), one at a time as they are parsed
+    for vendor, board in boards:
+        qty_devices += 1
 
-                                build_script = image.get(
-                                    "build-script",
-                                    default
-                                )
+        # Iterate over per board
+        for key in board.keys():
+            # Check if there is an image for the board
+            if "images" in key:
+                # Iterate over image (depth 3)
+                for image in board[key]:
+                    if image["name"] not in images:
+                        # ALT: images.append(image["image"])
+                        images.append(image["name"])
 
-                                if build_script:
-                                    build_script = f"[{build_script}](https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/{build_script})"
+                        qty_images += 1
 
-                                name = image.get("name", default)
-                                slug = image.get("slug", default)
+                        build_script = image.get(
+                            "build-script",
+                            default
+                        )
 
-                                if name and slug:
-                                    name = f"[{name}](https://www.kali.org/docs/arm/{slug}/)"
+                        if build_script:
+                            build_script = f"[{build_script}](https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/{build_script})"
 
-                                support = image.get("support", default)
+                        name = image.get("name", default)
+                        slug = image.get("slug", default)
 
-                                if support == "kali":
-                                    status = "x |  | "
-                                    qty_image_kali += 1
+                        if name and slug:
+                            name = f"[{name}](https://www.kali.org/docs/arm/{slug}/)"
 
-                                elif support == "community":
-                                    status = " | x | "
-                                    qty_image_community += 1
+                        support = image.get("support", default)
 
-                                elif support == "eol":
-                                    status = " |  | x"
-                                    qty_image_eol += 1
+                        if support == "kali":
+                            status = "x |  | "
+                            qty_image_kali += 1
 
-                                else:
-                                    status = " |  | "
-                                    qty_image_unknown += 1
+                        elif support == "community":
+                            status = " | x | "
+                            qty_image_community += 1
 
-                                table += f"| {name} | {build_script} | {status} |\n"
+                        elif support == "eol":
+                            status = " |  | x"
+                            qty_image_eol += 1
 
-                            # else:
-                            #    print(f"DUP {image["name"]} / {image["image"]}")
+                        else:
+                            status = " |  | "
+                            qty_image_unknown += 1
 
-                if "images" not in board.keys():
-                    print(f"[i] Possible issue with: {board.get('board', default)} (no images)")
+                        rows.write(f"| {name} | {build_script} | {status} |\n")
 
-    return table
+                    # else:
+                    #    print(f"DUP {image["name"]} / {image["image"]}")
 
-
-def read_file(file):
-    try:
-        with open(file) as f:
-            data = f.read()
-
-    except Exception as e:
-        print(f"[-] Cannot open input file: {file} - {e}")
-
-    return data
+        if "images" not in board.keys():
+            print(f"[i] Possible issue with: {board.get('board', default)} (no images)")
 
 
 def write_file(data, file):
@@ -132,10 +104,7 @@ def write_file(data, file):
             stats += f"- The [next release](https://www.kali.org/releases/) cycle will include [**{qty_image_kali}** Kali ARM images](image-stats.html) _([ready to download](https://www.kali.org/get-kali/#kali-arm))_, **{qty_image_community}** images which can be [built](https://gitlab.com/kalilinux/build-scripts/kali-arm), and {qty_image_eol} retired images\n"
             stats += "- [Kali ARM Statistics](index.html)\n\n"
 
-            f.write(str(meta))
-            f.write(str(stats))
-            f.write(str(data))
-            f.write(str(repo_msg))
+            devices_stream.write_page(f, meta + stats, data, repo_msg)
 
             print(f"[+] File: {OUTPUT_FILE} successfully written")
 
@@ -155,15 +124,12 @@ def print_summary():
 
 
 def main(argv):
-    # Assign variables
-    data = read_file(INPUT_FILE)
-
-    # Get data
-    res = yaml_parse(data)
-    generated_markdown = generate_table(res)
+    # Get data, one board at a time, the rows are spooled as they are made
+    with devices_stream.spool() as rows:
+        generate_table(devices_stream.boards(INPUT_FILE), rows)
 
-    # Create markdown file
-    write_file(generated_markdown, OUTPUT_FILE)
+        # Create markdown file
+        write_file(rows, OUTPUT_FILE)
 
     # Print result
     print_summary()
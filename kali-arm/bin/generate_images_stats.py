@@ -4,7 +4,7 @@
 import sys
 from datetime import datetime
 
-import yaml  # python3 -m pip install pyyaml --user
+import devices_stream  # ./bin/devices_stream.py (python3 -m pip install pyyaml --user)
 
 OUTPUT_FILE = "./image-stats.md"
 
@@ -22,40 +22,25 @@ qty_images = 0
 # https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
 
 
-def yaml_parse(content):
-    result = ""
-    lines = content.split("\n")
-
-    for line in lines:
-        if line.strip() and not line.strip().startswith("#"):
-            result += line + "\n"
-
-    return yaml.safe_load(result)
-
-
-def generate_table(data):
+def generate_table(boards):
     global qty_images
 
     images = []
 
     default = ""
 
-    # Iterate over per input (depth 1)
-    for yaml in data["devices"]:
-        # Iterate over vendors
-        for vendor in yaml.keys():
-            # Iterate over board (depth 2)
-            for board in yaml[vendor]:
-                # Iterate over per board
-                for key in board.keys():
-                    # Check if there is an image for the board
-                    if "images" in key:
-                        # Iterate over image (depth 3)
-                        for image in board[key]:
-                            images.append(f"{image.get('name', default)} ({image.get('architecture', default)})")
-
-                if "images" not in board.keys():
-                    print(f"[i] Possible issue with: {board.get('board', default)} (no images)")
+    # Iterate over boards (depth 2), one at a time as they are parsed
+    for vendor, board in boards:
+        # Iterate over per board
+        for key in board.keys():
+            # Check if there is an image for the board
+            if "images" in key:
+                # Iterate over image (depth 3)
+                for image in board[key]:
+                    images.append(f"{image.get('name', default)} ({image.get('architecture', default)})")
+
+        if "images" not in board.keys():
+            print(f"[i] Possible issue with: {board.get('board', default)} (no images)")
 
     table = "| [Image Name](images.html) (Architecture) |\n"
     table += "|---------------------------|\n"
@@ -69,17 +54,6 @@ def generate_table(data):
     return table
 
 
-def read_file(file):
-    try:
-        with open(file) as f:
-            data = f.read()
-
-    except Exception as e:
-        print("[-] Cannot open input file: {} - {}".format(file, e))
-
-    return data
-
-
 def write_file(data, file):
     try:
         with open(file, "w") as f:
@@ -108,12 +82,8 @@ def print_summary():
 
 
 def main(argv):
-    # Assign variables
-    data = read_file(INPUT_FILE)
-
-    # Get data
-    res = yaml_parse(data)
-    generated_markdown = generate_table(res)
+    # Get data, one board at a time
+    generated_markdown = generate_table(devices_stream.boards(INPUT_FILE))
 
     # Create markdown file
     write_file(generated_markdown, OUTPUT_FILE)
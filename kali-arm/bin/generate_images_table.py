@@ -3,7 +3,7 @@
 import sys
 from datetime import datetime
 
-import yaml  # python3 -m pip install pyyaml --user
+import devices_stream  # ./bin/devices_stream.py (python3 -m pip install pyyaml --user)
 
 OUTPUT_FILE = "./images.md"
 
@@ -23,18 +23,7 @@ qty_images_released = 0
 # https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
 
 
-def yaml_parse(content):
-    result = ""
-    lines = content.split("\n")
-
-    for line in lines:
-        if line.strip() and not line.strip().startswith("#"):
-            result += line + "\n"
-
-    return yaml.safe_load(result)
-
-
-def generate_table(data):
+def generate_table(boards, rows):
     global qty_devices, qty_images, qty_images_released
 
     images = []
@@ -43,60 +32,43 @@ def generate_table(data):
 
     default = ""
 
-    table = "| Image Name | Filename | Architecture | Preferred | Support | [Documentation](https://www.kali.org/docs/arm/) | [Kernel](kernel-stats.html) | Kernel Version | Notes |\n"
-    table += "|------------|----------|--------------|-----------|---------|-------------------------------------------------|-----------------------|----------------|-------|\n"
+    rows.write("| Image Name | Filename | Architecture | Preferred | Support | [Documentation](https://www.kali.org/docs/arm/) | [Kernel](kernel-stats.html) | Kernel Version | Notes |\n")
+    rows.write("|------------|----------|--------------|-----------|---------|-------------------------------------------------|-----------------------|----------------|-------|\n")
 
-    # Iterate over per input (depth 1)
-    for yaml in data["devices"]:
-        # Iterate over vendors
-        for vendor in yaml.keys():
-            # Iterate over board (depth 2)
-            for board in yaml[vendor]:
-                qty_devices += 1
+    # Iterate over boards (depth 2), one at a time as they are parsed
+    for vendor, board in boards:
+        qty_devices += 1
 
-                # Iterate over per board
-                for key in board.keys():
-                    # Check if there is an image for the board
-                    if "images" in key:
-                        # Iterate over image (depth 3)
-                        for image in board[key]:
-                            #qty_images += 1
-                            images.append(f"{image.get('name', default)}")
+        # Iterate over per board
+        for key in board.keys():
+            # Check if there is an image for the board
+            if "images" in key:
+                # Iterate over image (depth 3)
+                for image in board[key]:
+                    #qty_images += 1
+                    images.append(f"{image.get('name', default)}")
 
-                            support = image.get("support", default)
+                    support = image.get("support", default)
 
-                            if support == "kali":
-                                #qty_images_released += 1
-                                images_released.append(
-                                    f"{image.get('name', default)}")
+                    if support == "kali":
+                        #qty_images_released += 1
+                        images_released.append(
+                            f"{image.get('name', default)}")
 
-                            slug = image.get("slug", default)
+                    slug = image.get("slug", default)
 
-                            if slug:
-                                slug = f"[{slug}](https://www.kali.org/docs/arm/{slug}/)"
+                    if slug:
+                        slug = f"[{slug}](https://www.kali.org/docs/arm/{slug}/)"
 
-                            table += f"| {image.get('name', default)} | {image.get('image', default)} | {image.get('architecture', default)} | {image.get('preferred-image', default)} | {image.get('support', default)} | {slug} | {image.get('kernel', default)} | {image.get('kernel-version', default)} | {image.get('image-notes', default)} |\n"
+                    rows.write(f"| {image.get('name', default)} | {image.get('image', default)} | {image.get('architecture', default)} | {image.get('preferred-image', default)} | {image.get('support', default)} | {slug} | {image.get('kernel', default)} | {image.get('kernel-version', default)} | {image.get('image-notes', default)} |\n")
 
-                if "images" not in board.keys():
-                    print(
-                        f"[i] Possible issue with: {board.get('board', default)} (no images)")
+        if "images" not in board.keys():
+            print(
+                f"[i] Possible issue with: {board.get('board', default)} (no images)")
 
     qty_images = len(set(images))
     qty_images_released = len(set(images_released))
 
-    return table
-
-
-def read_file(file):
-    try:
-        with open(file) as f:
-            data = f.read()
-
-    except Exception as e:
-        print(f"[-] Cannot open input file: {file} - {e}")
-
-    return data
-
 
 def write_file(data, file):
     try:
@@ -109,10 +81,7 @@ def write_file(data, file):
             stats += f"- The [next release](https://www.kali.org/releases/) cycle will include [**{qty_images_released}** Kali ARM images](image-stats.html) _([ready to download](https://www.kali.org/get-kali/#kali-arm))_\n"
             stats += "- [Kali ARM Statistics](index.html)\n\n"
 
-            f.write(str(meta))
-            f.write(str(stats))
-            f.write(str(data))
-            f.write(str(repo_msg))
+            devices_stream.write_page(f, meta + stats, data, repo_msg)
 
             print(f"[+] File: {OUTPUT_FILE} successfully written")
 
@@ -129,15 +98,12 @@ def print_summary():
 
 
 def main(argv):
-    # Assign variables
-    data = read_file(INPUT_FILE)
-
-    # Get data
-    res = yaml_parse(data)
-    generated_markdown = generate_table(res)
+    # Get data, one board at a time, the rows are spooled as they are made
+    with devices_stream.spool() as rows:
+        generate_table(devices_stream.boards(INPUT_FILE), rows)
 
-    # Create markdown file
-    write_file(generated_markdown, OUTPUT_FILE)
+        # Create markdown file
+        write_file(rows, OUTPUT_FILE)
 
     # Print result
     print_summary()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to create and apply block level deltas between two releases of the
+# same Kali ARM image (kali-linux-<release>-<image>).
+#
+# Create: the previous (old) raw image is memory-mapped and indexed by block
+# hash; the index is an open addressing hash table in a memory-mapped file
+# ("<old image>.blockidx"), so it does not need to fit in RAM and is reused for
+# every delta made against the same image. Each block of the current (new)
+# image is then either:
+# - a copy of a block found anywhere in the old image (runs are merged)
+# - all zeros
+# - new data, stored in the patch
+# The patch file is xz compressed, and records the SHA-256 of both images.
+#
+# Apply: rebuilds the new image from the old one and the patch, then verifies it
+# against the SHA-256 in the patch, and if given, extract_sha256 (rpi-imager.json)
+# or the .img.sha256sum file created at build time.
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/image-delta.py -m create -s <old image> -n <new image> -p <patch file> [-b <blocksize>]
+# ./bin/image-delta.py -m apply -s <old image> -p <patch file> -n <output image> [-x <sha256 or .sha256sum file>]
+#
+# E.g.:
+# ./bin/image-delta.py -m create -s images/kali-linux-2022.2-raspberry-pi-arm64.img -n images/kali-linux-2022.3-raspberry-pi-arm64.img -p images/kali-linux-2022.3-raspberry-pi-arm64.img.delta
+# ./bin/image-delta.py -m apply -s kali-linux-2022.2-raspberry-pi-arm64.img -p kali-linux-2022.3-raspberry-pi-arm64.img.delta -n kali-linux-2022.3-raspberry-pi-arm64.img -x kali-linux-2022.3-raspberry-pi-arm64.img.sha256sum
+
+import datetime
+import getopt
+import hashlib
+import lzma
+import mmap
+import os
+import struct
+import sys
+
+mode = ""
+
+oldimage = ""
+
+newimage = ""
+
+patchfile = ""
+
+expected_sha256 = ""
+
+blocksize = 4096
+
+MAGIC = b"KALIDLT1"
+
+# magic, blocksize, old length, new length, old sha256, new sha256
+HEADER = struct.Struct("<8sIQQ32s32s")
+
+# op, block count (+ first old block for OP_COPY)
+OP = struct.Struct("<BQ")
+OP_COPY = 1
+OP_ZERO = 2
+OP_DATA = 3
+OP_END = 0
+
+INDEX_MAGIC = b"KALIIDX1"
+
+# magic, blocksize, slots, old length, old mtime
+INDEX_HEADER = struct.Struct("<8sIQQQ")
+INDEX_SLOT = struct.Struct("<QQ")
+
+qty_copy = 0
+qty_zero = 0
+qty_data = 0
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        year = datetime.datetime.now().year
+        outstr += f"\n\nUsage: {prog} -m create -s <old image> -n <new image> -p <patch file> [-b <blocksize>]"
+        outstr += f"\n       {prog} -m apply -s <old image> -p <patch file> -n <output image> [-x <sha256 or .sha256sum file>]"
+        outstr += f"\nE.g. : {prog} -m create -s kali-linux-{year - 1}.4-raspberry-pi-arm64.img -n kali-linux-{year}.1-raspberry-pi-arm64.img -p kali-linux-{year}.1-raspberry-pi-arm64.img.delta\n"
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, oldimage, newimage, patchfile, expected_sha256, blocksize
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:s:n:p:x:b:",
+            [
+                "mode=",
+                "source=",
+                "new=",
+                "patch=",
+                "sha256=",
+                "blocksize="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-s", "--source"):
+                oldimage = arg
+
+            elif opt in ("-n", "--new"):
+                newimage = arg
+
+            elif opt in ("-p", "--patch"):
+                patchfile = arg
+
+            elif opt in ("-x", "--sha256"):
+                expected_sha256 = arg
+
+            elif opt in ("-b", "--blocksize"):
+                try:
+                    blocksize = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid block size: {arg}")
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in ("create", "apply"):
+        bail("Missing required argument: -m/--mode (create or apply)")
+
+    if not oldimage or not newimage or not patchfile:
+        bail("Missing required argument: -s/--source, -n/--new and -p/--patch")
+
+    if blocksize < 512 or blocksize & (blocksize - 1):
+        bail(f"Blocksize must be a power of 2, and at least 512: {blocksize}")
+
+    return 0
+
+
+def block_key(block):
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(block, digest_size=8).digest(), "little") or 1
+
+
+def file_sha256(file):
+    sha256 = hashlib.sha256()
+
+    with open(file, "rb") as f:
+        while True:
+            data = f.read(16 * 1024 ** 2)
+
+            if not data:
+                break
+
+            sha256.update(data)
+
+    return sha256.digest()
+
+
+def open_index(old, old_map):
+    """Memory-mapped hash table of (block hash -> first old block), built once per old image"""
+    st = os.stat(old)
+    blocks = len(old_map) // blocksize
+    # Keep the table at most half full, so probes stay short
+    slots = 1 << max(10, (blocks * 2).bit_length())
+    index = f"{old}.blockidx"
+    header = INDEX_HEADER.pack(INDEX_MAGIC, blocksize, slots, st.st_size, st.st_mtime_ns)
+    size = INDEX_HEADER.size + slots * INDEX_SLOT.size
+
+    if os.path.isfile(index) and os.path.getsize(index) == size:
+        with open(index, "rb") as f:
+            if f.read(INDEX_HEADER.size) == header:
+                print(f"[i] Using block index: {index}")
+
+                with open(index, "r+b") as f:
+                    return mmap.mmap(f.fileno(), 0), slots
+
+    print(f"[i] Creating block index: {index} ({blocks} blocks)")
+
+    with open(index, "w+b") as f:
+        f.truncate(size)
+        table = mmap.mmap(f.fileno(), 0)
+
+    mask = slots - 1
+    zero = bytes(blocksize)
+
+    for num in range(blocks):
+        block = old_map[num * blocksize:(num + 1) * blocksize]
+
+        if block == zero:
+            continue
+
+        key = block_key(block)
+        slot = key & mask
+
+        while True:
+            offset = INDEX_HEADER.size + slot * INDEX_SLOT.size
+            current, _ = INDEX_SLOT.unpack_from(table, offset)
+
+            if current == key:
+                break
+
+            if current == 0:
+                INDEX_SLOT.pack_into(table, offset, key, num)
+                break
+
+            slot = (slot + 1) & mask
+
+    # Only mark the index as valid once it is complete
+    table[:INDEX_HEADER.size] = header
+    table.flush()
+
+    return table, slots
+
+
+def lookup(table, mask, key):
+    slot = key & mask
+
+    while True:
+        current, num = INDEX_SLOT.unpack_from(table, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+
+        if current == key:
+            return num
+
+        if current == 0:
+            return None
+
+        slot = (slot + 1) & mask
+
+
+def create():
+    global qty_copy, qty_zero, qty_data
+
+    old_size = os.path.getsize(oldimage)
+    new_size = os.path.getsize(newimage)
+
+    if old_size < blocksize:
+        bail(f"Old image is too small: {oldimage}")
+
+    print(f"[i] Hashing: {oldimage}")
+    old_sha256 = file_sha256(oldimage)
+
+    with open(oldimage, "rb") as f_old, open(newimage, "rb") as f_new:
+        old_map = mmap.mmap(f_old.fileno(), 0, access=mmap.ACCESS_READ)
+        table, slots = open_index(oldimage, old_map)
+        mask = slots - 1
+        zero = bytes(blocksize)
+        new_sha256 = hashlib.sha256()
+
+        out = open(patchfile, "w+b")
+
+        # The header is stored uncompressed in front of the xz stream, and as
+        # the new sha256 is only known at the end, it is written afterwards
+        out.write(bytes(HEADER.size))
+
+        with lzma.open(out, "wb", preset=6) as patch:
+            run_op, run_start, run_count, run_data = None, 0, 0, []
+
+            def flush():
+                if run_op == OP_COPY:
+                    patch.write(OP.pack(OP_COPY, run_count) + struct.pack("<Q", run_start))
+
+                elif run_op == OP_ZERO:
+                    patch.write(OP.pack(OP_ZERO, run_count))
+
+                elif run_op == OP_DATA:
+                    patch.write(OP.pack(OP_DATA, run_count))
+                    patch.write(b"".join(run_data))
+
+            print(f"[i] Comparing: {newimage}")
+
+            for num in range((new_size + blocksize - 1) // blocksize):
+                block = f_new.read(blocksize)
+                new_sha256.update(block)
+                block = block.ljust(blocksize, b"\0")
+
+                if block == zero:
+                    op, start = OP_ZERO, 0
+                    qty_zero += 1
+
+                else:
+                    found = lookup(table, mask, block_key(block))
+
+                    # Confirm the match, a 64-bit hash is not proof
+                    if found is not None and old_map[found * blocksize:(found + 1) * blocksize] == block:
+                        op, start = OP_COPY, found
+                        qty_copy += 1
+
+                    else:
+                        op, start = OP_DATA, 0
+                        qty_data += 1
+
+                if op == run_op and (op != OP_COPY or start == run_start + run_count):
+                    run_count += 1
+
+                    if op == OP_DATA:
+                        run_data.append(block)
+
+                        # Do not hold long runs of new data in memory
+                        if run_count >= 4096:
+                            flush()
+                            run_op, run_count, run_data = None, 0, []
+
+                    continue
+
+                flush()
+                run_op, run_start, run_count, run_data = op, start, 1, [block] if op == OP_DATA else []
+
+            flush()
+            patch.write(OP.pack(OP_END, 0))
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, blocksize, old_size, new_size, old_sha256, new_sha256.digest()))
+        out.close()
+
+        table.close()
+        old_map.close()
+
+    total = qty_copy + qty_zero + qty_data
+
+    print("\nStats:")
+    print(f"  - Blocks\t: {total} ({blocksize} bytes)")
+    print(f"  - Copied\t: {qty_copy} ({qty_copy * 100 / total:.1f}%)")
+    print(f"  - Zero\t: {qty_zero} ({qty_zero * 100 / total:.1f}%)")
+    print(f"  - New\t\t: {qty_data} ({qty_data * 100 / total:.1f}%)")
+    print(f"  - Patch size\t: {os.path.getsize(patchfile) / 1024 ** 2:.1f} MiB (image: {new_size / 1024 ** 2:.1f} MiB)")
+    print(f"\nPatch file created\t: {patchfile}")
+
+
+def read_expected():
+    if not expected_sha256:
+        return ""
+
+    if os.path.isfile(expected_sha256):
+        with open(expected_sha256) as f:
+            return f.read().split()[0].lower()
+
+    return expected_sha256.lower()
+
+
+def apply():
+    global qty_copy, qty_zero, qty_data
+
+    expected = read_expected()
+
+    with open(patchfile, "rb") as f:
+        magic, size, old_size, new_size, old_sha256, new_sha256 = HEADER.unpack(f.read(HEADER.size))
+
+        if magic != MAGIC:
+            bail(f"Not a Kali ARM image delta: {patchfile}")
+
+        print(f"[i] Checking: {oldimage}")
+
+        if os.path.getsize(oldimage) != old_size or file_sha256(oldimage) != old_sha256:
+            bail(f"{oldimage} is not the image this patch was made against", f"Expected {old_size} bytes (sha256: {old_sha256.hex()})")
+
+        if expected and expected != new_sha256.hex():
+            bail(f"{patchfile} does not create the expected image", f"Patch creates {new_sha256.hex()}, expected {expected}")
+
+        body_offset = f.tell()
+
+    with open(oldimage, "rb") as f_old, open(patchfile, "rb") as f_patch, open(newimage, "wb") as out:
+        old_map = mmap.mmap(f_old.fileno(), 0, access=mmap.ACCESS_READ)
+        f_patch.seek(body_offset)
+        pos = 0
+
+        with lzma.open(f_patch, "rb") as patch:
+            while True:
+                op, count = OP.unpack(patch.read(OP.size))
+
+                if op == OP_END:
+                    break
+
+                if op == OP_COPY:
+                    start = struct.unpack("<Q", patch.read(8))[0] * size
+                    out.write(old_map[start:start + count * size])
+                    qty_copy += count
+
+                elif op == OP_ZERO:
+                    # Leave a hole, the file is truncated/extended at the end
+                    out.seek(count * size, os.SEEK_CUR)
+                    qty_zero += count
+
+                elif op == OP_DATA:
+                    out.write(patch.read(count * size))
+                    qty_data += count
+
+                else:
+                    bail(f"Corrupt patch file: {patchfile}", f"Unknown operation {op}")
+
+        out.truncate(new_size)
+        old_map.close()
+
+    print(f"[i] Verifying: {newimage}")
+    result = file_sha256(newimage)
+
+    if result != new_sha256:
+        bail(f"Verification failed: {newimage}", f"sha256 is {result.hex()}, expected {new_sha256.hex()}")
+
+    print("\nStats:")
+    print(f"  - Copied\t: {qty_copy} blocks")
+    print(f"  - Zero\t: {qty_zero} blocks")
+    print(f"  - New\t\t: {qty_data} blocks")
+    print(f"  - sha256\t: {result.hex()} (OK)")
+    print(f"\nImage created\t: {newimage}")
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    for file in (oldimage, newimage if mode == "create" else patchfile):
+        if not os.path.isfile(file):
+            bail(f"Missing: '{file}'")
+
+    if mode == "create":
+        create()
+
+    else:
+        apply()
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,803 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to look inside Kali ARM images, without root, loop devices or mounting.
+#
+# The image file is memory-mapped, the partition table (MBR or GPT) is read,
+# and the partitions are read as ext2/3/4 (extents and block maps, read only)
+# or FAT12/16/32 (with long file names). Paths are resolved from the root of
+# each partition, following symlinks (e.g. /lib -> usr/lib).
+#
+# - ls: directory listing
+# - cat: a file, to stdout or -O <output file>
+# - scan: every image of a release, creating for each one:
+#   - "<imagedir>/<image>.img.packages": package manifest (name, version, arch)
+#   and printing the kernel version(s) and /etc/os-release of each image.
+#   With -u, the "kernel-version" of each image in ./devices.yml is updated
+#   (a line edit, comments & layout are kept)
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/image-inspect.py -m ls -f <image> -P <path> [-p <partition>]
+# ./bin/image-inspect.py -m cat -f <image> -P <path> [-p <partition>] [-O <output file>]
+# ./bin/image-inspect.py -m scan -o <image directory> -r <release> [-i <input file>] [-u]
+#
+# E.g.:
+# ./bin/image-inspect.py -m cat -f images/kali-linux-2022.3-raspberry-pi-arm64.img -P /etc/os-release
+# ./bin/image-inspect.py -m scan -o images/ -r 2022.3 -u
+
+import calendar
+import getopt
+import glob
+import mmap
+import os
+import re
+import stat
+import struct
+import sys
+import time
+
+mode = ""
+
+imagefile = ""
+
+path = ""
+
+partition = 0
+
+outputfile = ""
+
+imagedir = ""
+
+release = ""
+
+inputfile = "./devices.yml"
+
+update = False
+
+modes = ("ls", "cat", "scan")
+
+qty_images = 0
+qty_updated = 0
+
+# How many symlinks to follow, before giving up (loops)
+MAX_SYMLINKS = 40
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m ls -f <image> -P <path> [-p <partition>]"
+        outstr += f"\n       {prog} -m cat -f <image> -P <path> [-p <partition>] [-O <output file>]"
+        outstr += f"\n       {prog} -m scan -o <image directory> -r <release> [-i <input file>] [-u]"
+        outstr += f"\nE.g. : {prog} -m cat -f images/kali-linux-2022.3-raspberry-pi-arm64.img -P /etc/os-release\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, imagefile, path, partition, outputfile, imagedir, release, inputfile, update
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:f:P:p:O:o:r:i:u",
+            [
+                "mode=",
+                "file=",
+                "path=",
+                "partition=",
+                "outputfile=",
+                "imagedir=",
+                "release=",
+                "inputfile=",
+                "update"
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-f", "--file"):
+                imagefile = arg
+
+            elif opt in ("-P", "--path"):
+                path = arg
+
+            elif opt in ("-p", "--partition"):
+                try:
+                    partition = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid partition number: {arg}")
+
+            elif opt in ("-O", "--outputfile"):
+                outputfile = arg
+
+            elif opt in ("-o", "--imagedir"):
+                imagedir = arg.rstrip("/")
+
+            elif opt in ("-r", "--release"):
+                release = arg
+
+            elif opt in ("-i", "--inputfile"):
+                inputfile = arg
+
+            elif opt in ("-u", "--update"):
+                update = True
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if mode in ("ls", "cat") and not (imagefile and path):
+        bail("Missing required argument: -f/--file and -P/--path")
+
+    if mode == "scan" and not (imagedir and release):
+        bail("Missing required argument: -o/--imagedir and -r/--release")
+
+    return 0
+
+
+class FsError(Exception):
+    pass
+
+
+def partitions(data):
+    """(start, size) in bytes of every partition, from the MBR or GPT"""
+    if data[510:512] != b"\x55\xaa":
+        return [(0, len(data))]
+
+    parts = []
+
+    if data[512:520] == b"EFI PART":
+        entries_lba, count, entry_size = struct.unpack_from("<QII", data, 512 + 72)
+
+        for i in range(count):
+            first, last = struct.unpack_from("<QQ", data, entries_lba * 512 + i * entry_size + 32)
+
+            if first:
+                parts.append((first * 512, (last - first + 1) * 512))
+
+        return parts
+
+    for i in range(4):
+        ptype = data[446 + i * 16 + 4]
+        first, sectors = struct.unpack_from("<II", data, 446 + i * 16 + 8)
+
+        if ptype and ptype not in (0x05, 0x0f, 0x85):
+            parts.append((first * 512, sectors * 512))
+
+    # A filesystem without a partition table (the MBR signature is also in FAT boot sectors)
+    if not parts:
+        return [(0, len(data))]
+
+    return parts
+
+
+class Ext4:
+    """Read only ext2/3/4: extents, block maps, fast symlinks"""
+
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+        sb = offset + 1024
+
+        if struct.unpack_from("<H", data, sb + 56)[0] != 0xef53:
+            raise FsError("not ext2/3/4")
+
+        self.block_size = 1024 << struct.unpack_from("<I", data, sb + 24)[0]
+        self.first_data_block = struct.unpack_from("<I", data, sb + 20)[0]
+        self.inodes_per_group = struct.unpack_from("<I", data, sb + 40)[0]
+        rev_level = struct.unpack_from("<I", data, sb + 76)[0]
+        self.inode_size = struct.unpack_from("<H", data, sb + 88)[0] if rev_level else 128
+        incompat = struct.unpack_from("<I", data, sb + 96)[0]
+        self.is_64bit = bool(incompat & 0x80)
+        self.desc_size = struct.unpack_from("<H", data, sb + 254)[0] if self.is_64bit else 32
+        self.gdt = offset + (self.first_data_block + 1) * self.block_size
+
+    def block(self, num):
+        return self.offset + num * self.block_size
+
+    def inode(self, num):
+        group, index = divmod(num - 1, self.inodes_per_group)
+        desc = self.gdt + group * self.desc_size
+        table = struct.unpack_from("<I", self.data, desc + 8)[0]
+
+        if self.is_64bit and self.desc_size >= 64:
+            table |= struct.unpack_from("<I", self.data, desc + 0x28)[0] << 32
+
+        pos = self.block(table) + index * self.inode_size
+        mode, size_lo = struct.unpack_from("<HxxI", self.data, pos)
+        flags = struct.unpack_from("<I", self.data, pos + 32)[0]
+        size_hi = struct.unpack_from("<I", self.data, pos + 108)[0]
+
+        return {
+            "mode": mode,
+            "size": size_lo | size_hi << 32,
+            "flags": flags,
+            "mtime": struct.unpack_from("<I", self.data, pos + 16)[0],
+            "i_block": bytes(self.data[pos + 40:pos + 100])
+            }
+
+    def extents(self, node):
+        """(logical block, physical block, length, initialised) from an extent tree"""
+        magic, entries, _, depth = struct.unpack_from("<HHHH", node, 0)
+
+        if magic != 0xf30a:
+            raise FsError("corrupt extent tree")
+
+        for i in range(entries):
+            entry = 12 + i * 12
+
+            if depth == 0:
+                logical, length, start_hi, start_lo = struct.unpack_from("<IHHI", node, entry)
+                initialised = length <= 32768
+
+                yield logical, start_lo | start_hi << 32, length if initialised else length - 32768, initialised
+
+            else:
+                _, leaf_lo, leaf_hi = struct.unpack_from("<IIH", node, entry)
+                child = self.block(leaf_lo | leaf_hi << 32)
+
+                yield from self.extents(self.data[child:child + self.block_size])
+
+    def block_map(self, i_block):
+        """(logical block, physical block, 1, True) from direct & indirect block pointers"""
+        pointers = struct.unpack("<15I", i_block)
+        per_block = self.block_size // 4
+        logical = 0
+
+        def walk(block, level):
+            nonlocal logical
+
+            if level == 0:
+                if block:
+                    yield logical, block, 1, True
+
+                logical += 1
+                return
+
+            if not block:
+                logical += per_block ** level
+                return
+
+            start = self.block(block)
+
+            for child in struct.unpack_from(f"<{per_block}I", self.data, start):
+                yield from walk(child, level - 1)
+
+        for num, pointer in enumerate(pointers):
+            yield from walk(pointer, max(0, num - 11))
+
+    def read_inode(self, node):
+        size = node["size"]
+
+        # Fast symlink, or inline data
+        if (stat.S_ISLNK(node["mode"]) and size < 60 and not node["flags"] & 0x80000) or node["flags"] & 0x10000000:
+            return node["i_block"][:size]
+
+        out = bytearray(size)
+        runs = self.extents(node["i_block"]) if node["flags"] & 0x80000 else self.block_map(node["i_block"])
+
+        for logical, physical, length, initialised in runs:
+            pos = logical * self.block_size
+
+            if pos >= size or not initialised:
+                continue
+
+            want = min(length * self.block_size, size - pos)
+            start = self.block(physical)
+            out[pos:pos + want] = self.data[start:start + want]
+
+        return bytes(out)
+
+    def listdir(self, node):
+        data = self.read_inode(node)
+        entries = {}
+        pos = 0
+
+        while pos + 8 <= len(data):
+            num, rec_len, name_len = struct.unpack_from("<IHB", data, pos)
+
+            if rec_len < 8:
+                break
+
+            if num:
+                name = data[pos + 8:pos + 8 + name_len].decode("utf-8", "surrogateescape")
+
+                if name not in (".", ".."):
+                    entries[name] = num
+
+            pos += rec_len
+
+        return entries
+
+    def root(self):
+        return 2
+
+
+class Fat:
+    """Read only FAT12/16/32, with long file names (names are case insensitive)"""
+
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+        boot = bytes(data[offset:offset + 512])
+
+        if boot[510:512] != b"\x55\xaa" or boot[0] not in (0xeb, 0xe9):
+            raise FsError("not FAT")
+
+        sector, self.cluster_sectors, reserved, fats, root_entries, total16, _, fat_size16 = struct.unpack_from("<HBHBHHBH", boot, 11)
+        total32, fat_size32, _, _, self.root_cluster = struct.unpack_from("<IIHHI", boot, 32)
+
+        if not sector or not self.cluster_sectors:
+            raise FsError("not FAT")
+
+        fat_size = fat_size16 or fat_size32
+        total = total16 or total32
+        root_sectors = (root_entries * 32 + sector - 1) // sector
+
+        self.sector = sector
+        self.cluster_size = sector * self.cluster_sectors
+        self.fat = offset + reserved * sector
+        self.root_dir = self.fat + fats * fat_size * sector
+        self.root_size = root_sectors * sector
+        self.data_start = self.root_dir + self.root_size
+        clusters = (total - reserved - fats * fat_size - root_sectors) // self.cluster_sectors
+        self.bits = 12 if clusters < 4085 else 16 if clusters < 65525 else 32
+
+    def next_cluster(self, cluster):
+        if self.bits == 12:
+            value = struct.unpack_from("<H", self.data, self.fat + cluster * 3 // 2)[0]
+            value = value >> 4 if cluster & 1 else value & 0xfff
+
+            return None if value >= 0xff8 else value
+
+        if self.bits == 16:
+            value = struct.unpack_from("<H", self.data, self.fat + cluster * 2)[0]
+
+            return None if value >= 0xfff8 else value
+
+        value = struct.unpack_from("<I", self.data, self.fat + cluster * 4)[0] & 0x0fffffff
+
+        return None if value >= 0x0ffffff8 else value
+
+    def chain(self, cluster):
+        seen = set()
+
+        while cluster and cluster >= 2 and cluster not in seen:
+            seen.add(cluster)
+            start = self.data_start + (cluster - 2) * self.cluster_size
+
+            yield self.data[start:start + self.cluster_size]
+
+            cluster = self.next_cluster(cluster)
+
+    def read_inode(self, node):
+        if node.get("root") and self.bits != 32:
+            return bytes(self.data[self.root_dir:self.root_dir + self.root_size])
+
+        data = b"".join(self.chain(node["cluster"]))
+
+        if stat.S_ISDIR(node["mode"]):
+            return data
+
+        return data[:node["size"]]
+
+    def listdir(self, node):
+        data = self.read_inode(node)
+        entries = {}
+        long_name = []
+
+        for pos in range(0, len(data) - 31, 32):
+            entry = data[pos:pos + 32]
+
+            if entry[0] == 0:
+                break
+
+            if entry[0] == 0xe5:
+                long_name = []
+                continue
+
+            attr = entry[11]
+
+            if attr == 0x0f:
+                part = entry[1:11] + entry[14:26] + entry[28:32]
+                long_name.insert(0, part.decode("utf-16-le", "ignore").split("\0")[0].rstrip("￿"))
+                continue
+
+            if attr & 0x08:
+                long_name = []
+                continue
+
+            if long_name:
+                name = "".join(long_name)
+
+            else:
+                base = entry[0:8].decode("ascii", "replace").rstrip()
+                ext = entry[8:11].decode("ascii", "replace").rstrip()
+
+                # Lower case flags (Windows NT)
+                base = base.lower() if entry[12] & 0x08 else base
+                ext = ext.lower() if entry[12] & 0x10 else ext
+                name = f"{base}.{ext}" if ext else base
+
+            long_name = []
+
+            if name in (".", ".."):
+                continue
+
+            cluster = struct.unpack_from("<H", entry, 26)[0] | struct.unpack_from("<H", entry, 20)[0] << 16
+            mtime, mdate = struct.unpack_from("<HH", entry, 22)
+
+            try:
+                mtime = calendar.timegm((1980 + (mdate >> 9), (mdate >> 5) & 0x0f, mdate & 0x1f,
+                                         mtime >> 11, (mtime >> 5) & 0x3f, (mtime & 0x1f) * 2)) if mdate else 0
+
+            except (OverflowError, ValueError):
+                mtime = 0
+
+            entries[name] = {
+                "mode": (stat.S_IFDIR | 0o755) if attr & 0x10 else (stat.S_IFREG | 0o644),
+                "size": struct.unpack_from("<I", entry, 28)[0],
+                "cluster": cluster,
+                "mtime": mtime
+                }
+
+        return entries
+
+    def root(self):
+        return {"mode": stat.S_IFDIR | 0o755, "size": 0, "cluster": self.root_cluster, "root": True, "mtime": 0}
+
+
+class Filesystem:
+    """Path lookups on top of Ext4 or Fat"""
+
+    def __init__(self, data, offset):
+        self.fs = None
+
+        for kind in (Ext4, Fat):
+            try:
+                self.fs = kind(data, offset)
+                break
+
+            except (FsError, struct.error):
+                pass
+
+        if not self.fs:
+            raise FsError("unknown filesystem")
+
+    def node(self, ref):
+        return self.fs.inode(ref) if isinstance(self.fs, Ext4) else ref
+
+    def lookup(self, wanted, follow=True):
+        parts = [p for p in wanted.split("/") if p]
+        done = []
+        node = self.node(self.fs.root())
+        links = 0
+
+        while parts:
+            part = parts.pop(0)
+
+            if part == ".":
+                continue
+
+            # ".." and symlinks: start again from the root, with the path rewritten
+            if part == "..":
+                parts = done[:-1] + parts
+                done = []
+                node = self.node(self.fs.root())
+                continue
+
+            if not stat.S_ISDIR(node["mode"]):
+                raise FileNotFoundError(wanted)
+
+            entries = self.fs.listdir(node)
+
+            if isinstance(self.fs, Fat):
+                entries = {k.lower(): v for k, v in entries.items()}
+                part = part.lower()
+
+            if part not in entries:
+                raise FileNotFoundError(wanted)
+
+            child = self.node(entries[part])
+
+            if stat.S_ISLNK(child["mode"]) and (parts or follow):
+                links += 1
+
+                if links > MAX_SYMLINKS:
+                    raise FileNotFoundError(f"{wanted}: too many symlinks")
+
+                target = self.fs.read_inode(child).decode("utf-8", "surrogateescape")
+                parts = ([] if target.startswith("/") else done) + [p for p in target.split("/") if p] + parts
+                done = []
+                node = self.node(self.fs.root())
+                continue
+
+            done.append(part)
+            node = child
+
+        return node
+
+    def read(self, wanted):
+        node = self.lookup(wanted)
+
+        if stat.S_ISDIR(node["mode"]):
+            raise IsADirectoryError(wanted)
+
+        return self.fs.read_inode(node)
+
+    def listdir(self, wanted):
+        node = self.lookup(wanted)
+
+        if not stat.S_ISDIR(node["mode"]):
+            raise NotADirectoryError(wanted)
+
+        entries = self.fs.listdir(node)
+
+        return {name: self.node(ref) for name, ref in sorted(entries.items())}
+
+
+class Image:
+    """A memory-mapped image file and its filesystems"""
+
+    def __init__(self, file):
+        self.f = open(file, "rb")
+        self.data = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.filesystems = []
+
+        for start, size in partitions(self.data):
+            try:
+                self.filesystems.append(Filesystem(self.data, start))
+
+            except (FsError, struct.error, IndexError):
+                self.filesystems.append(None)
+
+    def close(self):
+        self.data.close()
+        self.f.close()
+
+    def find(self, wanted, func):
+        """func(filesystem, path) on the chosen partition, or the first one where it works"""
+        if partition:
+            if not 0 < partition <= len(self.filesystems) or not self.filesystems[partition - 1]:
+                raise FileNotFoundError(f"{wanted}: no readable partition {partition}")
+
+            return func(self.filesystems[partition - 1], wanted)
+
+        for fs in self.filesystems:
+            if not fs:
+                continue
+
+            try:
+                return func(fs, wanted)
+
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+        raise FileNotFoundError(wanted)
+
+    def read(self, wanted):
+        return self.find(wanted, Filesystem.read)
+
+    def listdir(self, wanted):
+        return self.find(wanted, Filesystem.listdir)
+
+
+def fmt_mode(mode):
+    return stat.filemode(mode)
+
+
+def packages(status):
+    """(name, version, arch) of the installed packages, from /var/lib/dpkg/status"""
+    installed = []
+    fields = {}
+
+    for line in status.decode("utf-8", "replace").splitlines() + [""]:
+        if not line:
+            if fields.get("Package") and "installed" in fields.get("Status", "").split():
+                installed.append((fields["Package"], fields.get("Version", ""), fields.get("Architecture", "")))
+
+            fields = {}
+
+        elif not line.startswith(" ") and ":" in line:
+            key, value = line.split(":", 1)
+            fields[key] = value.strip()
+
+    return sorted(installed)
+
+
+def inspect(file):
+    """Kernel version(s), os-release & package manifest of one image"""
+    image = Image(file)
+    result = {"kernels": [], "os-release": {}, "packages": []}
+
+    try:
+        for modules in ("/usr/lib/modules", "/lib/modules"):
+            try:
+                result["kernels"] = sorted(image.listdir(modules))
+                break
+
+            except FileNotFoundError:
+                pass
+
+        try:
+            for line in image.read("/etc/os-release").decode("utf-8", "replace").splitlines():
+                if "=" in line:
+                    key, value = line.split("=", 1)
+                    result["os-release"][key] = value.strip('"')
+
+        except FileNotFoundError:
+            pass
+
+        try:
+            result["packages"] = packages(image.read("/var/lib/dpkg/status"))
+
+        except FileNotFoundError:
+            pass
+
+    finally:
+        image.close()
+
+    return result
+
+
+def update_devices(versions):
+    """Set kernel-version of the images in devices.yml, as a line edit (keeps comments & layout)"""
+    global qty_updated
+
+    try:
+        with open(inputfile) as f:
+            lines = f.readlines()
+
+    except OSError as e:
+        bail(f"Cannot open input file: {inputfile}", str(e))
+
+    current = None
+
+    for num, line in enumerate(lines):
+        match = re.match(r'^\s*- image:\s*"?([^"\s]+)"?', line)
+
+        if match:
+            current = match.group(1)
+            continue
+
+        match = re.match(r'^(\s*kernel-version:\s*)"?([^"\n]*)"?(.*)$', line)
+
+        if match and current in versions and match.group(2) != versions[current]:
+            lines[num] = f'{match.group(1)}"{versions[current]}"{match.group(3)}\n'
+            qty_updated += 1
+
+    with open(inputfile, "w") as f:
+        f.writelines(lines)
+
+
+def scan():
+    global qty_images
+
+    files = sorted(glob.glob(f"{imagedir}/kali-linux-{release}-*.img"))
+
+    if not files:
+        bail(f"No images found for release {release} in: {imagedir}", "Only uncompressed .img files can be read")
+
+    versions = {}
+
+    print("| Image | Kernel | OS | Packages |")
+    print("|-------|--------|----|----------|")
+
+    for file in files:
+        name = os.path.basename(file)[len(f"kali-linux-{release}-"):]
+
+        try:
+            result = inspect(file)
+
+        except (OSError, ValueError) as e:
+            print(f"[-] {file}: {e}", file=sys.stderr)
+            continue
+
+        qty_images += 1
+
+        if result["packages"]:
+            with open(f"{file}.packages", "w") as f:
+                for package in result["packages"]:
+                    f.write("\t".join(package) + "\n")
+
+        # Several kernels (e.g. Raspberry Pi): the highest one is what gets listed
+        if result["kernels"]:
+            versions[name] = sorted(result["kernels"], key=lambda v: [int(n) if n.isdigit() else n for n in re.split(r"(\d+)", v)])[-1]
+
+        print(f"| {name} | {', '.join(result['kernels'])} | {result['os-release'].get('PRETTY_NAME', '')} | {len(result['packages'])} |")
+
+    if update:
+        update_devices(versions)
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    start = time.monotonic()
+
+    if mode == "scan":
+        scan()
+
+        # Print result and exit
+        print("\nStats:")
+        print(f"  - Images\t: {qty_images}")
+
+        if update:
+            print(f"  - Updated\t: {qty_updated} kernel-version in {inputfile}")
+
+        print(f"  - Time\t: {time.monotonic() - start:.1f}s")
+
+        exit(0)
+
+    if not os.path.isfile(imagefile):
+        bail(f"Missing: '{imagefile}'")
+
+    image = Image(imagefile)
+
+    try:
+        if mode == "ls":
+            for name, node in image.listdir(path).items():
+                mtime = time.strftime("%Y-%m-%d %H:%M", time.gmtime(node["mtime"]))
+                print(f"{fmt_mode(node['mode'])} {node['size']:>12} {mtime} {name}")
+
+        elif mode == "cat":
+            data = image.read(path)
+
+            if outputfile:
+                with open(outputfile, "wb") as f:
+                    f.write(data)
+
+            else:
+                sys.stdout.buffer.write(data)
+
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError) as e:
+        bail(f"Cannot read: {e}", f"Not found in any partition of {imagefile}")
+
+    except FsError as e:
+        bail(f"Cannot read: {imagefile}", str(e))
+
+    finally:
+        image.close()
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
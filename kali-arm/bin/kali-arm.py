@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Single entry point for the ./bin/ tools.
+#
+# Each subcommand is one (or more) of the ./bin/ scripts, which is only imported
+# when that subcommand is run (so "-h", or any other subcommand, does not pay
+# for PyYAML, or any other module it does not use). The script's main() is then
+# called with the rest of the arguments, as if it was run on its own.
+#
+# It can also be packed as a zipapp (a single file, with every script in it,
+# already byte-compiled), and measure its own startup:
+# - "zipapp": creates the archive
+# - "startup": times each subcommand up to (and not including) running it, i.e.
+#   interpreter, this script and the imports, and fails if any is over the target
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/kali-arm.py <subcommand> [<arguments>]
+# ./bin/kali-arm.py zipapp [-o <output file>]
+# ./bin/kali-arm.py startup [-n <runs>] [-t <target ms>] [<subcommand> ...]
+#
+# E.g.:
+# ./bin/kali-arm.py pre-release -i devices.yml -r 2022.3 -o images/
+# ./bin/kali-arm.py zipapp -o kali-arm.pyz && ./kali-arm.pyz startup -t 100
+
+import os
+import sys
+
+# Subcommand: (script(s), description), the scripts are run in order
+COMMANDS = {
+    "stats": (["generate_devices_stats", "generate_images_stats", "generate_kernel_stats"], "Generate the statistics pages from ./devices.yml"),
+    "tables": (["generate_devices_table", "generate_images_table", "generate_images_overview"], "Generate the table pages from ./devices.yml"),
+    "history": (["generate_history_stats"], "Generate the trend page of ./devices.yml over the releases"),
+    "pre-release": (["pre-release"], "Create the release manifest"),
+    "post-release": (["post-release"], "Create the release JSON for the website"),
+    "assemble-image": (["assemble-image"], "Assemble a disk image without root"),
+    "copy-tree": (["copy-tree"], "Copy a rootfs to the image partitions"),
+    "build-report": (["build-report"], "Report on the build stage telemetry"),
+    "generate-zsync": (["generate-zsync"], "Create .zsync control files for the images"),
+    "image-delta": (["image-delta"], "Create & apply deltas between two images"),
+    "image-inspect": (["image-inspect"], "Read files from an image, without mounting it"),
+    "kernel-cache": (["kernel-cache"], "Kernel build cache"),
+    "deb-cache": (["deb-cache"], "Shared package cache"),
+    "xz-blocks": (["xz-blocks"], "Multi-block xz images"),
+    "compress-bench": (["compress-bench"], "Benchmark & pick the image compression"),
+    "blob-store": (["blob-store"], "Firmware/BSP blob store"),
+    "patch-matrix": (["patch-matrix"], "Check which kernel patches apply to kernel tree(s)"),
+    "rootfs-size": (["rootfs-size"], "Smallest safe size of the root filesystem"),
+    "punch-holes": (["punch-holes"], "Punch holes over the free blocks of an image"),
+    "cgroup-governor": (["cgroup-governor"], "Run a build in its own cgroup (v2)"),
+    "rootfs-index": (["rootfs-index"], "Index the rootfs of images, and report what they share"),
+    "native-steps": (["native-steps"], "Run the architecture independent steps with the host's tools"),
+    "reproducible": (["reproducible"], "Clamp image timestamps, & diff two builds")
+}
+
+# Default startup target (milliseconds)
+STARTUP_TARGET = 100
+
+# Set when run by "startup", only import the scripts
+STARTUP_ENV = "KALI_ARM_STARTUP"
+
+
+def usage(prog):
+    outstr = f"\nUsage: {prog} <subcommand> [<arguments>]\n\nSubcommands:\n"
+
+    for command, (_, description) in COMMANDS.items():
+        outstr += f"  {command:<16}{description}\n"
+
+    outstr += f"  {'zipapp':<16}Pack the tools as a single file (zipapp)\n"
+    outstr += f"  {'startup':<16}Measure the startup of each subcommand\n"
+    outstr += f"\nE.g. : {prog} pre-release -h\n"
+
+    return outstr
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += "\n" + usage(prog)
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def run(command, argv):
+    """Import the subcommand's script(s), and run each main() with argv"""
+    import importlib
+
+    prog = sys.argv[0]
+
+    for name in COMMANDS[command][0]:
+        # Not "import <name>", as most of the scripts have a "-" in their name
+        module = importlib.import_module(name)
+
+        if os.environ.get(STARTUP_ENV):
+            continue
+
+        # As if it was run on its own, for len(sys.argv) & its usage message
+        sys.argv = [f"{prog} {command}", *argv]
+
+        try:
+            module.main(argv)
+
+        except SystemExit as e:
+            if e.code:
+                return e.code
+
+    return 0
+
+
+def zipapp(argv):
+    """Pack every script of ./bin/ in a zipapp, with unchecked hash-based .pyc beside each .py"""
+    import getopt
+    import py_compile
+    import shutil
+    import tempfile
+    import zipapp
+
+    outputfile = "kali-arm.pyz"
+
+    try:
+        opts, args = getopt.getopt(argv, "ho:", ["outputfile="])
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    for opt, arg in opts:
+        if opt == "-h":
+            bail()
+
+        elif opt in ("-o", "--outputfile"):
+            outputfile = arg
+
+    bindir = os.path.dirname(os.path.abspath(__file__))
+
+    if not os.path.isdir(bindir):
+        bail(f"Cannot read the scripts from: {bindir}", "Run zipapp from ./bin/kali-arm.py, not from an archive")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in sorted(os.listdir(bindir)):
+            if not name.endswith(".py"):
+                continue
+
+            # kali-arm.py is the archive's __main__.py (so it is "kali-arm.pyz <subcommand>")
+            dest = "__main__.py" if name == os.path.basename(__file__) else name
+            shutil.copy(os.path.join(bindir, name), os.path.join(tmpdir, dest))
+
+            # zipimport does not read __pycache__/, and a .pyc which does not check its
+            # source is not thrown away because of the zip's 2 second timestamps
+            if dest != "__main__.py":
+                py_compile.compile(os.path.join(tmpdir, dest), cfile=os.path.join(tmpdir, dest + "c"), doraise=True,
+                                   invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+
+        # Stored, not deflated: quicker to import from
+        zipapp.create_archive(tmpdir, outputfile, interpreter="/usr/bin/env python3")
+
+    print(f"[+] File: {outputfile} successfully written")
+
+    return 0
+
+
+def startup(argv):
+    """Median wall time (ms) of each subcommand, up to running it"""
+    import getopt
+    import statistics
+    import subprocess
+    import time
+
+    runs = 10
+    target = STARTUP_TARGET
+
+    try:
+        opts, args = getopt.getopt(argv, "hn:t:", ["runs=", "target="])
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    for opt, arg in opts:
+        if opt == "-h":
+            bail()
+
+        elif opt in ("-n", "--runs"):
+            try:
+                runs = max(1, int(arg))
+
+            except ValueError:
+                bail(f"Invalid number of runs: {arg}")
+
+        elif opt in ("-t", "--target"):
+            try:
+                target = float(arg)
+
+            except ValueError:
+                bail(f"Invalid target (ms): {arg}")
+
+    for command in args:
+        if command not in COMMANDS:
+            bail(f"Unknown subcommand: '{command}'")
+
+    # The archive, or this script
+    entry = sys.argv[0]
+    env = dict(os.environ, **{STARTUP_ENV: "1"})
+    failed = 0
+
+    print("| Subcommand | Startup (ms) |")
+    print("|------------|--------------|")
+
+    for command in [""] + (args or list(COMMANDS)):
+        cmd = [sys.executable, entry] + ([command] if command else ["-h"])
+        times = []
+
+        for _ in range(runs):
+            start = time.monotonic()
+            subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append((time.monotonic() - start) * 1000)
+
+        median = statistics.median(times)
+        mark = ""
+
+        if median > target:
+            mark = " (over target)"
+            failed += 1
+
+        print(f"| {command or '-h'} | {median:.1f}{mark} |")
+
+    print(f"\n[i] Target: {target:g} ms, {failed} over")
+
+    return 1 if failed else 0
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(argv) < 1 or argv[0] in ("-h", "--help"):
+        print(usage(sys.argv[0]))
+        exit(0)
+
+    command = argv[0]
+
+    if command == "zipapp":
+        exit(zipapp(argv[1:]))
+
+    elif command == "startup":
+        exit(startup(argv[1:]))
+
+    elif command not in COMMANDS:
+        bail(f"Unknown subcommand: '{command}'")
+
+    exit(run(command, argv[1:]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
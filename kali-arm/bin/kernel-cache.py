@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to manage the kernel build cache, for build-scripts which compile
+# their own kernel (kernel_cache="yes" in builder.txt).
+#
+# It keeps, under the cache directory (default: ./cache/kernel):
+# - "src/": a persistent (shallow) source tree per (repository, ref), which is
+#   refreshed and cloned locally into work_dir instead of a full network clone
+# - "ccache/": a compiler object cache, shared across builds and boards
+#   ("bin/" holds the ccache masquerade links for the cross compilers)
+# - "history.jsonl": one record per kernel build (cache key, ccache hits/misses)
+#
+# The cache key of a build is made from the kernel commit, the kernel config
+# (./kernel-configs/ file or in-tree defconfig), the patch list and the
+# toolchain version; a build with a key which has been seen before should be
+# (almost) all ccache hits.
+# Sources are evicted least recently used first, to keep the cache under a size cap.
+#
+# See kernel_clone(), kernel_cache_start() and kernel_cache_finish() in
+# ./common.d/functions.sh
+#
+# Dependencies:
+# sudo apt -y install python3 git ccache
+#
+# Usage:
+# ./bin/kernel-cache.py -m source -r <repository> -b <ref> -d <destination> [-C <cache directory>]
+# ./bin/kernel-cache.py -m start -d <kernel source> -c <config> [-p <patch>] [-t <cross compile prefix>] [-n <name>] [-C <cache directory>]
+# ./bin/kernel-cache.py -m finish -k <cache key> [-C <cache directory>]
+# ./bin/kernel-cache.py -m stats [-C <cache directory>]
+# ./bin/kernel-cache.py -m evict -s <size cap, e.g. 50G> [-C <cache directory>]
+#
+# E.g.:
+# ./bin/kernel-cache.py -m source -r https://github.com/gateworks/linux-newport -b v5.15.15-newport -d base/gateworks-newport/working/usr/src/kernel
+
+import datetime
+import fcntl
+import getopt
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+mode = ""
+
+cachedir = os.path.join(os.getcwd(), "cache", "kernel")
+
+repository = ""
+
+ref = ""
+
+destination = ""
+
+config = ""
+
+patches = []
+
+cross_compile = ""
+
+name = ""
+
+key = ""
+
+sizecap = ""
+
+modes = ("source", "start", "finish", "stats", "evict")
+
+size_units = {
+    "": 1,
+    "k": 1024,
+    "m": 1024 ** 2,
+    "g": 1024 ** 3,
+    "t": 1024 ** 4
+    }
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m <{'|'.join(modes)}> [options] (see the top of {prog})"
+        outstr += f"\nE.g. : {prog} -m stats -C cache/kernel\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, cachedir, repository, ref, destination, config, cross_compile, name, key, sizecap
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:C:r:b:d:c:p:t:n:k:s:",
+            [
+                "mode=",
+                "cachedir=",
+                "repository=",
+                "ref=",
+                "destination=",
+                "config=",
+                "patch=",
+                "cross-compile=",
+                "name=",
+                "key=",
+                "size="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-C", "--cachedir"):
+                cachedir = os.path.abspath(arg)
+
+            elif opt in ("-r", "--repository"):
+                repository = arg
+
+            elif opt in ("-b", "--ref"):
+                ref = arg
+
+            elif opt in ("-d", "--destination"):
+                destination = arg.rstrip("/")
+
+            elif opt in ("-c", "--config"):
+                config = arg
+
+            elif opt in ("-p", "--patch"):
+                patches.append(arg)
+
+            elif opt in ("-t", "--cross-compile"):
+                cross_compile = arg
+
+            elif opt in ("-n", "--name"):
+                name = arg
+
+            elif opt in ("-k", "--key"):
+                key = arg
+
+            elif opt in ("-s", "--size"):
+                sizecap = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if mode == "source" and not (repository and ref and destination):
+        bail("Missing required argument: -r/--repository, -b/--ref and -d/--destination")
+
+    if mode == "start" and not (destination and config):
+        bail("Missing required argument: -d/--destination and -c/--config")
+
+    if mode == "finish" and not key:
+        bail("Missing required argument: -k/--key")
+
+    if mode == "evict" and not sizecap:
+        bail("Missing required argument: -s/--size")
+
+    return 0
+
+
+def log(message):
+    # stdout is used to hand values back to the build-scripts
+    print(f"[i] {message}", file=sys.stderr)
+
+
+def run(cmd, cwd=None, check=True):
+    result = subprocess.run(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    if check and result.returncode != 0:
+        bail(f"Command failed: {' '.join(cmd)}", result.stderr.strip())
+
+    return result
+
+
+class Lock:
+    """Cache wide lock, the cache is shared by builds running at the same time"""
+
+    def __enter__(self):
+        os.makedirs(cachedir, exist_ok=True)
+        self.f = open(os.path.join(cachedir, ".lock"), "w")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+def read_state():
+    try:
+        with open(os.path.join(cachedir, "state.json")) as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return {"sources": {}, "builds": {}}
+
+
+def write_state(state):
+    path = os.path.join(cachedir, "state.json")
+
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f, indent=2)
+
+    os.replace(f"{path}.tmp", path)
+
+
+def dir_size(path):
+    total = 0
+
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_blocks * 512
+
+            except OSError:
+                pass
+
+    return total
+
+
+def parse_size(value):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?", value.strip().lower())
+
+    if not match:
+        bail(f"Invalid size: {value}")
+
+    return int(float(match.group(1)) * size_units[match.group(2)])
+
+
+def fmt_size(size):
+    return f"{size / 1024 ** 3:.1f} GiB"
+
+
+def source_id(repo, branch):
+    slug = re.sub(r"[^A-Za-z0-9._-]", "_", branch)
+
+    return f"{hashlib.sha1(repo.encode()).hexdigest()[:12]}-{slug}"
+
+
+def source():
+    """Refresh the cached tree for (repository, ref), then clone it into destination"""
+    src_id = source_id(repository, ref)
+    path = os.path.join(cachedir, "src", src_id)
+
+    with Lock():
+        if os.path.isdir(os.path.join(path, ".git")):
+            log(f"Kernel source cache hit: {repository} ({ref})")
+
+            if run(["git", "-C", path, "fetch", "--quiet", "--depth", "1", "origin", ref], check=False).returncode == 0:
+                run(["git", "-C", path, "reset", "--quiet", "--hard", "FETCH_HEAD"])
+
+            else:
+                log(f"Could not refresh {repository} ({ref}), using the cached tree")
+
+        else:
+            log(f"Kernel source cache miss: {repository} ({ref})")
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            run(["git", "clone", "--quiet", "--depth", "1", "-b", ref, repository, path])
+
+        run(["git", "-C", path, "clean", "--quiet", "-fdx"])
+        commit = run(["git", "-C", path, "rev-parse", "HEAD"]).stdout.strip()
+
+        # Local clone: objects are hardlinked when on the same filesystem
+        shutil.rmtree(destination, ignore_errors=True)
+        run(["git", "clone", "--quiet", path, destination])
+        run(["git", "-C", destination, "remote", "set-url", "origin", repository])
+
+        state = read_state()
+        state["sources"][src_id] = {
+            "repository": repository,
+            "ref": ref,
+            "commit": commit,
+            "last_used": time.time(),
+            "size": dir_size(path)
+            }
+        write_state(state)
+
+    print(commit)
+
+
+def file_hash(path):
+    sha256 = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        sha256.update(f.read())
+
+    return sha256.hexdigest()
+
+
+def config_hash(src):
+    """A ./kernel-configs/ file, or the name of an in-tree defconfig"""
+    if os.path.isfile(config):
+        return file_hash(config)
+
+    found = glob.glob(os.path.join(src, "arch", "*", "configs", config))
+
+    if found:
+        return file_hash(found[0])
+
+    # Not something we can hash (e.g. fetched later), fall back to the name
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+def toolchain_version():
+    if not shutil.which(f"{cross_compile}gcc"):
+        bail(f"Missing compiler: {cross_compile}gcc")
+
+    return run([f"{cross_compile}gcc", "--version"]).stdout.splitlines()[0]
+
+
+def ccache_stats():
+    result = run(["ccache", "--print-stats"], check=False)
+
+    if result.returncode != 0:
+        return {}
+
+    stats = {}
+
+    for line in result.stdout.splitlines():
+        field, _, value = line.partition("\t")
+
+        if value.strip().isdigit():
+            stats[field] = int(value)
+
+    return stats
+
+
+def masquerade():
+    """ccache links named after the compilers, put first in PATH by kernel_cache_start()"""
+    ccache = shutil.which("ccache")
+
+    if not ccache:
+        bail("Missing: ccache", "sudo apt -y install ccache")
+
+    bindir = os.path.join(cachedir, "bin")
+    os.makedirs(bindir, exist_ok=True)
+
+    for compiler in {f"{cross_compile}gcc", "gcc", "cc"}:
+        link = os.path.join(bindir, compiler)
+
+        if not os.path.islink(link):
+            os.symlink(ccache, link)
+
+    return bindir
+
+
+def start():
+    """Work out the cache key of this build, and snapshot the ccache counters"""
+    commit = run(["git", "-C", destination, "rev-parse", "HEAD"], check=False).stdout.strip()
+
+    parts = [
+        f"commit={commit}",
+        f"config={config_hash(destination)}",
+        f"toolchain={toolchain_version()}"
+        ]
+
+    for patch in patches:
+        parts.append(f"patch={os.path.basename(patch)}:{file_hash(patch)}")
+
+    build_key = hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+    with Lock():
+        bindir = masquerade()
+
+        state = read_state()
+        seen = build_key in state["builds"]
+        state["builds"].setdefault(build_key, {"name": name, "parts": parts, "builds": 0})
+        state["builds"][build_key]["started"] = time.time()
+        state["builds"][build_key]["ccache"] = ccache_stats()
+        write_state(state)
+
+    log(f"Kernel cache key: {build_key} ({'seen before' if seen else 'new'})")
+
+    print(f"{build_key} {bindir}")
+
+
+def finish():
+    with Lock():
+        state = read_state()
+
+        if key not in state["builds"]:
+            bail(f"Unknown kernel cache key: {key}")
+
+        build = state["builds"][key]
+        before = build.pop("ccache", {})
+        after = ccache_stats()
+        delta = {k: after.get(k, 0) - before.get(k, 0) for k in after}
+
+        hits = delta.get("direct_cache_hit", 0) + delta.get("preprocessed_cache_hit", 0)
+        misses = delta.get("cache_miss", 0)
+        seconds = time.time() - build.get("started", time.time())
+
+        build["builds"] += 1
+        build["last_used"] = time.time()
+        write_state(state)
+
+        record = {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "key": key,
+            "name": build.get("name", ""),
+            "hits": hits,
+            "misses": misses,
+            "seconds": round(seconds)
+            }
+
+        with open(os.path.join(cachedir, "history.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    rate = hits * 100 / (hits + misses) if hits + misses else 0
+    log(f"Kernel cache: {hits} hits, {misses} misses ({rate:.0f}%) in {datetime.timedelta(seconds=round(seconds))}")
+
+
+def stats():
+    state = read_state()
+    history = []
+
+    try:
+        with open(os.path.join(cachedir, "history.jsonl")) as f:
+            history = [json.loads(line) for line in f if line.strip()]
+
+    except OSError:
+        pass
+
+    print(f"Kernel cache: {cachedir}\n")
+    print("| Source | Ref | Commit | Size | Last used |")
+    print("|--------|-----|--------|------|-----------|")
+
+    for src in sorted(state["sources"].values(), key=lambda s: s["last_used"], reverse=True):
+        used = datetime.datetime.fromtimestamp(src["last_used"]).strftime("%Y-%m-%d %H:%M")
+        print(f"| {src['repository']} | {src['ref']} | {src['commit'][:12]} | {fmt_size(src['size'])} | {used} |")
+
+    print("\n| Build | Key | Builds | Hits | Misses | Hit rate |")
+    print("|-------|-----|--------|------|--------|----------|")
+
+    totals = {}
+
+    for record in history:
+        entry = totals.setdefault(record["key"], {"name": record["name"], "builds": 0, "hits": 0, "misses": 0})
+        entry["builds"] += 1
+        entry["hits"] += record["hits"]
+        entry["misses"] += record["misses"]
+
+    for build_key, entry in sorted(totals.items(), key=lambda t: t[1]["name"]):
+        total = entry["hits"] + entry["misses"]
+        rate = f"{entry['hits'] * 100 / total:.0f}%" if total else "-"
+        print(f"| {entry['name']} | {build_key} | {entry['builds']} | {entry['hits']} | {entry['misses']} | {rate} |")
+
+    hits = sum(e["hits"] for e in totals.values())
+    misses = sum(e["misses"] for e in totals.values())
+
+    if hits + misses:
+        print(f"\nOverall hit rate: {hits * 100 / (hits + misses):.0f}% ({len(history)} builds)")
+
+    print(f"Sources: {fmt_size(sum(s['size'] for s in state['sources'].values()))}, ccache: {fmt_size(dir_size(os.path.join(cachedir, 'ccache')))}")
+
+
+def evict():
+    cap = parse_size(sizecap)
+
+    with Lock():
+        state = read_state()
+        sources = state["sources"]
+
+        # ccache does its own LRU cleanup, so give it half of the cap
+        if shutil.which("ccache"):
+            run(["ccache", "--max-size", str(cap // 2 // 1024 ** 2) + "M"], check=False)
+            run(["ccache", "--cleanup"], check=False)
+
+        ccache_size = dir_size(os.path.join(cachedir, "ccache"))
+        total = ccache_size + sum(s["size"] for s in sources.values())
+
+        for src_id, src in sorted(sources.items(), key=lambda s: s[1]["last_used"]):
+            if total <= cap:
+                break
+
+            log(f"Evicting: {src['repository']} ({src['ref']}, {fmt_size(src['size'])})")
+            shutil.rmtree(os.path.join(cachedir, "src", src_id), ignore_errors=True)
+            total -= src["size"]
+            del sources[src_id]
+
+        write_state(state)
+
+    log(f"Kernel cache size: {fmt_size(total)} (cap: {fmt_size(cap)})")
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    os.environ.setdefault("CCACHE_DIR", os.path.join(cachedir, "ccache"))
+
+    {
+        "source": source,
+        "start": start,
+        "finish": finish,
+        "stats": stats,
+        "evict": evict
+    }[mode]()
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to run the architecture independent steps of a build (caches made of
+# data, not code) with the host's tools, against the rootfs, rather than inside
+# the chroot under qemu-user, which is 5-20x slower.
+#
+# Steps: fontconfig (fc-cache --sysroot), mime (update-mime-database), glib-schemas
+# (glib-compile-schemas), icon-cache (gtk-update-icon-cache) & locales (localedef --prefix).
+#
+# - divert: before the packages are installed (./common.d/base_image.sh), the
+#   tools the package triggers call are dpkg-divert'ed (by the host's dpkg-divert
+#   --root) and replaced by a stub which does nothing, so the triggers are free
+# - run: once every package is installed (./common.d/clean_system.sh), the
+#   diversions are removed, then each step (whose package is in the rootfs) is run
+#   with the host's tool, if the host has it and its output is the same as the
+#   rootfs' own (same major.minor of the package, same glibc for locales, same
+#   cache layout for fontconfig).
+#   The other steps are printed (stdout): commands to run in the chroot.
+#   With -c (check), the native output is hashed (-S <state file>), and every
+#   step is printed, to be run in the chroot after
+# - compare: after -m run -c & the printed commands have been run in the chroot,
+#   compares their output with the native one, and -o appends it (JSON line)
+#
+# Dependencies:
+# sudo apt -y install dpkg fontconfig gtk-update-icon-cache libglib2.0-bin python3 shared-mime-info
+#
+# Usage:
+# ./bin/native-steps.py -m divert -d <rootfs> -a <architecture> [-s <step,...>]
+# ./bin/native-steps.py -m run -d <rootfs> -a <architecture> [-s <step,...>] [-c -S <state file>]
+# ./bin/native-steps.py -m compare -d <rootfs> -S <state file> [-o <output file>]
+#
+# E.g.:
+# ./bin/native-steps.py -m run -d base/rpi-arm64/working -a arm64 | chroot base/rpi-arm64/working /bin/bash
+
+import getopt
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+mode = ""
+
+directory = ""
+
+architecture = ""
+
+selected = []
+
+check = False
+
+statefile = ""
+
+outputfile = ""
+
+modes = ("divert", "run", "compare")
+
+# Where the real tool is, while it is diverted
+DIVERT_SUFFIX = ".native-steps"
+
+STUB = """#!/bin/sh
+# Diverted by ./bin/native-steps.py, run once every package is installed
+exit 0
+"""
+
+# Debian architecture: (GNU triplet, fontconfig cache architecture)
+ARCHITECTURES = {
+    "amd64": ("x86_64-linux-gnu", "le64"),
+    "arm64": ("aarch64-linux-gnu", "le64"),
+    "armhf": ("arm-linux-gnueabihf", "le32d8"),
+    "armel": ("arm-linux-gnueabi", "le32d8"),
+    "i386": ("i386-linux-gnu", "le32d4")
+    }
+
+# name: tools to divert ({triplet}: of the rootfs), output paths (globs), and the command in the chroot
+STEPS = {
+    "fontconfig": {
+        "divert": ["/usr/bin/fc-cache"],
+        "outputs": ["/var/cache/fontconfig/*"],
+        "emulated": "fc-cache -frs"
+        },
+    "mime": {
+        "divert": ["/usr/bin/update-mime-database"],
+        "outputs": ["/usr/share/mime/*", "/usr/share/mime/*/*.xml"],
+        "emulated": "update-mime-database /usr/share/mime"
+        },
+    "glib-schemas": {
+        "divert": ["/usr/lib/{triplet}/glib-2.0/glib-compile-schemas", "/usr/bin/glib-compile-schemas"],
+        "outputs": ["/usr/share/glib-2.0/schemas/gschemas.compiled"],
+        "emulated": "/usr/lib/{triplet}/glib-2.0/glib-compile-schemas /usr/share/glib-2.0/schemas"
+        },
+    "icon-cache": {
+        "divert": ["/usr/bin/gtk-update-icon-cache"],
+        "outputs": ["/usr/share/icons/*/icon-theme.cache"],
+        "emulated": "for d in /usr/share/icons/*/; do [ -f \"$d/index.theme\" ] && gtk-update-icon-cache -f -t -q \"$d\"; done; true"
+        },
+    "locales": {
+        "divert": ["/usr/sbin/locale-gen"],
+        "outputs": ["/usr/lib/locale/locale-archive"],
+        "emulated": "locale-gen"
+        }
+    }
+
+results = []
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m divert -d <rootfs> -a <architecture> [-s <step,...>]"
+        outstr += f"\n       {prog} -m run -d <rootfs> -a <architecture> [-s <step,...>] [-c -S <state file>]"
+        outstr += f"\n       {prog} -m compare -d <rootfs> -S <state file> [-o <output file>]"
+        outstr += f"\nE.g. : {prog} -m run -d base/rpi-arm64/working -a arm64\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, directory, architecture, selected, check, statefile, outputfile
+
+    try:
+        opts, args = getopt.getopt(argv, "hm:d:a:s:cS:o:", ["mode=", "directory=", "architecture=", "steps=", "check", "statefile=", "outputfile="])
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-d", "--directory"):
+                directory = os.path.abspath(arg)
+
+            elif opt in ("-a", "--architecture"):
+                architecture = arg
+
+            elif opt in ("-s", "--steps"):
+                selected = [step for step in arg.split(",") if step]
+
+            elif opt in ("-c", "--check"):
+                check = True
+
+            elif opt in ("-S", "--statefile"):
+                statefile = arg
+
+            elif opt in ("-o", "--outputfile"):
+                outputfile = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if not directory:
+        bail("Missing required argument: -d/--directory")
+
+    if mode != "compare" and architecture not in ARCHITECTURES:
+        bail(f"Unknown architecture: '{architecture}'", f"Use one of: {', '.join(ARCHITECTURES)}")
+
+    if (check or mode == "compare") and not statefile:
+        bail("Missing required argument: -S/--statefile")
+
+    for step in selected:
+        if step not in STEPS:
+            bail(f"Unknown step: '{step}'", f"Use one of: {', '.join(STEPS)}")
+
+    return 0
+
+
+def steps():
+    return [step for step in STEPS if not selected or step in selected]
+
+
+def fill(text):
+    return text.format(triplet=ARCHITECTURES[architecture][0])
+
+
+def rootfs(path):
+    return os.path.join(directory, path.lstrip("/"))
+
+
+def dpkg_divert(*args):
+    subprocess.run(["dpkg-divert", "--root", directory, "--local", "--rename", *args], check=True, stdout=subprocess.DEVNULL)
+
+
+def diverted():
+    """{path: diverted to} of our diversions, from the rootfs' dpkg database"""
+    try:
+        with open(rootfs("/var/lib/dpkg/diversions")) as f:
+            lines = f.read().splitlines()
+
+    except OSError:
+        return {}
+
+    return {lines[i]: lines[i + 1] for i in range(0, len(lines) - 2, 3) if lines[i + 1].endswith(DIVERT_SUFFIX)}
+
+
+def divert():
+    current = diverted()
+
+    for step in steps():
+        for path in map(fill, STEPS[step]["divert"]):
+            if path in current:
+                continue
+
+            dpkg_divert("--divert", path + DIVERT_SUFFIX, "--add", path)
+            os.makedirs(os.path.dirname(rootfs(path)), exist_ok=True)
+
+            with open(rootfs(path), "w") as f:
+                f.write(STUB)
+
+            os.chmod(rootfs(path), 0o755)
+            print(f"[+] Diverted: {path} ({step})", file=sys.stderr)
+
+
+def undivert():
+    for path in diverted():
+        # The stub (the package's file, if any, is put back by dpkg-divert)
+        try:
+            with open(rootfs(path)) as f:
+                is_stub = f.read() == STUB
+
+        except (OSError, UnicodeDecodeError):
+            is_stub = False
+
+        if is_stub:
+            os.remove(rootfs(path))
+
+        dpkg_divert("--remove", path)
+
+
+def package_version(name):
+    """Version of a package installed in the rootfs, from its dpkg status"""
+    try:
+        with open(rootfs("/var/lib/dpkg/status")) as f:
+            for paragraph in f.read().split("\n\n"):
+                if re.search(rf"^Package: {re.escape(name)}$", paragraph, re.M) and re.search(r"^Status: .* installed$", paragraph, re.M):
+                    return re.search(r"^Version: (?:\d+:)?(\S+)", paragraph, re.M).group(1)
+
+    except OSError:
+        pass
+
+    return ""
+
+
+def host_version(cmd):
+    try:
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True).stdout
+
+    except OSError:
+        return ""
+
+    match = re.search(r"(\d+\.\d+)", out)
+
+    return match.group(1) if match else ""
+
+
+def host_package_version(name):
+    """Version of a package installed on the host"""
+    try:
+        out = subprocess.run(["dpkg-query", "-W", "-f", "${db:Status-Abbrev} ${Version}", name],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+
+    except OSError:
+        return ""
+
+    match = re.match(r"ii\s+(?:\d+:)?(\d+\.\d+)", out)
+
+    return match.group(1) if match else ""
+
+
+def same_package(*names):
+    """The host has the same major.minor of the (first installed in the rootfs) package"""
+    for name in names:
+        target = package_version(name)
+
+        if target:
+            return same_release(host_package_version(name), target)
+
+    return False
+
+
+def same_release(host, target):
+    """Same major.minor (target: a Debian version)"""
+    match = re.match(r"\d+\.\d+", target)
+
+    return bool(host) and bool(match) and match.group(0) == host
+
+
+def host_tool(*names):
+    for name in names:
+        path = shutil.which(name) or next(iter(glob.glob(name)), None)
+
+        if path:
+            return path
+
+    return None
+
+
+def native(step):
+    """Host command(s) for a step, or a reason why it cannot run on the host"""
+    if step == "fontconfig":
+        tool = host_tool("fc-cache")
+        host_arch = subprocess.run(["dpkg", "--print-architecture"], stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+
+        if not tool:
+            return None, "no fc-cache on the host"
+
+        # The cache files are named after the architecture, and their layout depends on it
+        if ARCHITECTURES.get(host_arch, ("", ""))[1] != ARCHITECTURES[architecture][1]:
+            return None, f"{host_arch} & {architecture} caches differ"
+
+        if not same_release(host_version([tool, "--version"]), package_version("libfontconfig1")):
+            return None, "not the same fontconfig"
+
+        return [[tool, "--sysroot", directory, "-f", "-r", "-s"]], ""
+
+    if step == "mime":
+        tool = host_tool("update-mime-database")
+
+        if not tool:
+            return None, "no update-mime-database on the host"
+
+        if not same_package("shared-mime-info"):
+            return None, "not the same shared-mime-info"
+
+        return [[tool, rootfs("/usr/share/mime")]], ""
+
+    if step == "glib-schemas":
+        tool = host_tool("glib-compile-schemas", "/usr/lib/*/glib-2.0/glib-compile-schemas")
+
+        if not tool:
+            return None, "no glib-compile-schemas on the host"
+
+        if not same_package("libglib2.0-bin", "libglib2.0-0"):
+            return None, "not the same glib"
+
+        return [[tool, rootfs("/usr/share/glib-2.0/schemas")]], ""
+
+    if step == "icon-cache":
+        tool = host_tool("gtk-update-icon-cache")
+
+        if not tool:
+            return None, "no gtk-update-icon-cache on the host"
+
+        if not same_package("gtk-update-icon-cache", "libgtk-3-bin"):
+            return None, "not the same gtk-update-icon-cache"
+
+        themes = sorted(os.path.dirname(p) for p in glob.glob(rootfs("/usr/share/icons/*/index.theme")))
+
+        return [[tool, "-f", "-t", "-q", theme] for theme in themes], ""
+
+    if step == "locales":
+        tool = host_tool("localedef")
+        host = os.confstr("CS_GNU_LIBC_VERSION").split()[-1] if hasattr(os, "confstr") else ""
+
+        if not tool:
+            return None, "no localedef on the host"
+
+        # The locale archive is glibc's own format
+        if not same_release(".".join(host.split(".")[:2]), package_version("libc6")):
+            return None, f"glibc {host} on the host, {package_version('libc6')} in the rootfs"
+
+        cmds = [["rm", "-f", rootfs("/usr/lib/locale/locale-archive")]]
+
+        try:
+            with open(rootfs("/etc/locale.gen")) as f:
+                for line in f:
+                    fields = line.split()
+
+                    if len(fields) == 2 and not fields[0].startswith("#"):
+                        # As locale-gen: the source is the name without the charset
+                        source = re.sub(r"\.[^@]*", "", fields[0])
+                        cmds.append([tool, "--prefix", directory, "-i", source, "-f", fields[1], fields[0]])
+
+        except OSError:
+            pass
+
+        return cmds, ""
+
+    return None, "unknown step"
+
+
+def installed(step):
+    """The rootfs has the package, i.e. the (no longer diverted) tool"""
+    return any(os.path.lexists(rootfs(fill(path))) for path in STEPS[step]["divert"])
+
+
+def outputs(step):
+    """{path: sha256} of the output of a step"""
+    hashes = {}
+
+    for pattern in STEPS[step]["outputs"]:
+        for path in sorted(glob.glob(rootfs(pattern))):
+            if os.path.isfile(path) and not os.path.islink(path):
+                with open(path, "rb") as f:
+                    hashes["/" + os.path.relpath(path, directory)] = hashlib.sha256(f.read()).hexdigest()
+
+    return hashes
+
+
+def run():
+    undivert()
+
+    state = {}
+    emulated = []
+
+    for step in steps():
+        if not installed(step):
+            continue
+
+        cmds, reason = native(step)
+        start = time.monotonic()
+
+        if cmds is not None:
+            env = dict(os.environ, I18NPATH=rootfs("/usr/share/i18n"), XDG_DATA_DIRS=rootfs("/usr/share"), LC_ALL="C")
+
+            try:
+                for cmd in cmds:
+                    subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+
+            except (OSError, subprocess.CalledProcessError) as e:
+                cmds, reason = None, f"failed on the host: {e}"
+
+        if cmds is None:
+            print(f"[i] {step}: in the chroot ({reason})", file=sys.stderr)
+            emulated.append(fill(STEPS[step]["emulated"]))
+            continue
+
+        print(f"[+] {step}: on the host ({time.monotonic() - start:.1f}s)", file=sys.stderr)
+
+        if check:
+            state[step] = {"native": outputs(step), "time": time.monotonic() - start}
+            emulated.append(fill(STEPS[step]["emulated"]))
+
+    if check:
+        with open(statefile, "w") as f:
+            json.dump(state, f)
+
+    # For the chroot
+    for cmd in emulated:
+        print(cmd)
+
+
+def compare():
+    try:
+        with open(statefile) as f:
+            state = json.load(f)
+
+    except (OSError, ValueError) as e:
+        bail(f"Cannot read: {statefile}", str(e))
+
+    failed = 0
+
+    for step, native_run in state.items():
+        emulated = outputs(step)
+        differ = sorted(path for path in set(native_run["native"]) | set(emulated) if native_run["native"].get(path) != emulated.get(path))
+        failed += bool(differ)
+
+        print(f"[{'-' if differ else '+'}] {step}: {len(differ)} of {len(emulated)} file(s) differ{': ' + ', '.join(differ[:5]) if differ else ''}")
+
+        results.append({"step": step, "same": not differ, "files": len(emulated), "differ": differ, "native_time": native_run["time"]})
+
+    if outputfile:
+        os.makedirs(os.path.dirname(os.path.abspath(outputfile)), exist_ok=True)
+
+        with open(outputfile, "a") as f:
+            for result in results:
+                f.write(json.dumps({"rootfs": directory, **result}) + "\n")
+
+    os.remove(statefile)
+
+    print("\nStats:")
+    print(f"  - Steps\t: {len(state)}")
+    print(f"  - Different\t: {failed}")
+
+    return failed
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isdir(directory):
+        bail(f"Missing: '{directory}'")
+
+    try:
+        if mode == "divert":
+            divert()
+
+        elif mode == "run":
+            run()
+
+        elif mode == "compare":
+            exit(1 if compare() else 0)
+
+    except (OSError, subprocess.CalledProcessError) as e:
+        bail(f"Cannot {mode}: {directory}", str(e))
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
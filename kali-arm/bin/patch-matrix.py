@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to check which kernel patches (./patches/) apply to kernel tree(s),
+# without building.
+#
+# Every patch is parsed into (file, hunk) records, indexed by the patch sha256
+# ("<cache directory>/index.json"), so only new or changed patches are parsed.
+# Each patch is then checked against each tree with "patch --dry-run" (as the
+# build-scripts apply them: -p1), in parallel, and the result is cached
+# ("<cache directory>/results.json") by the patch sha256 and the sha256 of the
+# files of the tree it touches. So a kernel bump only re-checks the patches
+# whose files have changed.
+#
+# The result is a matrix (patches x trees), each cell one of:
+# - "ok": every hunk applies (maybe with an offset)
+# - "fuzz": applies, with fuzz (so check it)
+# - "FAIL": some hunk(s) do not apply, or a file is missing
+# - "applied": already in the tree (reversed)
+#
+# Each patch is checked on its own against the tree, patches which depend on
+# another one being applied first show as "FAIL".
+#
+# Dependencies:
+# sudo apt -y install python3 patch
+#
+# Usage:
+# ./bin/patch-matrix.py -m index [-i <patch file or directory>] [-C <cache directory>]
+# ./bin/patch-matrix.py -m check -d <kernel tree> [-d <kernel tree>] [-i <patch file or directory>] [-F <fuzz>] [-j <jobs>] [-o <output file>] [-C <cache directory>]
+#
+# E.g.:
+# ./bin/patch-matrix.py -m check -d ~/linux-6.6 -d ~/linux-6.12 -i patches/ -o patch-matrix.md
+
+import datetime
+import getopt
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+mode = ""
+
+cachedir = os.path.join(os.getcwd(), "cache", "patches")
+
+inputs = []
+
+trees = []
+
+fuzz = 2
+
+jobs = os.cpu_count() or 1
+
+outputfile = ""
+
+modes = ("index", "check")
+
+# As the build-scripts apply them
+STRIP = 1
+
+HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+RESULT = re.compile(r"^Hunk #(\d+) (succeeded|FAILED) at \d+(?: with fuzz (\d+))?")
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m <{'|'.join(modes)}> -d <kernel tree> [-i <patch file or directory>] [-F <fuzz>] [-j <jobs>] [-o <output file>]"
+        outstr += f"\nE.g. : {prog} -m check -d ~/linux-6.12 -i patches/ -o patch-matrix.md\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, cachedir, fuzz, jobs, outputfile
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:C:i:d:F:j:o:",
+            [
+                "mode=",
+                "cachedir=",
+                "input=",
+                "directory=",
+                "fuzz=",
+                "jobs=",
+                "outputfile="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-C", "--cachedir"):
+                cachedir = os.path.abspath(arg)
+
+            elif opt in ("-i", "--input"):
+                inputs.append(arg)
+
+            elif opt in ("-d", "--directory"):
+                trees.append(os.path.abspath(arg))
+
+            elif opt in ("-F", "--fuzz"):
+                try:
+                    fuzz = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid fuzz factor: {arg}")
+
+            elif opt in ("-j", "--jobs"):
+                try:
+                    jobs = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of jobs: {arg}")
+
+            elif opt in ("-o", "--outputfile"):
+                outputfile = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if mode == "check" and not trees:
+        bail("Missing required argument: -d/--directory")
+
+    return 0
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def load(name):
+    try:
+        with open(os.path.join(cachedir, name)) as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return {}
+
+
+def save(name, data):
+    os.makedirs(cachedir, exist_ok=True)
+    path = os.path.join(cachedir, name)
+
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+    os.replace(path + ".tmp", path)
+
+
+def find_patches():
+    found = []
+
+    for path in inputs or [os.path.join(os.getcwd(), "patches")]:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                found += [os.path.join(root, name) for name in sorted(files) if name.endswith((".patch", ".diff"))]
+
+        elif os.path.isfile(path):
+            found.append(path)
+
+        else:
+            bail(f"Missing: '{path}'")
+
+    return found
+
+
+def strip(path):
+    """Path as patch -p1 would see it, or "" for /dev/null"""
+    path = path.split("\t")[0].strip()
+
+    if path == "/dev/null":
+        return ""
+
+    # Not enough to strip (a -p0 patch), patch will not find it either
+    return "/".join(path.split("/")[STRIP:]) or path
+
+
+def parse_patch(data):
+    """{file: [(old start, old length, new start, new length)]}, and whether it has binary parts"""
+    files = {}
+    binary = False
+    old = None
+    current = None
+    # Lines left in the current hunk (old, new), so "--- " in a hunk is not a header
+    left = [0, 0]
+
+    for line in data.decode(errors="replace").splitlines():
+        if left[0] > 0 or left[1] > 0:
+            if line.startswith("\\"):
+                continue
+
+            if not line.startswith("+"):
+                left[0] -= 1
+
+            if not line.startswith("-"):
+                left[1] -= 1
+
+        elif line.startswith("--- "):
+            old = strip(line[4:])
+
+        elif line.startswith("+++ ") and old is not None:
+            # Created files are looked for by their new name
+            current = old or strip(line[4:])
+            files.setdefault(current, [])
+            old = None
+
+        elif line.startswith("@@ ") and current is not None:
+            match = HUNK.match(line)
+
+            if match:
+                hunk = tuple(int(g) if g is not None else 1 for g in match.groups())
+                files[current].append(hunk)
+                left = [hunk[1], hunk[3]]
+
+        elif line.startswith("GIT binary patch"):
+            binary = True
+
+        elif line.startswith("diff "):
+            current = None
+
+    return {"files": files, "binary": binary}
+
+
+def index_patches(paths):
+    """{path: (sha256, parsed)}, from the index when it is there"""
+    index = load("index.json")
+    indexed = {}
+    changed = False
+
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        digest = sha256(data)
+
+        if digest not in index:
+            index[digest] = parse_patch(data)
+            changed = True
+
+        indexed[path] = (digest, index[digest])
+
+    if changed:
+        save("index.json", index)
+
+    return indexed
+
+
+def tree_name(tree):
+    """Kernel version from the top Makefile, else the directory name"""
+    version = {}
+
+    try:
+        with open(os.path.join(tree, "Makefile")) as f:
+            for line in f:
+                match = re.match(r"^(VERSION|PATCHLEVEL|SUBLEVEL|EXTRAVERSION) = *(\S*)", line)
+
+                if match:
+                    version[match.group(1)] = match.group(2)
+
+                if len(version) == 4:
+                    break
+
+    except OSError:
+        pass
+
+    if "VERSION" in version and "PATCHLEVEL" in version:
+        return f"{version['VERSION']}.{version['PATCHLEVEL']}.{version.get('SUBLEVEL', '0')}{version.get('EXTRAVERSION', '')}"
+
+    return os.path.basename(tree)
+
+
+def tree_key(tree, digest, parsed):
+    """Cache key: the patch, the options, and the content of each file it touches"""
+    h = hashlib.sha256(f"{digest}\0-p{STRIP}\0-F{fuzz}\0".encode())
+
+    for name in sorted(parsed["files"]):
+        try:
+            with open(os.path.join(tree, name), "rb") as f:
+                h.update(f"{name}\0{sha256(f.read())}\0".encode())
+
+        except OSError:
+            h.update(f"{name}\0-\0".encode())
+
+    return h.hexdigest()
+
+
+def check(tree, path, parsed):
+    result = subprocess.run(
+        ["patch", "--dry-run", "--batch", "--forward", f"-p{STRIP}", f"-F{fuzz}", "-d", tree, "-i", os.path.abspath(path)],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace"
+        )
+
+    hunks = sum(len(h) for h in parsed["files"].values())
+    record = {"status": "ok", "hunks": hunks, "fuzz": 0, "failed": 0, "missing": []}
+    reversed_files = 0
+    checked_files = 0
+
+    for line in result.stdout.splitlines():
+        match = RESULT.match(line)
+
+        if line.startswith("checking file "):
+            checked_files += 1
+
+        elif line.startswith("can't find file to patch"):
+            record["missing"].append(line)
+
+        elif "Reversed (or previously applied) patch detected" in line:
+            reversed_files += 1
+
+        elif match:
+            if match.group(2) == "FAILED":
+                record["failed"] += 1
+
+            elif match.group(3):
+                record["fuzz"] += 1
+
+    # "can't find file" does not say which, the names come from the patch
+    if record["missing"]:
+        record["missing"] = [name for name in parsed["files"] if not os.path.isfile(os.path.join(tree, name))] or ["?"]
+
+    if checked_files and reversed_files == checked_files:
+        record["status"] = "applied"
+
+    elif record["failed"] or record["missing"] or (result.returncode != 0 and not reversed_files):
+        record["status"] = "FAIL"
+
+    elif record["fuzz"]:
+        record["status"] = "fuzz"
+
+    return record
+
+
+def cell(record):
+    if record["status"] == "fuzz":
+        return f"fuzz ({record['fuzz']}/{record['hunks']})"
+
+    if record["status"] == "FAIL":
+        if record["missing"]:
+            return f"FAIL (missing {', '.join(record['missing'])})"
+
+        return f"FAIL ({record['failed']}/{record['hunks']})"
+
+    return record["status"]
+
+
+def check_all(indexed):
+    results = load("results.json")
+    todo = []
+    keys = {}
+
+    for tree in trees:
+        if not os.path.isdir(tree):
+            bail(f"Missing: '{tree}'")
+
+        for path, (digest, parsed) in indexed.items():
+            key = tree_key(tree, digest, parsed)
+            keys[(tree, path)] = key
+
+            if key not in results:
+                todo.append((tree, path, parsed, key))
+
+    print(f"[i] {len(keys)} checks, {len(keys) - len(todo)} cached, {len(todo)} to run ({jobs} jobs)", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for (tree, path, parsed, key), record in zip(todo, pool.map(lambda t: check(t[0], t[1], t[2]), todo)):
+            record["checked"] = datetime.datetime.now().isoformat(timespec="seconds")
+            results[key] = record
+
+    if todo:
+        save("results.json", results)
+
+    return {pair: results[key] for pair, key in keys.items()}
+
+
+def write_matrix(indexed, matrix):
+    names = [tree_name(tree) for tree in trees]
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in indexed]) if indexed else ""
+
+    table = f"| Patch | Files | Hunks | {' | '.join(names)} |\n"
+    table += f"|-------|-------|-------|{'|'.join('-' * (len(n) + 2) for n in names)}|\n"
+
+    totals = {tree: {} for tree in trees}
+
+    for path, (digest, parsed) in indexed.items():
+        hunks = sum(len(h) for h in parsed["files"].values())
+        cells = []
+
+        for tree in trees:
+            record = matrix[(tree, path)]
+            totals[tree][record["status"]] = totals[tree].get(record["status"], 0) + 1
+            cells.append(cell(record))
+
+        table += f"| {os.path.relpath(os.path.abspath(path), base)} | {len(parsed['files'])} | {hunks} | {' | '.join(cells)} |\n"
+
+    table += "\nStats:\n"
+
+    for tree, name in zip(trees, names):
+        counts = ", ".join(f"{status}: {totals[tree].get(status, 0)}" for status in ("ok", "fuzz", "FAIL", "applied"))
+        table += f"  - {name}\t: {counts}\n"
+
+    if outputfile:
+        with open(outputfile, "w") as f:
+            f.write(table)
+
+        print(f"[+] File: {outputfile} successfully written", file=sys.stderr)
+
+    else:
+        print(table)
+
+
+def write_index(indexed):
+    by_file = {}
+
+    for path, (digest, parsed) in indexed.items():
+        for name in parsed["files"]:
+            by_file.setdefault(name, []).append(path)
+
+    print(f"[+] Indexed: {len(indexed)} patches, {len(by_file)} files, {sum(sum(len(h) for h in p['files'].values()) for _, p in indexed.values())} hunks")
+    print("\nMost patched files:")
+
+    for name, paths in sorted(by_file.items(), key=lambda f: -len(f[1]))[:10]:
+        print(f"  - {name}\t: {len(paths)}")
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    indexed = index_patches(find_patches())
+
+    if mode == "index":
+        write_index(indexed)
+
+    elif mode == "check":
+        write_matrix(indexed, check_all(indexed))
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -3,35 +3,47 @@
 # ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
 
 ###############################################
-# Script to prepare the rpi-imager json script for Kali ARM quarterly releases.
+# Script to prepare the release manifests for Kali ARM quarterly releases.
 # Based on ./bin/pre-release.py
 #
 # This should be run after images are created.
 #
-# It parses the YAML sections of the devices.yml and creates:
-# - "<imagedir>/rpi-imager.json = "manifest file mapping image name to display name
+# It parses the YAML sections of the devices.yml and gathers the metadata of
+# every image of the release (support: kali), for every vendor, once (sizes,
+# sha256 of the download & of the image, architecture & devices), then creates
+# (-f, default all):
+# - "rpi-imager": "<imagedir>/rpi-imager.json", the Raspberry Pi images for rpi-imager
+# - "manifest": "<imagedir>/manifest.json", ./bin/pre-release.py's manifest, with sizes & sha256
+# - "inventory": "<imagedir>/inventory.csv" & "<imagedir>/inventory.jsonl", one line per image
+# - "sha256sums": "<imagedir>/SHA256SUMS", of the downloads
+#
+# The sha256 come from the .sha256sum files written by the build, and the image
+# size from the xz index/zstd frame headers, the images are only read when one
+# is missing.
+# If ./bin/generate-zsync.py has been run, the zsync control file of each image
+# is referenced from its entry ("zsync_url").
 #
 # Dependencies:
-# sudo apt -y install python3 python3-yaml xz-utils
+# sudo apt -y install python3 python3-yaml xz-utils zstd
 #
 # Usage:
-# ./bin/post-release.py -i <input file> -r <release> -o <image directory>
+# ./bin/post-release.py -i <input file> -r <release> -o <image directory> [-f <format>[,<format>]] [-j <jobs>]
 #
 # E.g.:
 # ./bin/post-release.py -i devices.yml -r 2022.3 -o images/
 
+import csv
 import datetime
 import getopt
+import hashlib
+import io
 import json
 import os
 import re
 import stat
 import subprocess
 import sys
-
-import yaml  # python3 -m pip install pyyaml --user
-
-manifest = ""  # Generated automatically (<imagedir>/rpi-imager.json)
+from concurrent.futures import ThreadPoolExecutor
 
 release = ""
 
@@ -39,14 +51,46 @@ imagedir = ""
 
 inputfile = ""
 
+jobs = os.cpu_count() or 1
+
 qty_devices = 0
 qty_images = 0
 qty_release_images = 0
 
+# Download of an image: compressed with xz, zstd, or not at all
 file_ext = [
     "xz",
-    "xz.sha256sum",
-    "sha256sum"
+    "zst",
+    ""
+    ]
+
+# Output format: file(s)
+formats = {
+    "rpi-imager": ["rpi-imager.json"],
+    "manifest": ["manifest.json"],
+    "inventory": ["inventory.csv", "inventory.jsonl"],
+    "sha256sums": ["SHA256SUMS"]
+    }
+
+selected = list(formats)
+
+inventory_fields = [
+    "vendor",
+    "name",
+    "filename",
+    "download",
+    "compression",
+    "architecture",
+    "devices",
+    "slug",
+    "build-script",
+    "kernel-version",
+    "image_download_size",
+    "image_download_sha256",
+    "extract_size",
+    "extract_sha256",
+    "url",
+    "zsync_url"
     ]
 
 # Input:
@@ -55,8 +99,8 @@ file_ext = [
 # https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
 #
 # See:  ./images/*.img.sha256sum (uncompressed image sha256sum - to get the sha256sum
-#       ./images/*.img.xz.sha256sum (compressed image sha256sum - to get the sha256sum
-#       ./images/*.img.xz (compressed image; we use xz to look at the metadata to get compressed/uncompressed size)
+#       ./images/*.img.{xz,zst}.sha256sum (compressed image sha256sum - to get the sha256sum
+#       ./images/*.img.{xz,zst} (compressed image; we use xz/zstd to look at the metadata to get compressed/uncompressed size)
 
 
 def bail(message="", strerror=""):
@@ -71,7 +115,7 @@ def bail(message="", strerror=""):
         outstr += f"\nMessage: {strerror}\n"
 
     else:
-        outstr += f"\n\nUsage: {prog} -i <input file> -o <output directory> -r <release>"
+        outstr += f"\n\nUsage: {prog} -i <input file> -o <output directory> -r <release> [-f <format>[,<format>]] [-j <jobs>]"
         outstr += f"\nE.g. : {prog} -i devices.yml -o images/ -r {datetime.datetime.now().year}.1\n"
 
     print(outstr)
@@ -80,16 +124,18 @@ def bail(message="", strerror=""):
 
 
 def getargs(argv):
-    global inputfile, imagedir, release
+    global inputfile, imagedir, release, selected, jobs
 
     try:
         opts, args = getopt.getopt(
             argv,
-            "hi:o:r:",
+            "hi:o:r:f:j:",
             [
                 "inputfile=",
                 "imagedir=",
-                "release="
+                "release=",
+                "formats=",
+                "jobs="
             ]
         )
 
@@ -110,6 +156,20 @@ def getargs(argv):
             elif opt in ("-o", "--imagedirectory"):
                 imagedir = arg.rstrip("/")
 
+            elif opt in ("-f", "--formats"):
+                selected = [f.strip() for f in arg.split(",") if f.strip()]
+
+                for f in selected:
+                    if f not in formats:
+                        bail(f"Unknown format: '{f}'", f"Use {', '.join(formats)}")
+
+            elif opt in ("-j", "--jobs"):
+                try:
+                    jobs = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of jobs: {arg}")
+
             else:
                 bail(f"Unrecognised argument: {opt}")
 
@@ -131,10 +191,13 @@ def yaml_parse(content):
         if line.strip() and not line.strip().startswith("#"):
             result += line + "\n"
 
+    # Only when it is needed (not for -h), it is the slowest import
+    import yaml  # python3 -m pip install pyyaml --user
+
     return yaml.safe_load(result)
 
 
-def jsonarray(devices, vendor, name, url, extract_size, extract_sha256, image_download_size, image_download_sha256, device_arch):
+def jsonarray(devices, vendor, name, url, extract_size, extract_sha256, image_download_size, image_download_sha256, device_arch, zsync_url=""):
     if not vendor in devices:
         devices[vendor] = []
 
@@ -153,26 +216,43 @@ def jsonarray(devices, vendor, name, url, extract_size, extract_sha256, image_do
         "init_format": "cloudinit",
     }
 
+    if zsync_url:
+        jsondata["zsync_url"] = zsync_url
+
     devices[vendor].append(jsondata)
 
     return devices
 
 
-def generate_manifest(data):
-    global release, qty_devices, qty_images, qty_release_images
+def rpi_devices(image, arch):
+    """rpi-imager device tags of a Raspberry Pi image"""
+    if "raspberry-pi5" in image:
+        return [f"pi5-{arch}"]
+
+    elif "raspberry-pi1" in image:
+        return [f"pi1-{arch}"]
+
+    elif "raspberry-pi-zero-2-w" in image:
+        return [f"pi3-{arch}"]
+
+    elif "raspberry-pi-zero-w" in image:
+        return [f"pi1-{arch}"]
+
+    return [f"pi4-{arch}", f"pi3-{arch}", f"pi2-{arch}"]
+
+
+def release_images(data):
+    """(vendor, image) of every image in the release (support: kali), for every vendor"""
+    global qty_devices, qty_images, qty_release_images
 
     default = ""
 
-    devices = {}
+    images = []
 
     # Iterate over per input (depth 1)
     for yaml in data["devices"]:
         # Iterate over vendors
         for vendor in yaml.keys():
-            # @g0tmi1k: Feels like there is a cleaner way todo this
-            if not vendor == "raspberrypi":
-                continue
-
             # Ready to have a unique name in the entry
             img_seen = set()
 
@@ -180,97 +260,236 @@ def generate_manifest(data):
             for board in yaml[vendor]:
                 qty_devices += 1
 
-                # Iterate over per board
-                for key in board.keys():
-                    # Check if there is an image for the board
-                    if "images" in key:
-                        # Iterate over image (depth 3)
-                        for image in board[key]:
-                            qty_images += 1
-
-                            # Check that it's not EOL or community supported
-                            if image.get("support") == "kali":
-                                name = image.get("name", default)
-
-                                # If we haven't seen this image before for this vendor
-                                if name not in img_seen:
-                                    img_seen.add(name)
-                                    qty_release_images += 1
-
-                                    filename = f"kali-linux-{release}-{image.get('image', default)}"
-
-                                    # Check to make sure files got created
-                                    for ext in file_ext:
-                                        check_file = f"{imagedir}/{filename}.{ext}"
-
-                                        if not os.path.isfile(check_file):
-                                            bail(
-                                                f"Missing: '{check_file}'! Please create the image before running")
-
-                                    with open(f"{imagedir}/{filename}.xz.sha256sum") as f:
-                                        image_download_sha256 = f.read().split()[0]
-
-                                    with open(f"{imagedir}/{filename}.sha256sum") as f:
-                                        extract_sha256 = f.read().split()[0]
-
-                                    url = f"https://kali.download/arm-images/kali-{release}/{filename}.xz"
-
-                                    if "arm64" in image.get("architecture", default):
-                                        arch = "64bit"
-                                    else:
-                                        arch = "32bit"
-
-                                    device_arch = []
-
-                                    if "raspberry-pi5" in image.get("image", default):
-                                        device_arch.append(f"pi5-{arch}")
-                                    elif "raspberry-pi1" in image.get("image", default):
-                                        device_arch.append(f"pi1-{arch}")
-                                    elif "raspberry-pi-zero-2-w" in image.get("image", default):
-                                        device_arch.append(f"pi3-{arch}")
-                                    elif "raspberry-pi-zero-w" in image.get("image", default):
-                                        device_arch.append(f"pi1-{arch}")
-                                    else:
-                                        device_arch.append(f"pi4-{arch}")
-                                        device_arch.append(f"pi3-{arch}")
-                                        device_arch.append(f"pi2-{arch}")
-
-                                    # @g0tmi1k: not happy about external OS, rather keep it in python (import lzma)
-                                    try:
-                                        unxz = subprocess.check_output(
-                                            f"unxz --verbose --list {imagedir}/{filename}.xz | grep 'Uncompressed'", shell=True)
-
-                                        extract_size = re.findall(
-                                            r"\((.*?) B\)",
-                                            str(unxz)
-                                        )[0]
-                                        extract_size = extract_size.replace(
-                                            ",",
-                                            ""
-                                            )
-                                        extract_size = int(extract_size)
-
-                                    except subprocess.CalledProcessError as e:
-                                        #print(f"command "{e.cmd}" return with error (code {e.returncode})")
-                                        extract_size = 0
-
-                                    #image_download_size = os.stat(f'{imagedir}/{filename}.xz').st_size
-                                    image_download_size = os.path.getsize(f"{imagedir}/{filename}.xz")
-                                    jsonarray(
-                                        devices,
-                                        "os_list",
-                                        name,
-                                        url,
-                                        extract_size,
-                                        extract_sha256,
-                                        image_download_size,
-                                        image_download_sha256,
-                                        device_arch,
-                                        )
+                # Iterate over image (depth 3)
+                for image in board.get("images", []):
+                    qty_images += 1
+
+                    # Check that it's not EOL or community supported
+                    if image.get("support") == "kali":
+                        name = image.get("name", default)
+
+                        # If we haven't seen this image before for this vendor
+                        if name not in img_seen:
+                            img_seen.add(name)
+                            qty_release_images += 1
+                            images.append((vendor, image))
+
+    return images
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 ** 2), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def read_sha256sum(path):
+    with open(path) as f:
+        return f.read().split()[0]
+
+
+def extract_size(path, compression):
+    """Uncompressed size, from the xz index or the zstd frame headers (no decompressing)"""
+    cmd = {
+        "xz": ["xz", "--robot", "--list", path],
+        "zst": ["zstd", "--list", "-v", path]
+        }[compression]
+
+    try:
+        output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL, text=True)
+
+    except (OSError, subprocess.CalledProcessError):
+        return 0
+
+    if compression == "xz":
+        for line in output.splitlines():
+            if line.startswith("totals\t"):
+                return int(line.split("\t")[4])
+
+    else:
+        match = re.search(r"Decompressed Size:.*\((\d+) B\)", output)
+
+        if match:
+            return int(match.group(1))
+
+    return 0
+
+
+def extract_stream(path, compression):
+    """sha256 & size of the uncompressed image, decompressing it once"""
+    h = hashlib.sha256()
+    size = 0
+
+    cmd = {"xz": ["xz", "-dc", "-T0", path], "zst": ["zstd", "-dc", path]}[compression]
+
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+        for chunk in iter(lambda: proc.stdout.read(1024 ** 2), b""):
+            h.update(chunk)
+            size += len(chunk)
+
+    if proc.returncode != 0:
+        bail(f"Cannot decompress: {path}")
+
+    return h.hexdigest(), size
+
+
+def gather(vendor, image):
+    """Every piece of metadata of one release image, reading each file at most once"""
+    default = ""
+
+    filename = f"kali-linux-{release}-{image.get('image', default)}"
+
+    # Whichever compression it was made with (compress= in builder.txt), else the image itself
+    for compression in file_ext:
+        download = f"{filename}.{compression}" if compression else filename
+
+        if os.path.isfile(f"{imagedir}/{download}"):
+            break
+
+    else:
+        bail(f"Missing: '{imagedir}/{filename}.xz'! Please create the image before running")
+
+    path = f"{imagedir}/{download}"
+
+    # The build writes the .sha256sum files, the image is only read when one is missing
+    if os.path.isfile(f"{path}.sha256sum"):
+        image_download_sha256 = read_sha256sum(f"{path}.sha256sum")
+
+    else:
+        print(f"[i] Missing: '{path}.sha256sum', computing it")
+        image_download_sha256 = sha256_file(path)
+
+    image_download_size = os.path.getsize(path)
+
+    if not compression:
+        extract_sha256 = image_download_sha256
+        extract_size_b = image_download_size
+
+    elif os.path.isfile(f"{imagedir}/{filename}.sha256sum"):
+        extract_sha256 = read_sha256sum(f"{imagedir}/{filename}.sha256sum")
+        extract_size_b = extract_size(path, compression)
+
+    else:
+        print(f"[i] Missing: '{imagedir}/{filename}.sha256sum', computing it")
+        extract_sha256, extract_size_b = extract_stream(path, compression)
+
+    if "arm64" in image.get("architecture", default):
+        arch = "64bit"
+
+    else:
+        arch = "32bit"
+
+    # Delta downloads (./bin/generate-zsync.py)
+    zsync_url = ""
+
+    if os.path.isfile(f"{imagedir}/{filename}.zsync"):
+        zsync_url = f"https://kali.download/arm-images/kali-{release}/{filename}.zsync"
+
+    return {
+        "vendor": vendor,
+        "name": image.get("name", default),
+        "image": image.get("image", default),
+        "filename": filename,
+        "download": download,
+        "compression": compression or "none",
+        "architecture": image.get("architecture", default),
+        "preferred": image.get("preferred-image", default),
+        "slug": image.get("slug", default),
+        "build-script": image.get("build-script", default),
+        "kernel-version": image.get("kernel-version", default),
+        "url": f"https://kali.download/arm-images/kali-{release}/{download}",
+        "image_download_size": image_download_size,
+        "image_download_sha256": image_download_sha256,
+        "extract_size": extract_size_b,
+        "extract_sha256": extract_sha256,
+        "zsync_url": zsync_url,
+        "devices": rpi_devices(image.get("image", default), arch) if vendor == "raspberrypi" else []
+        }
+
+
+def gather_all(images):
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(lambda i: gather(*i), images))
+
+
+def render_rpi_imager(records):
+    devices = {}
+
+    for r in records:
+        if r["vendor"] != "raspberrypi":
+            continue
+
+        jsonarray(
+            devices,
+            "os_list",
+            r["name"],
+            r["url"],
+            r["extract_size"],
+            r["extract_sha256"],
+            r["image_download_size"],
+            r["image_download_sha256"],
+            r["devices"],
+            r["zsync_url"],
+            )
+
+    return json.dumps(devices, indent=2)
+
+
+def render_manifest(records):
+    """./bin/pre-release.py's manifest.json, with the sizes & digests"""
+    devices = {}
+
+    for r in records:
+        devices.setdefault(r["vendor"], []).append({
+            "name": r["name"],
+            "filename": r["filename"],
+            "preferred": r["preferred"],
+            "slug": r["slug"],
+            "architecture": r["architecture"],
+            "url": r["url"],
+            "image_download_size": r["image_download_size"],
+            "image_download_sha256": r["image_download_sha256"],
+            "extract_size": r["extract_size"],
+            "extract_sha256": r["extract_sha256"]
+            })
 
     return json.dumps(devices, indent=2)
 
 
+def render_csv(records):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=inventory_fields, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(dict(r, devices=" ".join(r["devices"])) for r in records)
+
+    return out.getvalue()
+
+
+def render_jsonl(records):
+    return "".join(json.dumps(r) + "\n" for r in records)
+
+
+def render_sha256sums(records):
+    """Of the downloads, as "sha256sum -c" reads them"""
+    return "".join(f"{r['image_download_sha256']}  {r['download']}\n" for r in records)
+
+
+def render(file, records):
+    renderers = {
+        "rpi-imager.json": render_rpi_imager,
+        "manifest.json": render_manifest,
+        "inventory.csv": render_csv,
+        "inventory.jsonl": render_jsonl,
+        "SHA256SUMS": render_sha256sums
+        }
+
+    return renderers[file](records)
+
+
 def createdir(dir):
     try:
         if not os.path.exists(dir):
@@ -315,26 +534,33 @@ def main(argv):
         bail("Missing arguments")
 
     # Assign variables
-    manifest = f"{imagedir}/rpi-imager.json"
     data = readfile(inputfile)
 
-    # Get data
+    # Get data, once for every format
     res = yaml_parse(data)
-    manifest_list = generate_manifest(res)
+    records = gather_all(release_images(res))
 
     # Create output directory if required
     createdir(imagedir)
 
-    # Create manifest file
-    writefile(manifest_list, manifest)
+    # Create manifest files
+    created = []
+
+    for f in selected:
+        for name in formats[f]:
+            writefile(render(name, records), f"{imagedir}/{name}")
+            created.append(f"{imagedir}/{name}")
 
     # Print result and exit
     print("\nStats:")
     print(f"  - Total devices\t: {qty_devices}")
     print(f"  - Total images\t: {qty_images}")
-    print(f"  - {release} rpi images\t: {qty_release_images}")
+    print(f"  - {release} images\t: {qty_release_images}")
+    print(f"  - {release} rpi images\t: {sum(1 for r in records if r['vendor'] == 'raspberrypi')}")
     print("\n")
-    print(f"Manifest file created\t: {manifest}")
+
+    for file in created:
+        print(f"Manifest file created\t: {file}")
 
     exit(0)
 
@@ -10,25 +10,36 @@
 #
 # It parses the YAML sections of the devices.yml and creates:
 # - "<outputdir>/manifest.json": manifest file mapping image name to display name
+# - "<outputdir>/build-plan.json": (with -H) the release images, spread over the
+#   builders, longest first, with the predicted makespan
+#
+# The build plan uses the build history, the stage telemetry of past builds
+# (telemetry="yes", see ./bin/build-report.py), or any JSON lines with "image",
+# "duration" & "cpu" (seconds) per build. The duration of an image is the median
+# of its last builds (images with no history get the median of all the images),
+# with the most CPU cores it has used (CPU time / duration) in those builds.
+# Images are taken longest first, each by the builder which is free first (LPT),
+# which is never more than 4/3 of the best possible makespan.
 #
 # Dependencies:
 # sudo apt -y install python3 python3-yaml
 #
 # Usage:
-# ./bin/pre-release.py -i <input file> -r <release> -o <output directory>
+# ./bin/pre-release.py -i <input file> -r <release> -o <output directory> [-H <history file>] [-b <builders>]
 #
 # E.g.:
 # ./bin/pre-release.py -i devices.yml -r 2022.3 -o images/
+# ./bin/pre-release.py -i devices.yml -r 2022.3 -o images/ -H logs/telemetry.jsonl -b 4
 
 import datetime
 import getopt
 import json
 import os
+import re
 import stat
+import statistics
 import sys
 
-import yaml # python3 -m pip install pyyaml --user
-
 manifest = "" # Generated automatically (<outputdir>/manifest.json)
 
 release = ""
@@ -37,10 +48,20 @@ outputdir = ""
 
 inputfile = ""
 
+historyfiles = []
+
+builders = 1
+
 qty_devices = 0
 qty_images = 0
 qty_release_images = 0
 
+# Release images, in devices.yml order: [(image, build-script)]
+release_images = []
+
+# Builds of an image used for its duration (the most recent ones)
+HISTORY_BUILDS = 5
+
 # Input:
 # ------------------------------------------------------------
 # See: ./devices.yml
@@ -59,7 +80,7 @@ def bail(message="", strerror=""):
         outstr += f"\nMessage: {strerror}\n"
 
     else:
-        outstr += f"\n\nUsage: {prog} -i <input file> -o <output directory> -r <release>"
+        outstr += f"\n\nUsage: {prog} -i <input file> -o <output directory> -r <release> [-H <history file>] [-b <builders>]"
         outstr += f"\nE.g. : {prog} -i devices.yml -o images/ -r {datetime.datetime.now().year}.1\n"
 
     print(outstr)
@@ -68,16 +89,18 @@ def bail(message="", strerror=""):
 
 
 def getargs(argv):
-    global inputfile, outputdir, release
+    global inputfile, outputdir, release, builders
 
     try:
         opts, args = getopt.getopt(
             argv,
-            "hi:o:r:",
+            "hi:o:r:H:b:",
             [
                 "inputfile=",
                 "outputdir=",
-                "release="
+                "release=",
+                "history=",
+                "builders="
             ]
         )
 
@@ -98,6 +121,19 @@ def getargs(argv):
             elif opt in ("-o", "--outputdirectory"):
                 outputdir = arg.rstrip("/")
 
+            elif opt in ("-H", "--history"):
+                historyfiles.append(arg)
+
+            elif opt in ("-b", "--builders"):
+                try:
+                    builders = int(arg)
+
+                except ValueError:
+                    builders = 0
+
+                if builders < 1:
+                    bail(f"Invalid number of builders: {arg}")
+
             else:
                 bail("Unrecognized argument: " + opt)
 
@@ -119,6 +155,9 @@ def yaml_parse(content):
         if line.strip() and not line.strip().startswith("#"):
             result += line + "\n"
 
+    # Only when it is needed (not for -h), it is the slowest import
+    import yaml  # python3 -m pip install pyyaml --user
+
     return yaml.safe_load(result)
 
 
@@ -183,6 +222,11 @@ def generate_manifest(data):
 
                                     slug = image.get("slug", default)
 
+                                    release_images.append((
+                                        re.sub(r"\.img$", "", image.get("image", default)),
+                                        image.get("build-script", default)
+                                    ))
+
                                     jsonarray(
                                         devices,
                                         vendor,
@@ -195,6 +239,132 @@ def generate_manifest(data):
     return json.dumps(devices, indent=2)
 
 
+def history_image(rec):
+    """devices.yml image of a history record: telemetry has the board & architecture,
+    else "kali-linux-<version>-<image>", with or without the desktop"""
+    if rec.get("board") and rec.get("arch"):
+        return f"{rec['board']}-{rec['arch']}"
+
+    image = re.sub(r"^kali-linux-[^-]+-|\.img$", "", rec.get("image", ""))
+    known = {name for name, _ in release_images}
+
+    # "<hw_model>-<desktop>-<architecture>" (the variant), as image_name has it
+    without_desktop = re.sub(r"-[^-]+(-[^-]+)$", r"\1", image)
+
+    if image not in known and without_desktop in known:
+        return without_desktop
+
+    return image
+
+
+def read_history(files):
+    """{image: [(duration, CPU cores used) of each build, oldest first]}"""
+    builds = {}
+    runs = {}
+
+    for file in files:
+        try:
+            with open(file) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+
+                    except ValueError:
+                        # A build killed while writing leaves half a line
+                        continue
+
+                    image = history_image(rec)
+
+                    if not image:
+                        continue
+
+                    if "duration" in rec:
+                        duration = float(rec["duration"])
+                        cores = float(rec.get("cpu", 0)) / duration if duration else 0
+                        runs.setdefault(image, []).append((rec.get("time", 0), duration, cores))
+
+                    elif "build" in rec and "time" in rec:
+                        cpu = (rec.get("cpu_user", 0) + rec.get("cpu_sys", 0)) / (rec.get("hz") or 100)
+                        build = builds.setdefault(rec["build"], {"image": image, "first": rec["time"], "last": rec["time"], "cpu": []})
+                        build["first"] = min(build["first"], rec["time"])
+                        build["last"] = max(build["last"], rec["time"])
+                        build["cpu"].append(cpu)
+
+        except OSError:
+            bail(f"Cannot open history file: {file}")
+
+    # Telemetry: a build lasts from its first record to its last (the CPU time is cumulative)
+    for build in builds.values():
+        duration = build["last"] - build["first"]
+        cores = (max(build["cpu"]) - min(build["cpu"])) / duration if duration else 0
+        runs.setdefault(build["image"], []).append((build["first"], duration, cores))
+
+    # History which matches none of the images would plan them all the same
+    if runs and not runs.keys() & {image for image, _ in release_images}:
+        bail("No history record matches a release image", f"History has: {', '.join(sorted(runs)[:5])}")
+
+    return {image: [(duration, cores) for _, duration, cores in sorted(r)] for image, r in runs.items()}
+
+
+def schedule(jobs, qty):
+    """Each job (in order) to the builder which is free first: [[job]], makespan"""
+    plan = [[] for _ in range(qty)]
+    loads = [0.0] * qty
+
+    for job in jobs:
+        builder = loads.index(min(loads))
+        plan[builder].append(job)
+        loads[builder] += job["predicted"]
+
+    return plan, max(loads)
+
+
+def generate_plan(history):
+    known = {}
+
+    for image, runs in history.items():
+        recent = runs[-HISTORY_BUILDS:]
+        known[image] = (statistics.median(d for d, _ in recent), max(c for _, c in recent))
+
+    fallback = statistics.median(d for d, _ in known.values()) if known else 0
+
+    jobs = []
+
+    for image, script in release_images:
+        duration, cores = known.get(image, (fallback, 0))
+        jobs.append({"image": image, "build-script": script, "predicted": round(duration, 1), "cores": round(cores, 1), "history": image in known})
+
+    # Longest processing time first
+    lpt = sorted(jobs, key=lambda job: -job["predicted"])
+    plan, makespan = schedule(lpt, builders)
+    _, listed_makespan = schedule(jobs, builders)
+
+    total = sum(job["predicted"] for job in jobs)
+    lower_bound = max([total / builders] + [job["predicted"] for job in jobs])
+
+    return {
+        "release": release,
+        "builders": [
+            {
+                "builder": i + 1,
+                "predicted": round(sum(job["predicted"] for job in jobs_of), 1),
+                "peak_cores": max([job["cores"] for job in jobs_of], default=0),
+                "images": jobs_of
+            }
+            for i, jobs_of in enumerate(plan)
+        ],
+        "order": [job["image"] for job in lpt],
+        "makespan": round(makespan, 1),
+        "makespan_devices_order": round(listed_makespan, 1),
+        "lower_bound": round(lower_bound, 1),
+        "without_history": [job["image"] for job in jobs if not job["history"]]
+    }
+
+
+def fmt_time(seconds):
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
 def createdir(dir):
     try:
         if not os.path.exists(dir):
@@ -252,14 +422,28 @@ def main(argv):
     # Create manifest file
     writefile(manifest_list, manifest)
 
+    # Create build plan
+    if historyfiles:
+        plan = generate_plan(read_history(historyfiles))
+        writefile(json.dumps(plan, indent=2), outputdir + "/build-plan.json")
+
     # Print result and exit
     print("\nStats:")
     print(f"  - Total devices\t: {qty_devices}")
     print(f"  - Total images\t: {qty_images}")
     print(f"  - {release} images\t: {qty_release_images}")
+
+    if historyfiles:
+        print(f"  - Builders\t\t: {builders}")
+        print(f"  - Makespan\t\t: {fmt_time(plan['makespan'])} (devices.yml order: {fmt_time(plan['makespan_devices_order'])}, lower bound: {fmt_time(plan['lower_bound'])})")
+        print(f"  - No history\t\t: {len(plan['without_history'])}")
+
     print("\n")
     print(f"Manifest file created\t: {manifest}")
 
+    if historyfiles:
+        print(f"Build plan created\t: {outputdir}/build-plan.json")
+
     exit(0)
 
 
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to punch holes in an image file, over the free blocks of its ext2/3/4
+# partitions, run by ./common.d/finish_image.sh (after e2fsck, before the
+# checksum & compression).
+#
+# Free blocks still hold whatever was there before: deleted package caches, build
+# files from the chroot stages... which xz has to compress, and which are in the
+# image for nothing. Without mounting (or zerofree in the chroot):
+# - the partition table (MBR or GPT) of the image is read
+# - for each ext2/3/4 partition, the group descriptors & block bitmaps are read
+#   (groups with BLOCK_UNINIT: every block but the group's metadata is free)
+# - every run of free blocks is fallocate(PUNCH_HOLE)'d, so it reads as zeros and
+#   takes no space on disk (if the filesystem the image is on cannot punch holes,
+#   the runs are overwritten with zeros instead)
+# Anything outside the ext2/3/4 partitions (boot loaders, FAT) is left alone.
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/punch-holes.py -f <image> [-p <partition>] [-n]
+#
+# E.g.:
+# ./bin/punch-holes.py -f images/kali-linux-2022.3-raspberry-pi-arm64.img
+
+import ctypes
+import errno
+import getopt
+import os
+import struct
+import sys
+import time
+
+imagefile = ""
+
+partition = 0
+
+dry_run = False
+
+# fallocate(2)
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+# Group descriptor flags
+EXT4_BG_BLOCK_UNINIT = 0x0002
+
+# Superblock features
+INCOMPAT_META_BG = 0x0010
+INCOMPAT_64BIT = 0x0080
+RO_COMPAT_SPARSE_SUPER = 0x0001
+
+# Zeros written at once, when holes cannot be punched
+ZERO_CHUNK = 1024 * 1024
+
+totals = {
+    "partitions": 0,
+    "runs": 0,
+    "bytes": 0
+    }
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -f <image> [-p <partition>] [-n]"
+        outstr += f"\nE.g. : {prog} -f images/kali-linux-2022.3-raspberry-pi-arm64.img\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global imagefile, partition, dry_run
+
+    try:
+        opts, args = getopt.getopt(argv, "hf:p:n", ["file=", "partition=", "dry-run"])
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-f", "--file"):
+                imagefile = arg
+
+            elif opt in ("-p", "--partition"):
+                try:
+                    partition = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid partition number: {arg}")
+
+            elif opt in ("-n", "--dry-run"):
+                dry_run = True
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if not imagefile:
+        bail("Missing required argument: -f/--file")
+
+    return 0
+
+
+def partitions(fd):
+    """(number, start, size) in bytes of every partition, from the MBR or GPT"""
+    data = os.pread(fd, 1024, 0)
+
+    if data[510:512] != b"\x55\xaa":
+        return [(0, 0, os.fstat(fd).st_size)]
+
+    parts = []
+
+    if data[512:520] == b"EFI PART":
+        entries_lba, count, entry_size = struct.unpack_from("<QII", data, 512 + 72)
+        entries = os.pread(fd, count * entry_size, entries_lba * 512)
+
+        for i in range(count):
+            first, last = struct.unpack_from("<QQ", entries, i * entry_size + 32)
+
+            if first:
+                parts.append((i + 1, first * 512, (last - first + 1) * 512))
+
+        return parts
+
+    for i in range(4):
+        ptype = data[446 + i * 16 + 4]
+        first, sectors = struct.unpack_from("<II", data, 446 + i * 16 + 8)
+
+        if ptype and ptype not in (0x05, 0x0f, 0x85):
+            parts.append((i + 1, first * 512, sectors * 512))
+
+    return parts
+
+
+def has_backup(group, sparse_super):
+    """Whether a group has a backup of the superblock & group descriptors"""
+    if not sparse_super or group <= 1:
+        return True
+
+    for base in (3, 5, 7):
+        n = base
+
+        while n < group:
+            n *= base
+
+        if n == group:
+            return True
+
+    return False
+
+
+def free_runs(fd, offset):
+    """(first block, blocks) of every run of free blocks, and the block size, of an ext2/3/4 filesystem"""
+    sb = os.pread(fd, 1024, offset + 1024)
+
+    if len(sb) < 1024 or struct.unpack_from("<H", sb, 56)[0] != 0xef53:
+        return None, 0
+
+    blocks_lo = struct.unpack_from("<I", sb, 4)[0]
+    first_data_block, log_block_size = struct.unpack_from("<II", sb, 20)
+    blocks_per_group = struct.unpack_from("<I", sb, 32)[0]
+    inodes_per_group = struct.unpack_from("<I", sb, 40)[0]
+    block_size = 1024 << log_block_size
+    inode_size = struct.unpack_from("<H", sb, 88)[0] if struct.unpack_from("<I", sb, 76)[0] else 128
+    incompat, ro_compat = struct.unpack_from("<II", sb, 96)
+    reserved_gdt = struct.unpack_from("<H", sb, 206)[0]
+    is_64bit = bool(incompat & INCOMPAT_64BIT)
+    desc_size = struct.unpack_from("<H", sb, 254)[0] if is_64bit else 32
+    blocks_count = blocks_lo | (struct.unpack_from("<I", sb, 0x150)[0] << 32 if is_64bit else 0)
+
+    # The group descriptors are not in one place
+    if incompat & INCOMPAT_META_BG:
+        raise ValueError("meta_bg is not supported")
+
+    groups = -(-(blocks_count - first_data_block) // blocks_per_group)
+    gdt_blocks = -(-(groups * desc_size) // block_size)
+    gdt = os.pread(fd, gdt_blocks * block_size, offset + (first_data_block + 1) * block_size)
+    itable_blocks = -(-(inodes_per_group * inode_size) // block_size)
+
+    descs = []
+
+    for group in range(groups):
+        pos = group * desc_size
+        bitmap, inode_bitmap, inode_table = struct.unpack_from("<III", gdt, pos)
+        flags = struct.unpack_from("<H", gdt, pos + 0x12)[0]
+
+        if is_64bit and desc_size >= 64:
+            hi = struct.unpack_from("<III", gdt, pos + 0x20)
+            bitmap |= hi[0] << 32
+            inode_bitmap |= hi[1] << 32
+            inode_table |= hi[2] << 32
+
+        descs.append((bitmap, inode_bitmap, inode_table, flags))
+
+    # Every group's bitmaps & inode table (with flex_bg, they are not in their own group)
+    metadata = []
+
+    for bitmap, inode_bitmap, inode_table, _ in descs:
+        metadata += [(bitmap, 1), (inode_bitmap, 1), (inode_table, itable_blocks)]
+
+    runs = []
+
+    for group, (bitmap, _, _, flags) in enumerate(descs):
+        first = first_data_block + group * blocks_per_group
+        count = min(blocks_per_group, blocks_count - first)
+
+        if flags & EXT4_BG_BLOCK_UNINIT:
+            # As the kernel initialises it: only the group's own metadata is used
+            used = 0
+
+            if has_backup(group, ro_compat & RO_COMPAT_SPARSE_SUPER):
+                used |= (1 << (1 + gdt_blocks + reserved_gdt)) - 1
+
+            for start, length in metadata:
+                lo = max(start, first)
+                hi = min(start + length, first + count)
+
+                if lo < hi:
+                    used |= ((1 << (hi - lo)) - 1) << (lo - first)
+
+        else:
+            used = int.from_bytes(os.pread(fd, block_size, offset + bitmap * block_size), "little")
+
+        free = ~used & ((1 << count) - 1)
+
+        while free:
+            low = (free & -free).bit_length() - 1
+            shifted = free >> low
+            length = ((shifted + 1) & ~shifted).bit_length() - 1
+            free &= ~(((1 << length) - 1) << low)
+
+            # Runs carry on over group boundaries
+            if runs and runs[-1][0] + runs[-1][1] == first + low:
+                runs[-1] = (runs[-1][0], runs[-1][1] + length)
+
+            else:
+                runs.append((first + low, length))
+
+    return runs, block_size
+
+
+def punch(fd, offset, length, fallocate):
+    """Punch a hole (or write zeros, once that is not supported)"""
+    if fallocate and fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, offset, length) == 0:
+        return fallocate
+
+    if fallocate:
+        err = ctypes.get_errno()
+
+        if err not in (errno.EOPNOTSUPP, errno.ENOSYS):
+            raise OSError(err, os.strerror(err))
+
+        print("[i] Cannot punch holes in this filesystem, writing zeros", file=sys.stderr)
+
+    zeros = bytes(min(length, ZERO_CHUNK))
+
+    while length > 0:
+        written = os.pwrite(fd, zeros[:length], offset)
+        offset += written
+        length -= written
+
+    return None
+
+
+def libc_fallocate():
+    libc = ctypes.CDLL(None, use_errno=True)
+    fallocate = getattr(libc, "fallocate64", None) or libc.fallocate
+    fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    fallocate.restype = ctypes.c_int
+
+    return fallocate
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isfile(imagefile):
+        bail(f"Missing: '{imagefile}'")
+
+    start = time.monotonic()
+
+    try:
+        fd = os.open(imagefile, os.O_RDONLY if dry_run else os.O_RDWR)
+
+    except OSError as e:
+        bail(f"Cannot open: {imagefile}", e.strerror)
+
+    before = os.fstat(fd).st_blocks * 512
+    fallocate = libc_fallocate()
+
+    try:
+        for number, offset, size in partitions(fd):
+            if partition and number != partition:
+                continue
+
+            try:
+                runs, block_size = free_runs(fd, offset)
+
+            except (ValueError, struct.error) as e:
+                print(f"[i] Partition {number}: skipped ({e})")
+                continue
+
+            if runs is None:
+                continue
+
+            totals["partitions"] += 1
+            free = 0
+
+            for block, blocks in runs:
+                length = min(blocks * block_size, size - block * block_size)
+
+                if length <= 0:
+                    continue
+
+                if not dry_run:
+                    fallocate = punch(fd, offset + block * block_size, length, fallocate)
+
+                free += length
+
+            totals["runs"] += len(runs)
+            totals["bytes"] += free
+
+            print(f"[+] Partition {number}: {free // 1024 ** 2} MiB free in {len(runs)} runs{' (dry run)' if dry_run else ''}")
+
+        if not dry_run:
+            os.fsync(fd)
+
+    except OSError as e:
+        bail(f"Cannot punch holes in: {imagefile}", e.strerror)
+
+    after = os.fstat(fd).st_blocks * 512
+    os.close(fd)
+
+    # Print result and exit
+    print("\nStats:")
+    print(f"  - Partitions\t: {totals['partitions']} (ext2/3/4)")
+    print(f"  - Free\t: {totals['bytes'] // 1024 ** 2} MiB in {totals['runs']} runs")
+    print(f"  - On disk\t: {before // 1024 ** 2} MiB -> {after // 1024 ** 2} MiB")
+    print(f"  - Time\t: {time.monotonic() - start:.1f}s")
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
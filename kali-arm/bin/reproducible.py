@@ -0,0 +1,700 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script for reproducible images (deterministic="yes" in builder.txt): two builds
+# of the same inputs should give the same blocks, so checksum caches, block dedup
+# & deltas between images find what they have in common.
+#
+# - clamp: run by ./common.d/finish_image.sh, on the image's ext2/3/4 partitions
+#   (without mounting): every timestamp of the superblock & of the inodes (atime,
+#   ctime, mtime, crtime) which is after SOURCE_DATE_EPOCH is set to it, and the
+#   mount history (last mounted on, mount count, KiB written) is cleared.
+#   ctimes cannot be set on a rootfs, and mke2fs -d copies them from it
+# - diff: compares two images (builds of the same inputs) and reports what makes
+#   them differ: the blocks which are the same, the partition table IDs, the
+#   filesystem UUIDs, hash seeds & times, the inodes (timestamps only, or more),
+#   the FAT volume IDs, and with the rootfs indexes of both (./bin/rootfs-index.py),
+#   the files, grouped by their likely source. -o writes it as JSON
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/reproducible.py -m clamp -f <image> -t <SOURCE_DATE_EPOCH> [-p <partition>]
+# ./bin/reproducible.py -m diff -a <image> -b <image> [-A <index> -B <index>] [-o <output file>]
+#
+# E.g.:
+# ./bin/reproducible.py -m clamp -f images/kali-linux-2022.3-raspberry-pi-arm64.img -t 1656633600
+# ./bin/reproducible.py -m diff -a build1/kali-linux-2022.3-raspberry-pi-arm64.img -b build2/kali-linux-2022.3-raspberry-pi-arm64.img
+
+import fnmatch
+import getopt
+import gzip
+import json
+import os
+import struct
+import sys
+import time
+import uuid
+
+mode = ""
+
+imagefile = ""
+
+epoch = None
+
+partition = 0
+
+images = ["", ""]
+
+indexes = ["", ""]
+
+outputfile = ""
+
+modes = ("clamp", "diff")
+
+# Compared in blocks of
+BLOCK = 4096
+
+# Read at once
+CHUNK = 1024 * 1024
+
+# Group descriptor flags
+EXT4_BG_INODE_UNINIT = 0x0001
+
+# Superblock features
+INCOMPAT_META_BG = 0x0010
+INCOMPAT_64BIT = 0x0080
+RO_COMPAT_GDT_CSUM = 0x0010
+RO_COMPAT_METADATA_CSUM = 0x0400
+
+# Superblock: (name, offset of the low 32 bits, offset of the high 8 bits)
+SB_TIMES = [
+    ("mtime", 0x2C, 0x275),
+    ("wtime", 0x30, 0x274),
+    ("lastcheck", 0x40, 0x277),
+    ("mkfs_time", 0x108, 0x276),
+    ("first_error_time", 0x198, 0x278),
+    ("last_error_time", 0x1CC, 0x279)
+    ]
+
+# Inode: (name, offset, offset of the _extra field) - _extra: 2 bits of epoch & 30 of nanoseconds
+INODE_TIMES = [
+    ("atime", 0x08, 0x8C),
+    ("ctime", 0x0C, 0x84),
+    ("mtime", 0x10, 0x88),
+    ("crtime", 0x90, 0x94)
+    ]
+
+# Files which differ between builds, by their likely source (first match)
+SOURCES = [
+    ("logs", ["/var/log/*"]),
+    ("machine IDs", ["/etc/machine-id", "/var/lib/dbus/machine-id", "/var/lib/systemd/random-seed"]),
+    ("passwords (salts, last change)", ["/etc/shadow", "/etc/shadow-", "/etc/gshadow", "/etc/gshadow-"]),
+    ("SSH host keys", ["/etc/ssh/ssh_host_*"]),
+    ("linker cache", ["/etc/ld.so.cache", "/var/cache/ldconfig/*"]),
+    ("Python bytecode", ["*.pyc"]),
+    ("font & icon caches", ["/var/cache/fontconfig/*", "*/icon-theme.cache", "*/.uuid"]),
+    ("package state", ["/var/lib/dpkg/*", "/var/lib/apt/*", "/var/cache/apt/*", "/var/cache/debconf/*"]),
+    ("first boot manifest", ["/var/lib/runonce/*"]),
+    ("boot files", ["/boot/*"])
+    ]
+
+results = {}
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m clamp -f <image> -t <SOURCE_DATE_EPOCH> [-p <partition>]"
+        outstr += f"\n       {prog} -m diff -a <image> -b <image> [-A <index> -B <index>] [-o <output file>]"
+        outstr += f"\nE.g. : {prog} -m diff -a build1/kali-linux-2022.3-raspberry-pi-arm64.img -b build2/kali-linux-2022.3-raspberry-pi-arm64.img\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, imagefile, epoch, partition, outputfile
+
+    try:
+        opts, args = getopt.getopt(argv, "hm:f:t:p:a:b:A:B:o:", ["mode=", "file=", "epoch=", "partition=", "image-a=", "image-b=", "index-a=", "index-b=", "outputfile="])
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-f", "--file"):
+                imagefile = arg
+
+            elif opt in ("-t", "--epoch"):
+                try:
+                    epoch = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid SOURCE_DATE_EPOCH: {arg}")
+
+            elif opt in ("-p", "--partition"):
+                try:
+                    partition = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid partition number: {arg}")
+
+            elif opt in ("-a", "--image-a"):
+                images[0] = arg
+
+            elif opt in ("-b", "--image-b"):
+                images[1] = arg
+
+            elif opt in ("-A", "--index-a"):
+                indexes[0] = arg
+
+            elif opt in ("-B", "--index-b"):
+                indexes[1] = arg
+
+            elif opt in ("-o", "--outputfile"):
+                outputfile = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if mode == "clamp" and (not imagefile or epoch is None):
+        bail("Missing required arguments: -f/--file & -t/--epoch")
+
+    if mode == "diff" and not all(images):
+        bail("Missing required arguments: -a/--image-a & -b/--image-b")
+
+    if any(indexes) and not all(indexes):
+        bail("Missing required argument: the index of both images (-A & -B)")
+
+    return 0
+
+
+def partitions(fd):
+    """(number, start, size) in bytes of every partition, from the MBR or GPT (as ./bin/punch-holes.py)"""
+    data = os.pread(fd, 1024, 0)
+
+    if data[510:512] != b"\x55\xaa":
+        return [(0, 0, os.fstat(fd).st_size)]
+
+    parts = []
+
+    if data[512:520] == b"EFI PART":
+        entries_lba, count, entry_size = struct.unpack_from("<QII", data, 512 + 72)
+        entries = os.pread(fd, count * entry_size, entries_lba * 512)
+
+        for i in range(count):
+            first, last = struct.unpack_from("<QQ", entries, i * entry_size + 32)
+
+            if first:
+                parts.append((i + 1, first * 512, (last - first + 1) * 512))
+
+        return parts
+
+    for i in range(4):
+        ptype = data[446 + i * 16 + 4]
+        first, sectors = struct.unpack_from("<II", data, 446 + i * 16 + 8)
+
+        if ptype and ptype not in (0x05, 0x0f, 0x85):
+            parts.append((i + 1, first * 512, sectors * 512))
+
+    return parts
+
+
+def table_ids(fd):
+    """{name: ID} of the partition table: disk identifier (MBR), disk & partition GUIDs (GPT)"""
+    data = os.pread(fd, 1024, 0)
+
+    if data[510:512] != b"\x55\xaa":
+        return {}
+
+    if data[512:520] != b"EFI PART":
+        return {"disk identifier": f"0x{struct.unpack_from('<I', data, 440)[0]:08x}"}
+
+    ids = {"disk GUID": str(uuid.UUID(bytes_le=data[512 + 56:512 + 72]))}
+    entries_lba, count, entry_size = struct.unpack_from("<QII", data, 512 + 72)
+    entries = os.pread(fd, count * entry_size, entries_lba * 512)
+
+    for i in range(count):
+        if struct.unpack_from("<Q", entries, i * entry_size + 32)[0]:
+            ids[f"partition {i + 1} GUID"] = str(uuid.UUID(bytes_le=entries[i * entry_size + 16:i * entry_size + 32]))
+
+    return ids
+
+
+class Ext:
+    """The superblock & group descriptors of an ext2/3/4 filesystem"""
+
+    def __init__(self, fd, offset):
+        self.fd = fd
+        self.offset = offset
+        self.sb = bytearray(os.pread(fd, 1024, offset + 1024))
+
+        if len(self.sb) < 1024 or struct.unpack_from("<H", self.sb, 56)[0] != 0xef53:
+            raise ValueError("not ext2/3/4")
+
+        sb = self.sb
+        first_data_block, log_block_size = struct.unpack_from("<II", sb, 20)
+        blocks_per_group = struct.unpack_from("<I", sb, 32)[0]
+        incompat, self.ro_compat = struct.unpack_from("<II", sb, 96)
+        is_64bit = bool(incompat & INCOMPAT_64BIT)
+        desc_size = struct.unpack_from("<H", sb, 254)[0] if is_64bit else 32
+        blocks_count = struct.unpack_from("<I", sb, 4)[0] | (struct.unpack_from("<I", sb, 0x150)[0] << 32 if is_64bit else 0)
+
+        self.block_size = 1024 << log_block_size
+        self.inodes_per_group = struct.unpack_from("<I", sb, 40)[0]
+        self.inode_size = struct.unpack_from("<H", sb, 88)[0] if struct.unpack_from("<I", sb, 76)[0] else 128
+
+        # The group descriptors are not in one place
+        if incompat & INCOMPAT_META_BG:
+            raise ValueError("meta_bg is not supported")
+
+        groups = -(-(blocks_count - first_data_block) // blocks_per_group)
+        gdt = os.pread(fd, -(-(groups * desc_size) // self.block_size) * self.block_size, offset + (first_data_block + 1) * self.block_size)
+        self.groups = []
+
+        for group in range(groups):
+            pos = group * desc_size
+            inode_bitmap, inode_table = struct.unpack_from("<II", gdt, pos + 4)
+            flags = struct.unpack_from("<H", gdt, pos + 0x12)[0]
+            itable_unused = struct.unpack_from("<H", gdt, pos + 0x1C)[0]
+
+            if is_64bit and desc_size >= 64:
+                hi = struct.unpack_from("<II", gdt, pos + 0x24)
+                inode_bitmap |= hi[0] << 32
+                inode_table |= hi[1] << 32
+
+            self.groups.append((inode_bitmap, inode_table, flags, itable_unused))
+
+    def fields(self):
+        """{name: value} of the superblock fields which differ between builds"""
+        sb = self.sb
+        values = {
+            "UUID": str(uuid.UUID(bytes=bytes(sb[0x68:0x78]))),
+            "hash seed": str(uuid.UUID(bytes=bytes(sb[0xEC:0xFC]))),
+            "last mounted on": sb[0x88:0xC8].split(b"\0")[0].decode(errors="replace"),
+            "mount count": struct.unpack_from("<H", sb, 0x34)[0],
+            "KiB written": struct.unpack_from("<Q", sb, 0x178)[0]
+            }
+
+        for name, lo, hi in SB_TIMES:
+            values[name] = struct.unpack_from("<I", sb, lo)[0] | (sb[hi] << 32)
+
+        return values
+
+    def inode_tables(self):
+        """(group, offset, length) in bytes of the part of each inode table which is in use"""
+        csum = self.ro_compat & (RO_COMPAT_GDT_CSUM | RO_COMPAT_METADATA_CSUM)
+
+        for group, (_, inode_table, flags, itable_unused) in enumerate(self.groups):
+            if csum and flags & EXT4_BG_INODE_UNINIT:
+                continue
+
+            used = self.inodes_per_group - (itable_unused if csum else 0)
+
+            if used > 0:
+                yield group, self.offset + inode_table * self.block_size, used * self.inode_size
+
+    def in_use(self, group):
+        """Inode bitmap of a group, as an int"""
+        return int.from_bytes(os.pread(self.fd, self.block_size, self.offset + self.groups[group][0] * self.block_size), "little")
+
+
+def clamp_time(buf, pos, hi_pos, hi_mask):
+    """Set a time (32 bits & some high bits) to epoch, if it is after it. True if it changed"""
+    value = struct.unpack_from("<I", buf, pos)[0] | ((buf[hi_pos] & hi_mask) << 32 if hi_pos is not None else 0)
+
+    if value <= epoch:
+        return False
+
+    struct.pack_into("<I", buf, pos, epoch & 0xffffffff)
+
+    if hi_pos is not None:
+        buf[hi_pos] = (buf[hi_pos] & ~hi_mask) | ((epoch >> 32) & hi_mask)
+
+    return True
+
+
+def clamp_inode(buf, pos, inode_size):
+    """Clamp the times of the inode at pos. True if one changed"""
+    changed = False
+    extra_isize = struct.unpack_from("<H", buf, pos + 0x80)[0] if inode_size > 128 else 0
+
+    for _, field, extra in INODE_TIMES:
+        if field >= 0x80 and 0x80 + extra_isize < field + 4:
+            continue
+
+        has_extra = 0x80 + extra_isize >= extra + 4
+
+        if field >= 0x80:
+            value = struct.unpack_from("<I", buf, pos + field)[0]
+
+        else:
+            value = struct.unpack_from("<i", buf, pos + field)[0]
+
+        if has_extra:
+            value += (struct.unpack_from("<I", buf, pos + extra)[0] & 3) << 32
+
+        if value <= epoch:
+            continue
+
+        struct.pack_into("<I", buf, pos + field, epoch & 0xffffffff)
+
+        # No nanoseconds
+        if has_extra:
+            struct.pack_into("<I", buf, pos + extra, (epoch >> 32) & 3)
+
+        changed = True
+
+    return changed
+
+
+def clamp():
+    try:
+        fd = os.open(imagefile, os.O_RDWR)
+
+    except OSError as e:
+        bail(f"Cannot open: {imagefile}", e.strerror)
+
+    totals = {"partitions": 0, "inodes": 0}
+
+    for number, offset, _ in partitions(fd):
+        if partition and number != partition:
+            continue
+
+        try:
+            fs = Ext(fd, offset)
+
+        except (ValueError, struct.error) as e:
+            print(f"[i] Partition {number}: skipped ({e})")
+            continue
+
+        # Changing them means computing the checksums again
+        if fs.ro_compat & RO_COMPAT_METADATA_CSUM:
+            print(f"[i] Partition {number}: skipped (metadata_csum)")
+            continue
+
+        clamped = 0
+
+        for group, start, length in fs.inode_tables():
+            table = bytearray(os.pread(fd, length, start))
+            bitmap = fs.in_use(group)
+            changed = False
+
+            for i in range(length // fs.inode_size):
+                if bitmap >> i & 1 and clamp_inode(table, i * fs.inode_size, fs.inode_size):
+                    changed = True
+                    clamped += 1
+
+            if changed:
+                os.pwrite(fd, table, start)
+
+        sb = fs.sb
+
+        for _, lo, hi in SB_TIMES:
+            clamp_time(sb, lo, hi, 0xff)
+
+        # Mount history (only the loop backend mounts the filesystems)
+        sb[0x88:0xC8] = bytes(64)
+        struct.pack_into("<H", sb, 0x34, 0)
+        struct.pack_into("<Q", sb, 0x178, 0)
+
+        os.pwrite(fd, sb, offset + 1024)
+
+        totals["partitions"] += 1
+        totals["inodes"] += clamped
+
+        print(f"[+] Partition {number}: {clamped} inodes clamped to {epoch}")
+
+    os.fsync(fd)
+    os.close(fd)
+
+    print("\nStats:")
+    print(f"  - Partitions\t: {totals['partitions']} (ext2/3/4)")
+    print(f"  - Inodes\t: {totals['inodes']} clamped")
+
+
+def same_blocks(fds, offset, size):
+    """Blocks of size bytes at offset, and how many of them are the same in both images"""
+    same = 0
+    total = 0
+
+    for pos in range(offset, offset + size, CHUNK):
+        length = min(CHUNK, offset + size - pos)
+        a, b = (os.pread(fd, length, pos) for fd in fds)
+
+        for i in range(0, length, BLOCK):
+            total += 1
+
+            if a[i:i + BLOCK] == b[i:i + BLOCK]:
+                same += 1
+
+    return total, same
+
+
+def diff_inodes(fss):
+    """Inodes which differ: (only in their times, in more than their times)"""
+    inode_size = fss[0].inode_size
+    times_only = 0
+    more = 0
+
+    tables = [list(fs.inode_tables()) for fs in fss]
+
+    for (_, start_a, length_a), (_, start_b, length_b) in zip(*tables):
+        length = min(length_a, length_b)
+        a = os.pread(fss[0].fd, length, start_a)
+        b = os.pread(fss[1].fd, length, start_b)
+
+        if a == b:
+            continue
+
+        for pos in range(0, length, inode_size):
+            ia = bytearray(a[pos:pos + inode_size])
+            ib = bytearray(b[pos:pos + inode_size])
+
+            if ia == ib:
+                continue
+
+            # Without their times
+            for inode in (ia, ib):
+                for _, field, extra in INODE_TIMES:
+                    for at in (field, extra):
+                        if at + 4 <= inode_size:
+                            inode[at:at + 4] = bytes(4)
+
+            if ia == ib:
+                times_only += 1
+
+            else:
+                more += 1
+
+    return times_only, more
+
+
+def fat_ids(fd, offset):
+    """Volume ID & label of a FAT partition, or None"""
+    data = os.pread(fd, 512, offset)
+
+    if data[510:512] != b"\x55\xaa":
+        return None
+
+    if data[0x52:0x5A].startswith(b"FAT32"):
+        return {"volume ID": f"{struct.unpack_from('<I', data, 0x43)[0]:08X}", "label": data[0x47:0x52].decode(errors="replace").strip()}
+
+    if data[0x36:0x3B].startswith(b"FAT"):
+        return {"volume ID": f"{struct.unpack_from('<I', data, 0x27)[0]:08X}", "label": data[0x2B:0x36].decode(errors="replace").strip()}
+
+    return None
+
+
+def read_index(file):
+    """{path: (sha256, mode, owner)} of a rootfs index (./bin/rootfs-index.py)"""
+    entries = {}
+
+    with gzip.open(file, "rt", encoding="utf-8", errors="surrogateescape") as f:
+        if not f.readline().startswith("# rootfs-index"):
+            raise ValueError("not a rootfs index")
+
+        for line in f:
+            digest, mode_, owner, _, path = line.rstrip("\n").split("\t", 4)
+            entries[path] = (digest, mode_, owner)
+
+    return entries
+
+
+def source_of(path):
+    for name, patterns in SOURCES:
+        if any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns):
+            return name
+
+    return "other"
+
+
+def diff_files():
+    try:
+        a, b = (read_index(file) for file in indexes)
+
+    except (OSError, ValueError) as e:
+        bail("Cannot read the indexes", str(e))
+
+    sources = {}
+
+    for path in sorted(set(a) | set(b)):
+        if a.get(path) == b.get(path):
+            continue
+
+        if path not in a or path not in b:
+            change = "only in one build"
+
+        elif a[path][0] != b[path][0]:
+            change = "content"
+
+        else:
+            change = "mode/owner"
+
+        sources.setdefault(source_of(path), []).append((path, change))
+
+    results["files"] = {name: [{"path": path, "change": change} for path, change in paths] for name, paths in sources.items()}
+
+    print(f"\n[i] Files which differ: {sum(len(paths) for paths in sources.values())}")
+
+    for name, paths in sorted(sources.items(), key=lambda item: -len(item[1])):
+        print(f"  - {name}\t: {len(paths)}")
+
+        for path, change in paths[:5]:
+            print(f"      {path} ({change})")
+
+        if len(paths) > 5:
+            print(f"      ... {len(paths) - 5} more")
+
+
+def diff():
+    try:
+        fds = [os.open(image, os.O_RDONLY) for image in images]
+
+    except OSError as e:
+        bail(f"Cannot open: {e.filename}", e.strerror)
+
+    sizes = [os.fstat(fd).st_size for fd in fds]
+    causes = []
+
+    total, same = same_blocks(fds, 0, min(sizes))
+    results["blocks"] = {"total": total, "same": same}
+
+    print(f"[i] Blocks ({BLOCK // 1024} KiB) which are the same: {same} of {total} ({same * 100 / total if total else 0:.1f}%)")
+
+    if sizes[0] != sizes[1]:
+        print(f"[-] Sizes: {sizes[0]} & {sizes[1]} bytes")
+        causes.append("image size")
+
+    ids = [table_ids(fd) for fd in fds]
+    results["table"] = {name: [ids[0].get(name), ids[1].get(name)] for name in ids[0]}
+
+    for name, (value_a, value_b) in results["table"].items():
+        if value_a != value_b:
+            print(f"[-] Partition table {name}: {value_a} & {value_b}")
+            causes.append(f"partition table {name}")
+
+    results["partitions"] = {}
+    parts = [{number: (offset, size) for number, offset, size in partitions(fd)} for fd in fds]
+
+    for number, (offset, size) in parts[0].items():
+        if number not in parts[1]:
+            continue
+
+        total, same = same_blocks(fds, offset, min(size, parts[1][number][1]))
+        result = {"blocks": total, "same": same, "fields": {}}
+        results["partitions"][number] = result
+
+        print(f"\n[i] Partition {number}: {same} of {total} blocks the same ({same * 100 / total if total else 0:.1f}%)")
+
+        try:
+            fss = [Ext(fd, part[number][0]) for fd, part in zip(fds, parts)]
+
+        except (ValueError, struct.error):
+            fss = None
+
+        if fss:
+            fields = [fs.fields() for fs in fss]
+
+            for name in fields[0]:
+                if fields[0][name] != fields[1][name]:
+                    result["fields"][name] = [fields[0][name], fields[1][name]]
+                    print(f"[-] {name}: {fields[0][name]} & {fields[1][name]}")
+                    causes.append(f"partition {number} {name}")
+
+            if fss[0].inode_size == fss[1].inode_size:
+                times_only, more = diff_inodes(fss)
+                result["inodes"] = {"times_only": times_only, "more": more}
+
+                if times_only:
+                    print(f"[-] Inodes which differ in their times only: {times_only}")
+                    causes.append(f"partition {number} inode times")
+
+                if more:
+                    print(f"[-] Inodes which differ in more than their times: {more} (allocation order, sizes or content)")
+                    causes.append(f"partition {number} inodes")
+
+            continue
+
+        fats = [fat_ids(fd, part[number][0]) for fd, part in zip(fds, parts)]
+
+        if all(fats):
+            for name in fats[0]:
+                if fats[0][name] != fats[1][name]:
+                    result["fields"][name] = [fats[0][name], fats[1][name]]
+                    print(f"[-] FAT {name}: {fats[0][name]} & {fats[1][name]}")
+                    causes.append(f"partition {number} FAT {name}")
+
+    for fd in fds:
+        os.close(fd)
+
+    if all(indexes):
+        diff_files()
+
+    results["causes"] = causes
+
+    print("\nStats:")
+    print(f"  - Same blocks\t: {results['blocks']['same'] * 100 / results['blocks']['total'] if results['blocks']['total'] else 0:.1f}%")
+    print(f"  - Causes\t: {', '.join(causes) if causes else 'none found'}")
+
+    if outputfile:
+        with open(outputfile, "w") as f:
+            json.dump(results, f, indent=2)
+
+        print(f"\n[+] File: {outputfile} successfully written")
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    start = time.monotonic()
+
+    if mode == "clamp":
+        if not os.path.isfile(imagefile):
+            bail(f"Missing: '{imagefile}'")
+
+        clamp()
+
+    else:
+        diff()
+
+    print(f"  - Time\t: {time.monotonic() - start:.1f}s")
+
+    # Exit
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
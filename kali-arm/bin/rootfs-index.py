@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to index what is in the rootfs of each image, and report how much of it
+# is the same across images (for dedup, delta shipping & caching decisions).
+#
+# - index: walks the rootfs (work_dir, before make_image()) in parallel, one
+#   directory per task, and writes "<image>.img.index" (gzip):
+#   "<sha256>\t<mode>\t<uid>:<gid>\t<size>\t<path>" per entry, sorted by path
+#   (symlinks: the hash of their target, directories & others: "-").
+#   Hashes are kept in <cache dir>/<name>.tsv by path, inode, size & mtime, so an
+#   unchanged file is not read again when the same rootfs is indexed again
+# - report: from the index files, per image: files, size, and how much of it is
+#   in no other image (unique) or in other images too (shared), then per
+#   architecture & overall: the size of the distinct content (what a dedup store
+#   would hold) and of the content every image has. -O writes it as JSON
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/rootfs-index.py -m index -d <rootfs> -o <index file> [-n <name>] [-a <architecture>] [-e <exclude>] [-C <cache dir>] [-j <jobs>]
+# ./bin/rootfs-index.py -m report (-i <index file> ... | -I <image directory>) [-O <output file>]
+#
+# E.g.:
+# ./bin/rootfs-index.py -m index -d base/rpi-arm64/working -e boot -o images/kali-linux-2022.3-raspberry-pi-arm64.img.index -n rpi-arm64 -a arm64
+# ./bin/rootfs-index.py -m report -I images/
+
+import concurrent.futures
+import getopt
+import glob
+import gzip
+import hashlib
+import json
+import os
+import stat
+import sys
+import time
+
+mode = ""
+
+directory = ""
+
+outputfile = ""
+
+name = ""
+
+architecture = ""
+
+excludes = []
+
+cachedir = "./cache/rootfs-index"
+
+jobs = min(32, (os.cpu_count() or 1) * 2)
+
+inputfiles = []
+
+imagedir = ""
+
+reportfile = ""
+
+modes = ("index", "report")
+
+# First line of an index file
+HEADER = "# rootfs-index 1"
+
+# Read size, when hashing
+CHUNK = 1024 * 1024
+
+totals = {
+    "entries": 0,
+    "files": 0,
+    "bytes": 0,
+    "hashed": 0,
+    "hashed_bytes": 0
+    }
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m index -d <rootfs> -o <index file> [-n <name>] [-a <architecture>] [-e <exclude>] [-C <cache dir>] [-j <jobs>]"
+        outstr += f"\n       {prog} -m report (-i <index file> ... | -I <image directory>) [-O <output file>]"
+        outstr += f"\nE.g. : {prog} -m report -I images/\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, directory, outputfile, name, architecture, cachedir, jobs, imagedir, reportfile
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:d:o:n:a:e:C:j:i:I:O:",
+            [
+                "mode=",
+                "directory=",
+                "outputfile=",
+                "name=",
+                "architecture=",
+                "exclude=",
+                "cachedir=",
+                "jobs=",
+                "inputfile=",
+                "imagedir=",
+                "reportfile="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-m", "--mode"):
+                mode = arg
+
+            elif opt in ("-d", "--directory"):
+                directory = os.path.abspath(arg)
+
+            elif opt in ("-o", "--outputfile"):
+                outputfile = arg
+
+            elif opt in ("-n", "--name"):
+                name = arg
+
+            elif opt in ("-a", "--architecture"):
+                architecture = arg
+
+            elif opt in ("-e", "--exclude"):
+                excludes.append(arg.strip("/"))
+
+            elif opt in ("-C", "--cachedir"):
+                cachedir = arg
+
+            elif opt in ("-j", "--jobs"):
+                try:
+                    jobs = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of jobs: {arg}")
+
+            elif opt in ("-i", "--inputfile"):
+                inputfiles.append(arg)
+
+            elif opt in ("-I", "--imagedir"):
+                imagedir = arg.rstrip("/")
+
+            elif opt in ("-O", "--reportfile"):
+                reportfile = arg
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if mode == "index" and not (directory and outputfile):
+        bail("Missing required argument: -d/--directory and -o/--outputfile")
+
+    if mode == "report" and not (inputfiles or imagedir):
+        bail("Missing required argument: -i/--inputfile or -I/--imagedir")
+
+    return 0
+
+
+def escape(path):
+    """Paths are bytes on disk: keep them, but on one line, with no tab"""
+    return path.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def sha256(path):
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def read_cache():
+    """{path (escaped): (inode, size, mtime_ns, sha256)} of the last index of this name"""
+    cache = {}
+
+    if not name:
+        return cache
+
+    try:
+        with open(os.path.join(cachedir, f"{name}.tsv"), encoding="utf-8", errors="surrogateescape") as f:
+            for line in f:
+                ino, size, mtime, digest, path = line.rstrip("\n").split("\t", 4)
+                cache[path] = (int(ino), int(size), int(mtime), digest)
+
+    except (OSError, ValueError):
+        pass
+
+    return cache
+
+
+def write_cache(records):
+    if not name:
+        return
+
+    os.makedirs(cachedir, exist_ok=True)
+    tmp = os.path.join(cachedir, f".{name}.{os.getpid()}")
+
+    with open(tmp, "w", encoding="utf-8", errors="surrogateescape") as f:
+        for path, (ino, size, mtime, digest) in sorted(records.items()):
+            f.write(f"{ino}\t{size}\t{mtime}\t{digest}\t{path}\n")
+
+    os.replace(tmp, os.path.join(cachedir, f"{name}.tsv"))
+
+
+def scan(path, device, cache):
+    """Index one directory (not its sub-directories, which are returned)"""
+    entries = []
+    hashes = {}
+    subdirs = []
+    hashed = 0
+    hashed_bytes = 0
+
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                rel = "/" + os.path.relpath(entry.path, directory)
+                st = entry.stat(follow_symlinks=False)
+                digest = "-"
+
+                if stat.S_ISDIR(st.st_mode):
+                    # Excluded, or another filesystem (e.g. proc): only the mount point
+                    if rel.lstrip("/") not in excludes and st.st_dev == device:
+                        subdirs.append(entry.path)
+
+                elif stat.S_ISREG(st.st_mode):
+                    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+                    cached = cache.get(escape(rel))
+
+                    if cached and cached[:3] == key:
+                        digest = cached[3]
+
+                    else:
+                        digest = sha256(entry.path)
+                        hashed += 1
+                        hashed_bytes += st.st_size
+
+                    hashes[escape(rel)] = (*key, digest)
+
+                elif stat.S_ISLNK(st.st_mode):
+                    digest = hashlib.sha256(os.fsencode(os.readlink(entry.path))).hexdigest()
+
+                entries.append((rel, digest, st))
+
+    except OSError as e:
+        print(f"[i] Skipping: {path} ({e.strerror})", file=sys.stderr)
+
+    return entries, hashes, subdirs, hashed, hashed_bytes
+
+
+def index():
+    device = os.lstat(directory).st_dev
+    cache = read_cache()
+    records = {}
+    lines = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = {pool.submit(scan, directory, device, cache)}
+
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                entries, hashes, subdirs, hashed, hashed_bytes = future.result()
+
+                for rel, digest, st in entries:
+                    lines.append((rel, f"{digest}\t{st.st_mode:o}\t{st.st_uid}:{st.st_gid}\t{st.st_size}\t{escape(rel)}\n"))
+                    totals["entries"] += 1
+
+                    if stat.S_ISREG(st.st_mode):
+                        totals["files"] += 1
+                        totals["bytes"] += st.st_size
+
+                records.update(hashes)
+                totals["hashed"] += hashed
+                totals["hashed_bytes"] += hashed_bytes
+
+                for path in subdirs:
+                    pending.add(pool.submit(scan, path, device, cache))
+
+    os.makedirs(os.path.dirname(os.path.abspath(outputfile)), exist_ok=True)
+
+    # Same rootfs, same file (no file name or timestamp in the gzip header)
+    with open(outputfile, "wb") as raw, gzip.GzipFile(filename="", fileobj=raw, mode="wb", mtime=0) as f:
+        f.write(f"{HEADER} name={name} architecture={architecture}\n".encode())
+
+        for _, line in sorted(lines):
+            f.write(line.encode("utf-8", "surrogateescape"))
+
+    write_cache(records)
+
+
+def read_index(file):
+    """Header fields, and [(sha256, size)] of the regular files"""
+    fields = {}
+    files = []
+
+    with gzip.open(file, "rt", encoding="utf-8", errors="surrogateescape") as f:
+        header = f.readline().rstrip("\n")
+
+        if not header.startswith(HEADER):
+            raise ValueError("not a rootfs index")
+
+        for field in header[len(HEADER):].split():
+            key, _, value = field.partition("=")
+            fields[key] = value
+
+        for line in f:
+            digest, mode_, _, size, _ = line.split("\t", 4)
+
+            if stat.S_ISREG(int(mode_, 8)):
+                files.append((digest, int(size)))
+
+    return fields, files
+
+
+def fmt_size(size):
+    return f"{size / 1024 ** 2:.0f} MiB"
+
+
+def report():
+    files = list(inputfiles)
+
+    if imagedir:
+        files += sorted(glob.glob(f"{imagedir}/*.index"))
+
+    images = {}
+
+    for file in files:
+        try:
+            fields, entries = read_index(file)
+
+        except (OSError, ValueError, EOFError) as e:
+            print(f"[i] Skipping: {file} ({e})", file=sys.stderr)
+            continue
+
+        image = os.path.basename(file)[:-len(".index")] if file.endswith(".index") else file
+        images[image] = (fields.get("architecture") or "unknown", entries)
+
+    if not images:
+        bail("No index files", f"Looked in: {', '.join(files) or imagedir}")
+
+    # Content: in how many images (and which architecture)
+    owners = {}
+    sizes = {}
+
+    for image, (arch, entries) in images.items():
+        for digest, size in entries:
+            owners.setdefault(digest, set()).add(image)
+            sizes[digest] = size
+
+    results = {"images": {}, "architectures": {}}
+
+    print("| Image | Architecture | Files | Size | Unique | Shared |")
+    print("|-------|--------------|-------|------|--------|--------|")
+
+    for image, (arch, entries) in sorted(images.items()):
+        total = sum(size for _, size in entries)
+        unique = sum(size for digest, size in entries if len(owners[digest]) == 1)
+        results["images"][image] = {"architecture": arch, "files": len(entries), "bytes": total, "unique_bytes": unique, "shared_bytes": total - unique}
+
+        print(f"| {image} | {arch} | {len(entries)} | {fmt_size(total)} | {fmt_size(unique)} | {fmt_size(total - unique)} |")
+
+    groups = {}
+
+    for image, (arch, _) in images.items():
+        groups.setdefault(arch, set()).add(image)
+
+    groups["all"] = set(images)
+
+    print("\n| Architecture | Images | Size | Distinct | Dedup | In every image |")
+    print("|--------------|--------|------|----------|-------|----------------|")
+
+    for arch, members in sorted(groups.items(), key=lambda g: (g[0] == "all", g[0])):
+        total = sum(results["images"][image]["bytes"] for image in members)
+        distinct = sum(sizes[digest] for digest, owner in owners.items() if owner & members)
+        common = sum(sizes[digest] for digest, owner in owners.items() if members <= owner)
+        ratio = total / distinct if distinct else 1
+        results["architectures"][arch] = {"images": len(members), "bytes": total, "distinct_bytes": distinct, "common_bytes": common}
+
+        print(f"| {arch} | {len(members)} | {fmt_size(total)} | {fmt_size(distinct)} | {ratio:.1f}x | {fmt_size(common)} |")
+
+    if reportfile:
+        with open(reportfile, "w") as f:
+            json.dump(results, f, indent=2)
+
+        print(f"\n[+] File: {reportfile} successfully written")
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    start = time.monotonic()
+
+    if mode == "report":
+        report()
+
+        exit(0)
+
+    if not os.path.isdir(directory):
+        bail(f"Missing: '{directory}'")
+
+    index()
+
+    # Print result and exit
+    print(f"[+] File: {outputfile} successfully written")
+    print("\nStats:")
+    print(f"  - Entries\t: {totals['entries']} ({totals['files']} files, {fmt_size(totals['bytes'])})")
+    print(f"  - Hashed\t: {totals['hashed']} files, {fmt_size(totals['hashed_bytes'])} ({totals['files'] - totals['hashed']} cached)")
+    print(f"  - Time\t: {time.monotonic() - start:.1f}s")
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to work out the smallest safe size of the root filesystem of an image,
+# from the rootfs (work_dir), for make_image() in ./common.d/functions.sh
+# (root_sizing="model" in builder.txt).
+#
+# It walks the rootfs in parallel (os.scandir, one directory per task) and counts:
+# - the blocks each file will take on the new filesystem (not on the host's):
+#   data blocks, extent/indirect blocks, directory blocks from the entries,
+#   fast symlinks (no block), and hardlinked files once
+# - the inodes
+# Then it models the filesystem mke2fs would create (as mkfs_partitions() does,
+# for ext2/3/4 and the features used): inode tables for the inode ratio, bitmaps,
+# group descriptors & their backups, reserved GDT blocks, the journal and the
+# reserved blocks, and finds the smallest size where the rootfs, the margin and
+# the free space fit, with enough inodes.
+#
+# The size (KiB) goes to stdout, the breakdown to stderr.
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/rootfs-size.py -d <rootfs> [-e <exclude>] [-t <ext2|ext3|ext4>] [-O <features>] [-f <free MiB>] [-m <margin %>] [-j <jobs>]
+#
+# E.g.:
+# ./bin/rootfs-size.py -d base/rpi-arm64/working -e boot -t ext4 -O ^64bit,^metadata_csum -f 1024 -m 5
+
+import concurrent.futures
+import getopt
+import math
+import os
+import stat
+import sys
+import threading
+
+directory = ""
+
+excludes = []
+
+fstype = "ext4"
+
+features = ""
+
+block_size = 4096
+
+inode_size = 256
+
+# mke2fs.conf: "default" type
+inode_ratio = 16384
+
+# mke2fs -m
+reserved_pct = 5
+
+free_mib = 0
+
+margin_pct = 5
+
+jobs = min(32, (os.cpu_count() or 1) * 4)
+
+# As mkfs_partitions() in ./common.d/functions.sh
+default_features = {
+    "ext4": "^64bit,^metadata_csum",
+    "ext3": "^64bit",
+    "ext2": "^64bit"
+    }
+
+# Below this, mke2fs uses its "small" type (1 KiB blocks, more inodes), which is
+# not modelled: the size is never smaller (a rootfs is bigger anyway)
+SMALLEST = 512 * 1024 ** 2
+
+# Inodes which are always used: reserved (1-10), lost+found
+RESERVED_INODES = 11
+
+# Blocks of lost+found (mke2fs makes it 16 KiB)
+LOST_FOUND = 16 * 1024
+
+# Inline extents of an inode, and extents per extent block entry
+INLINE_EXTENTS = 4
+MAX_EXTENT = 32768
+
+totals = {
+    "files": 0,
+    "dirs": 0,
+    "symlinks": 0,
+    "other": 0,
+    "hardlinks": 0,
+    "bytes": 0,
+    "host": 0,
+    "blocks": 0,
+    "inodes": 0
+    }
+
+lock = threading.Lock()
+
+seen = set()
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -d <rootfs> [-e <exclude>] [-t <ext2|ext3|ext4>] [-O <features>] [-f <free MiB>] [-m <margin %>] [-j <jobs>]"
+        outstr += f"\nE.g. : {prog} -d base/rpi-arm64/working -e boot -f 1024\n"
+
+    print(outstr, file=sys.stderr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global directory, fstype, features, block_size, inode_size, inode_ratio, reserved_pct, free_mib, margin_pct, jobs
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hd:e:t:O:b:I:i:r:f:m:j:",
+            [
+                "directory=",
+                "exclude=",
+                "fstype=",
+                "features=",
+                "block-size=",
+                "inode-size=",
+                "inode-ratio=",
+                "reserved=",
+                "free=",
+                "margin=",
+                "jobs="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        for opt, arg in opts:
+            if opt == "-h":
+                bail()
+
+            elif opt in ("-d", "--directory"):
+                directory = os.path.abspath(arg)
+
+            elif opt in ("-e", "--exclude"):
+                excludes.append(arg.strip("/"))
+
+            elif opt in ("-t", "--fstype"):
+                fstype = arg
+
+            elif opt in ("-O", "--features"):
+                features = arg
+
+            elif opt in ("-b", "--block-size"):
+                try:
+                    block_size = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid block size: {arg}")
+
+            elif opt in ("-I", "--inode-size"):
+                try:
+                    inode_size = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid inode size: {arg}")
+
+            elif opt in ("-i", "--inode-ratio"):
+                try:
+                    inode_ratio = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid inode ratio: {arg}")
+
+            elif opt in ("-r", "--reserved"):
+                try:
+                    reserved_pct = float(arg)
+
+                except ValueError:
+                    bail(f"Invalid reserved percentage: {arg}")
+
+            elif opt in ("-f", "--free"):
+                try:
+                    free_mib = int(arg)
+
+                except ValueError:
+                    bail(f"Invalid free space: {arg}")
+
+            elif opt in ("-m", "--margin"):
+                try:
+                    margin_pct = float(arg)
+
+                except ValueError:
+                    bail(f"Invalid margin: {arg}")
+
+            elif opt in ("-j", "--jobs"):
+                try:
+                    jobs = max(1, int(arg))
+
+                except ValueError:
+                    bail(f"Invalid number of jobs: {arg}")
+
+            else:
+                bail(f"Unrecognised argument: {opt}")
+
+    else:
+        bail("Failed to read arguments")
+
+    if not directory:
+        bail("Missing required argument: -d/--directory")
+
+    if fstype not in default_features:
+        bail(f"Unsupported filesystem: '{fstype}'", "Use ext2, ext3 or ext4")
+
+    if block_size not in (1024, 2048, 4096):
+        bail(f"Invalid block size: {block_size}")
+
+    return 0
+
+
+def has_feature(name):
+    """As mke2fs would have it, from the fstype defaults & -O"""
+    enabled = {
+        "ext4": {"extent", "has_journal", "64bit", "metadata_csum", "sparse_super", "resize_inode", "dir_index"},
+        "ext3": {"has_journal", "sparse_super", "resize_inode", "dir_index"},
+        "ext2": {"sparse_super", "resize_inode", "dir_index"}
+        }[fstype]
+
+    for feature in (features or default_features[fstype]).split(","):
+        feature = feature.strip()
+
+        if feature.startswith("^"):
+            enabled.discard(feature[1:])
+
+        elif feature:
+            enabled.add(feature)
+
+    return name in enabled
+
+
+def mapping_blocks(blocks):
+    """Blocks used to map a file's data blocks: extent tree, or (in)direct blocks"""
+    if has_feature("extent"):
+        # Contiguous in a new filesystem: one extent per 128 MiB (4 KiB blocks)
+        extents = math.ceil(blocks / MAX_EXTENT)
+
+        if extents <= INLINE_EXTENTS:
+            return 0
+
+        return math.ceil(extents / ((block_size - 12) // 12))
+
+    per = block_size // 4
+    blocks -= 12
+    used = 0
+
+    if blocks > 0:
+        used += 1
+        blocks -= per
+
+    if blocks > 0:
+        used += 1 + math.ceil(min(blocks, per * per) / per)
+        blocks -= per * per
+
+    if blocks > 0:
+        used += 1 + math.ceil(blocks / (per * per)) + math.ceil(blocks / per)
+
+    return used
+
+
+def file_blocks(size):
+    blocks = math.ceil(size / block_size)
+
+    return blocks + mapping_blocks(blocks)
+
+
+def dir_blocks(entry_bytes):
+    blocks = max(1, math.ceil(entry_bytes / block_size))
+
+    # dir_index: the root block of the hash tree
+    if blocks > 1 and has_feature("dir_index"):
+        blocks += 1
+
+    return blocks + mapping_blocks(blocks)
+
+
+def scan(path, device):
+    """Count one directory (not its sub-directories, which are returned)"""
+    counts = dict.fromkeys(totals, 0)
+    subdirs = []
+    linked = []
+
+    # "." & ".."
+    entry_bytes = 24
+
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                entry_bytes += (8 + len(os.fsencode(entry.name)) + 3) & ~3
+                st = entry.stat(follow_symlinks=False)
+                counts["host"] += st.st_blocks * 512
+
+                if stat.S_ISDIR(st.st_mode):
+                    excluded = os.path.relpath(entry.path, directory) in excludes
+
+                    # Excluded, or another filesystem (e.g. proc): an empty mount point
+                    if excluded or st.st_dev != device:
+                        counts["dirs"] += 1
+                        counts["inodes"] += 1
+                        counts["blocks"] += dir_blocks(24)
+
+                    else:
+                        subdirs.append(entry.path)
+
+                    continue
+
+                if stat.S_ISREG(st.st_mode):
+                    blocks = file_blocks(st.st_size)
+                    counts["bytes"] += st.st_size
+
+                    if st.st_nlink > 1:
+                        linked.append(((st.st_dev, st.st_ino), blocks))
+                        continue
+
+                    counts["files"] += 1
+                    counts["blocks"] += blocks
+
+                elif stat.S_ISLNK(st.st_mode):
+                    counts["symlinks"] += 1
+
+                    # Fast symlink: the target is in the inode
+                    if st.st_size >= 60:
+                        counts["blocks"] += file_blocks(st.st_size)
+
+                else:
+                    counts["other"] += 1
+
+                counts["inodes"] += 1
+
+    except OSError as e:
+        print(f"[i] Skipping: {path} ({e.strerror})", file=sys.stderr)
+
+    # This directory
+    counts["dirs"] += 1
+    counts["inodes"] += 1
+    counts["blocks"] += dir_blocks(entry_bytes)
+
+    with lock:
+        for key, blocks in linked:
+            if key in seen:
+                counts["hardlinks"] += 1
+                continue
+
+            seen.add(key)
+            counts["files"] += 1
+            counts["inodes"] += 1
+            counts["blocks"] += blocks
+
+        for key in totals:
+            totals[key] += counts[key]
+
+    return subdirs
+
+
+def walk():
+    device = os.lstat(directory).st_dev
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = {pool.submit(scan, directory, device)}
+
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                for path in future.result():
+                    pending.add(pool.submit(scan, path, device))
+
+
+def layout(blocks_count):
+    """Blocks mke2fs uses itself on a filesystem of blocks_count blocks, and its inode count"""
+    blocks_per_group = block_size * 8
+    groups = math.ceil(blocks_count / blocks_per_group)
+    desc_size = 64 if has_feature("64bit") else 32
+    desc_per_block = block_size // desc_size
+
+    # Inodes: from the ratio, rounded up to fill whole inode table blocks in each group
+    inodes_per_group = math.ceil(blocks_count * block_size / inode_ratio / groups)
+    inodes_per_block = block_size // inode_size
+    inodes_per_group = min(math.ceil(inodes_per_group / inodes_per_block) * inodes_per_block, blocks_per_group)
+    inodes = inodes_per_group * groups
+
+    # Superblock & group descriptors, in group 0, 1 and the powers of 3, 5 & 7 (sparse_super)
+    backups = 0
+
+    for group in range(groups):
+        if group <= 1 or not has_feature("sparse_super") or any(is_power(group, base) for base in (3, 5, 7)):
+            backups += 1
+
+    desc_blocks = math.ceil(groups / desc_per_block)
+
+    # resize_inode: room for the descriptors of a filesystem 1024 times bigger
+    reserved_gdt = 0
+
+    if has_feature("resize_inode"):
+        max_groups = math.ceil(min(blocks_count * 1024, 2 ** 32) / blocks_per_group)
+        reserved_gdt = min(max(math.ceil(max_groups / desc_per_block) - desc_blocks, 0), block_size // 4)
+
+    overhead = backups * (1 + desc_blocks + reserved_gdt)
+    overhead += groups * 2
+    overhead += groups * inodes_per_group * inode_size // block_size
+    overhead += journal_blocks(blocks_count)
+
+    if block_size == 1024:
+        # The boot block
+        overhead += 1
+
+    return overhead, inodes
+
+
+def is_power(n, base):
+    while n > 1 and n % base == 0:
+        n //= base
+
+    return n == 1
+
+
+def journal_blocks(blocks_count):
+    """ext2fs_default_journal_size()"""
+    if not has_feature("has_journal") or blocks_count < 2048:
+        return 0
+
+    for limit, size in ((32768, 1024), (256 * 1024, 4096), (512 * 1024, 8192), (4096 * 1024, 16384),
+                        (8192 * 1024, 32768), (16384 * 1024, 65536), (32768 * 1024, 131072)):
+        if blocks_count < limit:
+            return size
+
+    return 262144
+
+
+def smallest(needed_blocks, needed_inodes):
+    """Smallest block count which fits needed_blocks (besides its own overhead & reserved) and needed_inodes"""
+    blocks_count = needed_blocks
+
+    # The overhead only grows with the size, a few rounds settle it
+    for _ in range(100):
+        overhead, inodes = layout(blocks_count)
+        reserved = math.ceil(blocks_count * reserved_pct / 100)
+        want = needed_blocks + overhead + reserved
+
+        if inodes < needed_inodes:
+            want = max(want, math.ceil(needed_inodes * inode_ratio / block_size))
+
+        if want <= blocks_count:
+            break
+
+        blocks_count = want
+
+    return blocks_count
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isdir(directory):
+        bail(f"Missing: '{directory}'")
+
+    walk()
+
+    used_blocks = totals["blocks"] + LOST_FOUND // block_size
+    used_inodes = totals["inodes"] + RESERVED_INODES
+
+    needed_blocks = math.ceil(used_blocks * (1 + margin_pct / 100)) + free_mib * 1024 ** 2 // block_size
+    needed_inodes = math.ceil(used_inodes * (1 + margin_pct / 100))
+
+    blocks_count = max(smallest(needed_blocks, needed_inodes), SMALLEST // block_size)
+    overhead, inodes = layout(blocks_count)
+
+    # Whole MiB
+    size_kib = math.ceil(blocks_count * block_size / 1024 ** 2) * 1024
+
+    mib = 1024 ** 2
+    print(f"[i] {directory} ({fstype}, {block_size} byte blocks, features: {features or default_features[fstype]})", file=sys.stderr)
+    print(f"  - Files\t\t: {totals['files']} ({totals['hardlinks']} extra hardlinks), {totals['dirs']} directories, {totals['symlinks']} symlinks, {totals['other']} other", file=sys.stderr)
+    print(f"  - Size (files)\t: {totals['bytes'] / mib:.0f} MiB (host: {totals['host'] / mib:.0f} MiB)", file=sys.stderr)
+    print(f"  - Size (filesystem)\t: {used_blocks * block_size / mib:.0f} MiB, {used_inodes} inodes", file=sys.stderr)
+    print(f"  - Margin & free\t: {margin_pct:g}% & {free_mib} MiB", file=sys.stderr)
+    print(f"  - Overhead\t\t: {overhead * block_size / mib:.0f} MiB (+ {reserved_pct:g}% reserved), {inodes} inodes", file=sys.stderr)
+    print(f"  - Root filesystem\t: {size_kib // 1024} MiB", file=sys.stderr)
+
+    print(size_kib)
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
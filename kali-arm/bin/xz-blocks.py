@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+
+# ARM Devices ~ https://gitlab.com/kalilinux/build-scripts/kali-arm/-/blob/main/devices.yml
+
+###############################################
+# Script to create and read seekable (multi-block) xz images.
+#
+# Compress: the image is cut into fixed size blocks, which are compressed in
+# parallel and written as independent xz blocks of ONE stream, with the sizes
+# in every block header and a complete index. The output is a normal .xz file
+# (xz, pixz, unxz, rpi-imager, ...) and is the same whichever host builds it.
+#
+# Read: the index is read from the end of the file, so only the blocks covering
+# the wanted byte range are decoded, in parallel across cores:
+# - decompress / verify: every block (verify also checks the SHA-256 from the
+#   .img.xz.sha256sum or .img.sha256sum file, if given)
+# - extract: a byte range, or one partition (from the MBR/GPT in the first block)
+# - info: the blocks & partitions
+# Any xz file can be read (e.g. made by pixz or xz -T), but only files with more
+# than one block can be decoded in parallel.
+#
+# Dependencies:
+# sudo apt -y install python3
+#
+# Usage:
+# ./bin/xz-blocks.py -m compress -f <image> [-o <output>] [-b <block size MiB>] [-l <level>] [-j <jobs>]
+# ./bin/xz-blocks.py -m decompress -f <image.xz> -o <output> [-j <jobs>]
+# ./bin/xz-blocks.py -m extract -f <image.xz> -o <output> (-p <partition> | -O <offset> -L <length>) [-j <jobs>]
+# ./bin/xz-blocks.py -m verify -f <image.xz> [-x <sha256 or .sha256sum file>] [-j <jobs>]
+# ./bin/xz-blocks.py -m info -f <image.xz>
+#
+# E.g.:
+# ./bin/xz-blocks.py -m compress -f images/kali-linux-2022.3-raspberry-pi-arm64.img -b 16 -l 6
+# ./bin/xz-blocks.py -m extract -f kali-linux-2022.3-raspberry-pi-arm64.img.xz -p 1 -o boot.vfat
+
+import getopt
+import hashlib
+import lzma
+import os
+import stat
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+mode = ""
+
+inputfile = ""
+
+outputfile = ""
+
+blocksize = 16 * 1024 ** 2
+
+level = 6
+
+jobs = os.cpu_count() or 1
+
+partition = 0
+
+offset = -1
+
+length = -1
+
+expected_sha256 = ""
+
+modes = ("compress", "decompress", "extract", "verify", "info")
+
+HEADER_MAGIC = b"\xfd7zXZ\x00"
+
+FOOTER_MAGIC = b"YZ"
+
+# Stream flags: check type CRC32
+CHECK_CRC32 = 0x01
+
+# Size of the check field, by check type
+CHECK_SIZES = {0x00: 0, 0x01: 4, 0x04: 8, 0x0a: 32}
+
+FILTER_LZMA2 = 0x21
+
+# Filter IDs in block headers, to the lzma module's
+FILTER_IDS = {
+    0x03: lzma.FILTER_DELTA,
+    0x04: lzma.FILTER_X86,
+    0x05: lzma.FILTER_POWERPC,
+    0x06: lzma.FILTER_IA64,
+    0x07: lzma.FILTER_ARM,
+    0x08: lzma.FILTER_ARMTHUMB,
+    0x09: lzma.FILTER_SPARC,
+    0x21: lzma.FILTER_LZMA2
+    }
+
+# LZMA2 dictionary size of the xz presets 0-9
+PRESET_DICT_SIZES = [2 ** 18, 2 ** 20, 2 ** 21, 2 ** 22, 2 ** 22, 2 ** 23, 2 ** 23, 2 ** 24, 2 ** 25, 2 ** 26]
+
+
+def bail(message="", strerror=""):
+    outstr = ""
+
+    prog = sys.argv[0]
+
+    if message != "":
+        outstr = f"\nError: {message}"
+
+    if strerror != "":
+        outstr += f"\nMessage: {strerror}\n"
+
+    else:
+        outstr += f"\n\nUsage: {prog} -m <{'|'.join(modes)}> -f <file> [options] (see the top of {prog})"
+        outstr += f"\nE.g. : {prog} -m compress -f images/kali-linux-2022.3-raspberry-pi-arm64.img\n"
+
+    print(outstr)
+
+    sys.exit(2)
+
+
+def getargs(argv):
+    global mode, inputfile, outputfile, blocksize, level, jobs, partition, offset, length, expected_sha256
+
+    try:
+        opts, args = getopt.getopt(
+            argv,
+            "hm:f:o:b:l:j:p:O:L:x:",
+            [
+                "mode=",
+                "file=",
+                "output=",
+                "blocksize=",
+                "level=",
+                "jobs=",
+                "partition=",
+                "offset=",
+                "length=",
+                "sha256="
+            ]
+        )
+
+    except getopt.GetoptError as e:
+        bail(f"Incorrect arguments: {e}")
+
+    if opts:
+        try:
+            for opt, arg in opts:
+                if opt == "-h":
+                    bail()
+
+                elif opt in ("-m", "--mode"):
+                    mode = arg
+
+                elif opt in ("-f", "--file"):
+                    inputfile = arg
+
+                elif opt in ("-o", "--output"):
+                    outputfile = arg
+
+                elif opt in ("-b", "--blocksize"):
+                    blocksize = int(float(arg) * 1024 ** 2)
+
+                elif opt in ("-l", "--level"):
+                    level = int(arg)
+
+                elif opt in ("-j", "--jobs"):
+                    jobs = max(1, int(arg))
+
+                elif opt in ("-p", "--partition"):
+                    partition = int(arg)
+
+                elif opt in ("-O", "--offset"):
+                    offset = int(arg)
+
+                elif opt in ("-L", "--length"):
+                    length = int(arg)
+
+                elif opt in ("-x", "--sha256"):
+                    expected_sha256 = arg
+
+                else:
+                    bail(f"Unrecognised argument: {opt}")
+
+        except ValueError:
+            bail(f"Invalid value for: {opt} ({arg})")
+
+    else:
+        bail("Failed to read arguments")
+
+    if mode not in modes:
+        bail(f"Unknown mode: '{mode}'")
+
+    if not inputfile:
+        bail("Missing required argument: -f/--file")
+
+    if mode in ("decompress", "extract") and not outputfile:
+        bail("Missing required argument: -o/--output")
+
+    if mode == "extract" and not partition and (offset < 0 or length < 0):
+        bail("Missing required argument: -p/--partition or -O/--offset and -L/--length")
+
+    if not 0 <= level <= 9:
+        bail(f"Level must be between 0 and 9: {level}")
+
+    if blocksize < 1024 ** 2:
+        bail("Block size must be at least 1 MiB")
+
+    return 0
+
+
+def varint(value):
+    out = bytearray()
+
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+
+    out.append(value)
+
+    return bytes(out)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+
+        if not byte & 0x80:
+            return value, pos
+
+
+def crc32(data):
+    return struct.pack("<I", zlib.crc32(data))
+
+
+def pad4(size):
+    return -size % 4
+
+
+def dict_size_byte(size):
+    """LZMA2 filter property: smallest encoded dictionary size >= size"""
+    for byte in range(40):
+        if (2 | (byte & 1)) << (byte // 2 + 11) >= size:
+            return byte
+
+    return 40
+
+
+def dict_size_value(byte):
+    if byte == 40:
+        return 0xffffffff
+
+    return (2 | (byte & 1)) << (byte // 2 + 11)
+
+
+def compress_block(args):
+    """One complete xz block (header, data, padding, check) for one range of the image"""
+    file, start, size, preset = args
+
+    with open(file, "rb") as f:
+        data = os.pread(f.fileno(), size, start)
+
+    # No point in a dictionary bigger than the block (or than the preset's)
+    prop = dict_size_byte(min(max(4096, len(data)), PRESET_DICT_SIZES[preset]))
+
+    compressor = lzma.LZMACompressor(format=lzma.FORMAT_RAW, filters=[
+        {"id": lzma.FILTER_LZMA2, "preset": preset, "dict_size": dict_size_value(prop)}
+        ])
+    compressed = compressor.compress(data) + compressor.flush()
+
+    # Block flags: 1 filter, compressed & uncompressed sizes present
+    header = bytes([0xc0]) + varint(len(compressed)) + varint(len(data))
+    header += varint(FILTER_LZMA2) + varint(1) + bytes([prop])
+    header_size = 1 + len(header) + 4
+    header_size += pad4(header_size)
+    header = bytes([header_size // 4 - 1]) + header
+    header += b"\0" * (header_size - 4 - len(header))
+    header += crc32(header)
+
+    block = header + compressed + b"\0" * pad4(len(compressed)) + crc32(data)
+
+    return block, len(header) + len(compressed) + 4, len(data)
+
+
+def compress():
+    output = outputfile or f"{inputfile}.xz"
+    size = os.path.getsize(inputfile)
+    records = []
+    pending = []
+
+    stream_flags = bytes([0, CHECK_CRC32])
+
+    with open(f"{output}.tmp", "wb") as f, ProcessPoolExecutor(max_workers=jobs) as pool:
+        f.write(HEADER_MAGIC + stream_flags + crc32(stream_flags))
+
+        def write(future):
+            block, unpadded, uncompressed = future.result()
+            f.write(block)
+            records.append((unpadded, uncompressed))
+
+        for start in range(0, size, blocksize):
+            pending.append(pool.submit(compress_block, (inputfile, start, min(blocksize, size - start), level)))
+
+            # Keep a bounded number of blocks in flight
+            while len(pending) > jobs * 2:
+                write(pending.pop(0))
+
+        for future in pending:
+            write(future)
+
+        # Index: indicator, number of records, records, padding, CRC32
+        index = b"\0" + varint(len(records))
+
+        for unpadded, uncompressed in records:
+            index += varint(unpadded) + varint(uncompressed)
+
+        index += b"\0" * pad4(len(index))
+        index += crc32(index)
+        f.write(index)
+
+        footer = struct.pack("<I", len(index) // 4 - 1) + stream_flags
+        f.write(crc32(footer) + footer + FOOTER_MAGIC)
+
+    os.replace(f"{output}.tmp", output)
+
+    return output, len(records)
+
+
+def read_blocks(file):
+    """(compressed offset, uncompressed offset, uncompressed size, check type) of every block, from the index(es)"""
+    blocks = []
+
+    with open(file, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+
+        # Streams are read backwards, skipping stream padding
+        while end > 0:
+            f.seek(end - 4)
+
+            if f.read(4) == b"\0\0\0\0":
+                end -= 4
+                continue
+
+            f.seek(end - 12)
+            footer = f.read(12)
+
+            if footer[10:12] != FOOTER_MAGIC:
+                bail(f"Not an xz file (or truncated): {file}")
+
+            backward_size = (struct.unpack("<I", footer[4:8])[0] + 1) * 4
+            check = footer[9] & 0x0f
+            index_start = end - 12 - backward_size
+            f.seek(index_start)
+            index = f.read(backward_size)
+
+            if index[0] != 0 or crc32(index[:-4]) != index[-4:]:
+                bail(f"Corrupt xz index: {file}")
+
+            count, pos = read_varint(index, 1)
+            records = []
+
+            for _ in range(count):
+                unpadded, pos = read_varint(index, pos)
+                uncompressed, pos = read_varint(index, pos)
+                records.append((unpadded, uncompressed))
+
+            stream_start = index_start - sum(u + pad4(u) for u, _ in records) - 12
+            f.seek(stream_start)
+
+            if f.read(6) != HEADER_MAGIC:
+                bail(f"Corrupt xz stream: {file}")
+
+            stream = []
+            pos = stream_start + 12
+
+            for unpadded, uncompressed in records:
+                stream.append([pos, 0, uncompressed, check, unpadded])
+                pos += unpadded + pad4(unpadded)
+
+            blocks = stream + blocks
+            end = stream_start
+
+    total = 0
+
+    for block in blocks:
+        block[1] = total
+        total += block[2]
+
+    return blocks
+
+
+def decode_block(args):
+    """Decode one block, optionally only [skip, skip + size) of it"""
+    file, position, uncompressed, check, unpadded, skip, size = args
+
+    with open(file, "rb") as f:
+        data = os.pread(f.fileno(), unpadded + pad4(unpadded) + CHECK_SIZES.get(check, 0), position)
+
+    header_size = (data[0] + 1) * 4
+    header = data[:header_size]
+
+    if crc32(header[:-4]) != header[-4:]:
+        raise ValueError(f"Corrupt block header at {position}")
+
+    flags = header[1]
+    pos = 2
+
+    if flags & 0x40:
+        _, pos = read_varint(header, pos)
+
+    if flags & 0x80:
+        _, pos = read_varint(header, pos)
+
+    filters = []
+
+    for _ in range((flags & 0x03) + 1):
+        filter_id, pos = read_varint(header, pos)
+        props_size, pos = read_varint(header, pos)
+        props = header[pos:pos + props_size]
+        pos += props_size
+
+        if filter_id not in FILTER_IDS:
+            raise ValueError(f"Unsupported filter {filter_id:#x} in block at {position}")
+
+        if filter_id == FILTER_LZMA2:
+            filters.append({"id": lzma.FILTER_LZMA2, "dict_size": dict_size_value(props[0])})
+
+        elif filter_id == 0x03:
+            filters.append({"id": lzma.FILTER_DELTA, "dist": props[0] + 1})
+
+        else:
+            filters.append({"id": FILTER_IDS[filter_id], "start_offset": struct.unpack("<I", props)[0] if props else 0})
+
+    check_size = CHECK_SIZES.get(check, 0)
+    compressed = data[header_size:unpadded - check_size]
+    decoded = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=filters).decompress(compressed)
+
+    if len(decoded) != uncompressed:
+        raise ValueError(f"Block at {position}: {len(decoded)} bytes, index says {uncompressed}")
+
+    # The check follows the block padding
+    stored = data[header_size + len(compressed) + pad4(len(compressed)):][:check_size]
+
+    if check == 0x01:
+        if crc32(decoded) != stored:
+            raise ValueError(f"CRC32 mismatch in block at {position}")
+
+    elif check == 0x0a:
+        if hashlib.sha256(decoded).digest() != stored:
+            raise ValueError(f"SHA-256 mismatch in block at {position}")
+
+    return decoded[skip:skip + size]
+
+
+def decode_range(file, blocks, start, size, pool):
+    """Yield the data of [start, start + size), decoding the blocks in parallel, in order"""
+    pending = []
+
+    for position, block_start, uncompressed, check, unpadded in blocks:
+        if block_start + uncompressed <= start or block_start >= start + size:
+            continue
+
+        skip = max(0, start - block_start)
+        want = min(block_start + uncompressed, start + size) - block_start - skip
+        pending.append(pool.submit(decode_block, (file, position, uncompressed, check, unpadded, skip, want)))
+
+        while len(pending) > jobs * 2:
+            yield pending.pop(0).result()
+
+    for future in pending:
+        yield future.result()
+
+
+def partition_range(file, blocks, pool):
+    """Byte range of a partition, from the MBR or GPT"""
+    table = b"".join(decode_range(file, blocks, 0, 34 * 512, pool))
+
+    if table[510:512] != b"\x55\xaa":
+        bail(f"No partition table found in: {file}")
+
+    if table[512:520] == b"EFI PART":
+        entries_lba, count, entry_size = struct.unpack_from("<QII", table, 512 + 72)
+        entries = b"".join(decode_range(file, blocks, entries_lba * 512, count * entry_size, pool))
+        parts = []
+
+        for i in range(count):
+            first, last = struct.unpack_from("<QQ", entries, i * entry_size + 32)
+
+            if first:
+                parts.append((first * 512, (last - first + 1) * 512))
+
+    else:
+        parts = []
+
+        for i in range(4):
+            ptype = table[446 + i * 16 + 4]
+            first, sectors = struct.unpack_from("<II", table, 446 + i * 16 + 8)
+
+            if ptype:
+                parts.append((first * 512, sectors * 512))
+
+    return parts
+
+
+def is_file(path):
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+
+    except FileNotFoundError:
+        return True
+
+
+def write_range(file, blocks, start, size, output):
+    sha256 = hashlib.sha256()
+    written = 0
+
+    # Zeros are skipped (left as holes) in regular files, block devices get everything
+    sparse = is_file(output)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool, open(output, "wb" if sparse else "r+b") as f:
+        for data in decode_range(file, blocks, start, size, pool):
+            sha256.update(data)
+
+            if sparse and data.count(0) != len(data):
+                f.write(data)
+
+            elif sparse:
+                f.seek(len(data), os.SEEK_CUR)
+
+            else:
+                f.write(data)
+
+            written += len(data)
+
+        if sparse:
+            f.truncate(written)
+
+    return written, sha256.hexdigest()
+
+
+def read_expected(value):
+    if os.path.isfile(value):
+        with open(value) as f:
+            return f.read().split()[0]
+
+    return value
+
+
+def info(blocks):
+    total = sum(b[2] for b in blocks)
+    compressed = os.path.getsize(inputfile)
+
+    print(f"File\t\t: {inputfile}")
+    print(f"Blocks\t\t: {len(blocks)}" + (" (cannot be decoded in parallel)" if len(blocks) == 1 else ""))
+    print(f"Uncompressed\t: {total / 1024 ** 2:.1f} MiB")
+    print(f"Compressed\t: {compressed / 1024 ** 2:.1f} MiB ({compressed / total * 100 if total else 0:.1f}%)")
+
+    if blocks:
+        print(f"Block size\t: {max(b[2] for b in blocks) / 1024 ** 2:.1f} MiB")
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        try:
+            parts = partition_range(inputfile, blocks, pool)
+
+        except SystemExit:
+            return
+
+    for num, (start, size) in enumerate(parts, start=1):
+        first = next(i for i, b in enumerate(blocks) if b[1] + b[2] > start)
+        last = next(i for i, b in enumerate(blocks) if b[1] + b[2] >= start + size)
+        print(f"Partition {num}\t: {start} + {size / 1024 ** 2:.1f} MiB (blocks {first}-{last})")
+
+
+def main(argv):
+    # Parse command-line arguments
+    if len(sys.argv) > 1:
+        getargs(argv)
+
+    else:
+        bail("Missing arguments")
+
+    if not os.path.isfile(inputfile):
+        bail(f"Missing: '{inputfile}'")
+
+    begin = time.monotonic()
+
+    if mode == "compress":
+        output, qty = compress()
+        print(f"[+] {output} ({qty} blocks of {blocksize / 1024 ** 2:g} MiB, level {level})")
+
+    else:
+        blocks = read_blocks(inputfile)
+        total = sum(b[2] for b in blocks)
+
+        try:
+            if mode == "info":
+                info(blocks)
+
+            elif mode == "decompress":
+                written, digest = write_range(inputfile, blocks, 0, total, outputfile)
+                print(f"[+] {outputfile} ({written} bytes, sha256 {digest})")
+
+            elif mode == "extract":
+                start, size = offset, length
+
+                if partition:
+                    with ProcessPoolExecutor(max_workers=jobs) as pool:
+                        parts = partition_range(inputfile, blocks, pool)
+
+                    if not 0 < partition <= len(parts):
+                        bail(f"No partition {partition} in: {inputfile} ({len(parts)} partitions)")
+
+                    start, size = parts[partition - 1]
+
+                if start + size > total:
+                    bail(f"Range {start} + {size} is past the end of the image ({total} bytes)")
+
+                written, digest = write_range(inputfile, blocks, start, size, outputfile)
+                print(f"[+] {outputfile} ({written} bytes from offset {start}, sha256 {digest})")
+
+            elif mode == "verify":
+                written, digest = write_range(inputfile, blocks, 0, total, os.devnull)
+
+                if expected_sha256 and digest != read_expected(expected_sha256):
+                    bail(f"SHA-256 mismatch: {digest}", f"Expected: {read_expected(expected_sha256)}")
+
+                print(f"[+] {inputfile}: OK ({written} bytes, sha256 {digest})")
+
+        except (ValueError, lzma.LZMAError) as e:
+            bail(f"Cannot decode: {inputfile}", str(e))
+
+    print(f"\nTime\t\t: {time.monotonic() - begin:.1f}s ({jobs} jobs)")
+
+    exit(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -250,8 +250,11 @@ EOF
 # DNS server
 echo "nameserver ${nameserver}" >"${work_dir}"/etc/resolv.conf
 
-# Copy directory bsp into build dir
-cp -rp bsp ${work_dir}
+# Copy directory bsp into build dir, with the firmware from the blob store
+# rather than the store itself (as copy_bsp() in ./common.d/functions.sh)
+mkdir -p "${work_dir}/bsp"
+find bsp -mindepth 1 -maxdepth 1 ! -name blobs -exec cp -rp {} "${work_dir}/bsp/" \;
+python3 ./bin/blob-store.py -m materialise -s bsp -d "${work_dir}/bsp"
 
 export MALLOC_CHECK_=0 # workaround for LP: #520465
 
@@ -607,18 +610,19 @@ EOF
 mkdir -p ${work_dir}/etc/X11/xorg.conf.d
 cp ${base_dir}/../bsp/xorg/10-synaptics-chromebook.conf ${work_dir}/etc/X11/xorg.conf.d/
 
-# Copy the broadcom firmware files in
+# Copy the broadcom firmware files in (materialised from the blob store, see ./bin/blob-store.py)
+python3 ${base_dir}/../bin/blob-store.py -m materialise -s ${base_dir}/../bsp -d ${base_dir}/bsp -n veyron
 mkdir -p ${work_dir}/lib/firmware/brcm/
-cp ${base_dir}/../bsp/firmware/veyron/brcm* ${work_dir}/lib/firmware/brcm/
-cp ${base_dir}/../bsp/firmware/veyron/BCM* ${work_dir}/lib/firmware/brcm/
+cp ${base_dir}/bsp/firmware/veyron/brcm* ${work_dir}/lib/firmware/brcm/
+cp ${base_dir}/bsp/firmware/veyron/BCM* ${work_dir}/lib/firmware/brcm/
 
 # Copy in the touchpad firmwares - same as above
-cp ${base_dir}/../bsp/firmware/veyron/elan* ${work_dir}/lib/firmware/
-cp ${base_dir}/../bsp/firmware/veyron/max* ${work_dir}/lib/firmware/
+cp ${base_dir}/bsp/firmware/veyron/elan* ${work_dir}/lib/firmware/
+cp ${base_dir}/bsp/firmware/veyron/max* ${work_dir}/lib/firmware/
 cd ${base_dir}
 
 # We need to kick start the sdio chip to get bluetooth/wifi going
-cp ${base_dir}/../bsp/firmware/veyron/brcm_patchram_plus ${work_dir}/usr/sbin/
+cp ${base_dir}/bsp/firmware/veyron/brcm_patchram_plus ${work_dir}/usr/sbin/
 
 # Calculate the space to create the image
 root_size=$(du -s -B1 ${work_dir} --exclude=${work_dir}/boot | cut -f1)
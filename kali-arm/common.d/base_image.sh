@@ -28,6 +28,9 @@ trap clean_build EXIT
 # Checks script environment
 source ./common.d/check.sh
 
+# Run the build in its own cgroup, if enabled (from ./common.d/functions.sh)
+governor_start
+
 # Packages build list
 include packages
 
@@ -37,6 +40,9 @@ debootstrap_exec ${mirror}
 # Define sources.list
 sources_list
 
+# Stub the architecture independent steps, run with the host's tools later (from ./common.d/functions.sh)
+native_steps_divert
+
 # APT options
 include apt_options
 
@@ -46,7 +52,7 @@ echo "RESUME=none" >"${work_dir}/etc/initramfs-tools/conf.d/resume"
 
 # Copy directory bsp into build dir
 status "Copy directory bsp into build dir"
-cp -rp bsp "${work_dir}"
+copy_bsp
 
 # Third stage
 cat <<EOF >"${work_dir}/third-stage"
@@ -142,6 +148,7 @@ systemctl enable rpi-resizerootfs
 
 status_stage3 'Enable runonce script'
 install -m755 /bsp/scripts/runonce /usr/sbin/
+install -m755 /bsp/scripts/firstboot-caches /usr/sbin/
 cp -rf /bsp/runonce.d /etc
 systemctl enable runonce
 
@@ -123,11 +123,12 @@ dpkg --get-selections >${backup_packages}
 
 compilers="crossbuild-essential-arm64 crossbuild-essential-armhf crossbuild-essential-armel gcc-arm-none-eabi"
 
-dependencies="arch-test autoconf automake bc bison build-essential cgpt cgroup-tools cmake curl dbus \
-debootstrap device-tree-compiler dosfstools e2fsprogs eatmydata flex gawk git gnupg kpartx           \
-libncurses-dev lsb-release libssl-dev lsof lzma lzop m4 make mmdebstrap parted pixz pkg-config       \
-python3-dev qemu-user-static rsync swig systemd-container u-boot-tools vboot-kernel-utils vboot-utils \
-libgnutls28-dev uuid-dev"
+dependencies="arch-test autoconf automake bc bison build-essential ccache cgpt cgroup-tools cmake curl dbus \
+debootstrap device-tree-compiler dosfstools e2fsprogs eatmydata flex fontconfig gawk git gnupg         \
+gtk-update-icon-cache kpartx libglib2.0-bin libncurses-dev lsb-release libssl-dev lsof lzma lzop m4  \
+make mmdebstrap mtools parted pixz pkg-config python3-dev qemu-user-static rsync              \
+shared-mime-info swig systemd-container u-boot-tools vboot-kernel-utils vboot-utils                   \
+libgnutls28-dev uuid-dev zstd"
 deps="${dependencies} ${compilers}"
 
 # Update list deb packages
@@ -10,11 +10,19 @@ fi
 
 status "clean system"
 
+# Nothing newer than SOURCE_DATE_EPOCH before the caches are made, the font cache has the mtimes of the font directories (from ./common.d/functions.sh)
+clamp_mtimes
+
+# Font, mime, schema & icon caches and locales, with the host's tools if possible (from ./common.d/functions.sh)
+native_steps
+
+# Record (and verify) the caches first boot would rebuild, so it can skip them (from ./common.d/functions.sh)
+firstboot_caches
+
 # Clean system
 chroot_exec <<'EOF'
 rm -f /0
 rm -rf /bsp
-command fc-cache && fc-cache -frs
 rm -rf /tmp/*
 rm -rf /etc/*-
 rm -rf /hs_err*
@@ -53,3 +61,6 @@ rm -f "${work_dir}"/var/lib/dbus/machine-id || true
 
 # Define DNS server after last running systemd-nspawn
 echo "nameserver ${nameserver}" >"${work_dir}"/etc/resolv.conf
+
+# Logs, caches & dates which differ between builds, when deterministic="yes" (from ./common.d/functions.sh)
+deterministic_rootfs
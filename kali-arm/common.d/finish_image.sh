@@ -9,33 +9,55 @@ set -e
 # Make sure we are somewhere we are not going to unmount
 cd "${repo_dir}/"
 
-# Flush buffers and bytes - this is nicked from the Devuan arm-sdk
-blockdev --flushbufs "${loopdevice}"
-python3 -c 'import os; os.fsync(open("'${loopdevice}'", "r+b"))'
+# Build-scripts which do not support the rootless backend will have set up a loop device
+if [ "${image_backend}" = "rootless" ] && [ -z "${loopdevice}" ]; then
+  # Filesystems are created (and checked) straight from work_dir, no loop devices or mounts
+  assemble_image
 
-# Unmount filesystem
-umount_partitions
+else
+  # Flush buffers and bytes - this is nicked from the Devuan arm-sdk
+  blockdev --flushbufs "${loopdevice}"
+  python3 -c 'import os; os.fsync(open("'${loopdevice}'", "r+b"))'
 
-# Check filesystem
-status "Check filesystem partitions ($rootfstype)"
-if [ -n "${bootp}" ] && [ "${extra}" = 1 ]; then
-  log "Check filesystem boot partition:${colour_reset} (${bootfstype})" green
+  # Unmount filesystem
+  umount_partitions
 
-  if [ "$bootfstype" = "vfat" ]; then
-    dosfsck -w -r -a -t "${bootp}"
+  # Check filesystem
+  status "Check filesystem partitions ($rootfstype)"
+  if [ -n "${bootp}" ] && [ "${extra}" = 1 ]; then
+    log "Check filesystem boot partition:${colour_reset} (${bootfstype})" green
 
-  else
-    e2fsck -y -f "${bootp}"
+    if [ "$bootfstype" = "vfat" ]; then
+      dosfsck -w -r -a -t "${bootp}"
 
+    else
+      e2fsck -y -f "${bootp}"
+
+    fi
   fi
+
+  log "Check filesystem root partition:${colour_reset} ($rootfstype)" green
+  e2fsck -y -f "${rootp}"
+
+  # Remove loop devices
+  status "Remove loop devices"
+  losetup -d "${loopdevice}"
+
 fi
 
-log "Check filesystem root partition:${colour_reset} ($rootfstype)" green
-e2fsck -y -f "${rootp}"
+# Timestamps of the ext2/3/4 partitions (inode ctimes, superblock) after SOURCE_DATE_EPOCH
+if [ "${deterministic}" = "yes" ]; then
+  status "Clamp filesystem timestamps"
+  python3 "${repo_dir}/bin/reproducible.py" -m clamp -f "${image_dir}/${image_name}.img" -t "${SOURCE_DATE_EPOCH}"
 
-# Remove loop devices
-status "Remove loop devices"
-losetup -d "${loopdevice}"
+fi
+
+# Punch holes over the free blocks of the ext2/3/4 partitions (zeros, so they compress to nothing)
+if [ "${punch_holes}" = "yes" ]; then
+  status "Punch holes over free blocks"
+  python3 "${repo_dir}/bin/punch-holes.py" -f "${image_dir}/${image_name}.img"
+
+fi
 
 # Create sha256sum file of the UNCOMPRESSED image file
 log "Generate sha256sum: ${colour_reset}($img)" green
@@ -48,11 +70,11 @@ cd "${repo_dir}"
 compress_img
 
 # Create sha256sum file of the COMPRESSED image file
-if [ -f "${image_dir}/${image_name}.img.$compress" ]; then
-  log "Generate sha256sum: ${colour_reset}($img.$compress)" green
+if [ "$img" != "${image_dir}/${image_name}.img" ] && [ -f "$img" ]; then
+  log "Generate sha256sum: ${colour_reset}($img)" green
 
   cd "${image_dir}"
-  shasum -a 256 "${image_name}.img.$compress" >"${image_name}.img.$compress.sha256sum"
+  shasum -a 256 "$(basename "$img")" >"$(basename "$img").sha256sum"
   cd "${repo_dir}"
 
 fi
@@ -221,6 +221,12 @@ function chroot_exec() {
     # Ensure /proc is mounted inside chroot
     mount --types proc /proc "${work_dir}/proc"
 
+    # Offline builds install from the package cache, see debootstrap_exec()
+    if [ "${deb_cache_offline}" = "yes" ]; then
+        mkdir -p "${work_dir}/srv/deb-cache"
+        mount --bind -o ro "${deb_cache_dir}" "${work_dir}/srv/deb-cache"
+    fi
+
     # Determine whether to use QEMU (only if we're cross-emulating ARM64)
     if [ "$(arch)" != "aarch64" ] && [ "${architecture}" == "arm64" ]; then
         USE_QEMU="$qemu_bin"
@@ -237,21 +243,128 @@ function chroot_exec() {
 
     # Cleanup: Unmount /proc
     umount -lf "${work_dir}/proc"
+
+    if mountpoint -q "${work_dir}/srv/deb-cache"; then
+        umount -lf "${work_dir}/srv/deb-cache"
+        rmdir "${work_dir}/srv/deb-cache"
+    fi
 }
 
 # Create the rootfs - not much to modify here, except maybe throw in some more packages if you want.
 function debootstrap_exec() {
     status "debootstrap ${suite} $*"
 
+    local cache_hooks=()
+    local debootstrap_opts=()
+
+    # Shared package cache (deb_cache="yes"), see ./bin/deb-cache.py
+    # Seed it before mmdebstrap downloads the packages, and collect them before they are removed
+    if [ "${deb_cache}" = "yes" ]; then
+        cache_hooks=(--skip=download/empty --skip=essential/unlink
+            --setup-hook='mkdir -p "$1"/var/cache/apt/archives'
+            --setup-hook="python3 '${repo_dir}/bin/deb-cache.py' -m seed -C '${deb_cache_dir}' -a '${architecture}' -d \"\$1\"/var/cache/apt/archives"
+            --customize-hook="python3 '${repo_dir}/bin/deb-cache.py' -m collect -C '${deb_cache_dir}' -a '${architecture}' -b '${build_id}' -d \"\$1\"/var/cache/apt/archives")
+    fi
+
+    # Offline build, from a repository made out of the package cache
+    if [ "${deb_cache_offline}" = "yes" ]; then
+        python3 "${repo_dir}/bin/deb-cache.py" -m repo -C "${deb_cache_dir}" -a "${architecture}" -S "${suite}" -c "${components}"
+
+        # debootstrap takes a mirror URL (its Release is not signed), mmdebstrap a sources.list line
+        if [ "$(lsb_release -sc)" == "bullseye" ]; then
+            debootstrap_opts=(--no-check-gpg)
+            set -- "file://${deb_cache_dir}"
+
+        else
+            set -- "deb [trusted=yes] file://${deb_cache_dir} ${suite} ${components//,/ }"
+
+        fi
+    fi
+
     if [ "$(lsb_release -sc)" == "bullseye" ]; then
     eatmydata debootstrap --merged-usr --keyring=/usr/share/keyrings/kali-archive-keyring.gpg --components="${components}" \
-        --include="${debootstrap_base}" --arch "${architecture}" "${suite}" "${work_dir}" "$@"
+        --include="${debootstrap_base}" --arch "${architecture}" "${debootstrap_opts[@]}" "${suite}" "${work_dir}" "$@"
     else
     eatmydata mmdebstrap --keyring=/usr/share/keyrings/kali-archive-keyring.gpg --components="${components}" \
-        --include="${debootstrap_base}" --arch "${architecture}" "${suite}" "${work_dir}" "$@"
+        --include="${debootstrap_base}" --arch "${architecture}" "${suite}" "${work_dir}" "${cache_hooks[@]}" "$@"
+    fi
+}
+
+# Hardlink the cached packages into the rootfs, before the third stage runs apt
+function deb_cache_seed() {
+    [ "${deb_cache}" = "yes" ] || return 0
+
+    python3 "${repo_dir}/bin/deb-cache.py" -m seed -C "${deb_cache_dir}" -a "${architecture}" -d "${work_dir}/var/cache/apt/archives"
+}
+
+# Add the packages downloaded by the third stage to the cache, and record the hits/misses
+function deb_cache_collect() {
+    [ "${deb_cache}" = "yes" ] || [ "${deb_cache_offline}" = "yes" ] || return 0
+
+    if [ -d "${work_dir}/var/cache/apt/deb-cache" ]; then
+        python3 "${repo_dir}/bin/deb-cache.py" -m collect -C "${deb_cache_dir}" -a "${architecture}" -b "${build_id}" -d "${work_dir}/var/cache/apt/deb-cache"
+        rm -rf "${work_dir}/var/cache/apt/deb-cache"
+    fi
+
+    python3 "${repo_dir}/bin/deb-cache.py" -m report -C "${deb_cache_dir}" -r "${work_dir}" -b "${build_id}" -n "${hw_model}-${architecture}"
+
+    if [ -n "${deb_cache_size}" ]; then
+        python3 "${repo_dir}/bin/deb-cache.py" -m prune -C "${deb_cache_dir}" -s "${deb_cache_size}"
     fi
 }
 
+# Clone a kernel tree, from the kernel build cache if enabled (kernel_cache="yes")
+# Usage: kernel_clone <repository> <ref> <destination>
+function kernel_clone() {
+    if [ "${kernel_cache}" = "yes" ]; then
+        python3 "${repo_dir}/bin/kernel-cache.py" -m source -C "${kernel_cache_dir}" -r "$1" -b "$2" -d "$3" >/dev/null
+
+    else
+        git clone --depth 1 -b "$2" "$1" "$3"
+
+    fi
+}
+
+# Use ccache for the kernel build, run from the kernel tree once ARCH/CROSS_COMPILE are set
+# Usage: kernel_cache_start <kernel-configs file or defconfig> [<patch> ...]
+function kernel_cache_start() {
+    [ "${kernel_cache}" = "yes" ] || return 0
+
+    local config="$1"
+    local patches=()
+    local result
+    shift
+
+    for patch in "$@"; do
+        patches+=(-p "$patch")
+    done
+
+    result=$(python3 "${repo_dir}/bin/kernel-cache.py" -m start -C "${kernel_cache_dir}" -d "$(pwd)" \
+        -c "$config" -t "${CROSS_COMPILE}" -n "${hw_model}-${architecture}" "${patches[@]}")
+    kernel_cache_key="${result%% *}"
+
+    # Same paths & timestamps for every board/build, so objects can be shared
+    export CCACHE_DIR="${kernel_cache_dir}/ccache"
+    export CCACHE_BASEDIR="$(pwd)"
+    export CCACHE_NOHASHDIR=1
+    export CCACHE_SLOPPINESS="time_macros,include_file_mtime,include_file_ctime"
+    export KBUILD_BUILD_TIMESTAMP="${KBUILD_BUILD_TIMESTAMP:-$(git log -1 --format=%cd 2>/dev/null || date)}"
+    export KBUILD_BUILD_USER="kali"
+    export KBUILD_BUILD_HOST="kali"
+    kernel_cache_path="${PATH}"
+    export PATH="${result#* }:${PATH}"
+}
+
+# Record the kernel cache hits/misses and stop using ccache
+function kernel_cache_finish() {
+    [ -n "${kernel_cache_key}" ] || return 0
+
+    python3 "${repo_dir}/bin/kernel-cache.py" -m finish -C "${kernel_cache_dir}" -k "${kernel_cache_key}"
+    python3 "${repo_dir}/bin/kernel-cache.py" -m evict -C "${kernel_cache_dir}" -s "${kernel_cache_size}"
+    export PATH="${kernel_cache_path}"
+    unset kernel_cache_key
+}
+
 # Disable the use of http proxy in case it is enabled.
 function disable_proxy() {
     if [ -n "$proxy_url" ]; then
@@ -294,6 +407,8 @@ EOF
 }
 
 # Limit CPU function
+# When the build runs in its own cgroup (cgroup_governor="yes"), it is already limited,
+# else the command gets a cgroup (v2) of its own
 function limit_cpu() {
     if [[ ${cpu_limit:=} -lt "1" ]]; then
         cpu_limit=-1
@@ -305,51 +420,134 @@ function limit_cpu() {
         cpu_limit=100
     fi
 
-    if [[ -z $cpu_limit ]]; then
-        log "CPU limit unset" yellow
-        local cpu_shares=$((num_cores * 1024))
-        local cpu_quota="-1"
-    else
-        log "Limiting CPU (${cpu_limit}%)" yellow
-        local cpu_shares=$((1024 * num_cores * cpu_limit / 100))  # 1024 max value per core
-        local cpu_quota=$((100000 * num_cores * cpu_limit / 100)) # 100000 max value per core
-    fi
-
-    local rand
-    rand=$(
-        tr -cd 'A-Za-z0-9' </dev/urandom | head -c4
-        echo
-    )
-
-    cgcreate -g cpu:/cpulimit-"$rand"
-    cgset -r cpu.shares="$cpu_shares" cpulimit-"$rand"
-    cgset -r cpu.cfs_quota_us="$cpu_quota" cpulimit-"$rand"
-
-    local n=1
-    local max=5
-    local delay=2
-    local exit_code=1
-
-    while true; do
-        cgexec -g cpu:cpulimit-"$rand" "$@"
-        exit_code=$?
-
-        if [[ $exit_code -eq 0 ]]; then
-            break
-        elif [[ $n -lt $max ]]; then
-            ((n++))
-            log "Command failed. Attempt $n/$max" red
-            sleep $delay
-        else
-            log "The command has failed after $n attempts" yellow
-            break
-        fi
-    done
+    log "Limiting CPU (${cpu_limit}%)" yellow
+
+    if [ -n "${cgroup_dir}" ]; then
+        "$@"
+        return $?
+    fi
+
+    local name="cpulimit-$$-${RANDOM}"
+    local exit_code=0
 
-    cgdelete -g cpu:/cpulimit-"$rand"
+    # The subshell moves itself into the cgroup, then becomes the command
+    (
+        python3 "${repo_dir}/bin/cgroup-governor.py" -m create -n "$name" -p "${BASHPID}" -c "${cpu_limit}" -j "${num_cores}" >/dev/null \
+            || log "Cannot create a cgroup (v2), running without the CPU limit" yellow
+        exec "$@"
+    ) || exit_code=$?
+
+    python3 "${repo_dir}/bin/cgroup-governor.py" -m remove -n "$name" 2>/dev/null || true
     return $exit_code
 }
 
+# Run the whole build in its own cgroup (v2), with the limits of builder.txt
+function governor_start() {
+    [ "${cgroup_governor}" = "yes" ] || return 0
+
+    local args=(-m create -n "${build_id}" -p "$$" -c "${cpu_limit}" -j "${num_cores}")
+
+    if [ -n "${cgroup_parent}" ]; then
+        args+=(-P "${cgroup_parent}")
+    fi
+
+    if [ -n "${cgroup_cpuset}" ]; then
+        args+=(-C "${cgroup_cpuset}")
+    fi
+
+    if [ -n "${cgroup_memory_high}" ]; then
+        args+=(-H "${cgroup_memory_high}")
+    fi
+
+    if [ -n "${cgroup_memory_max}" ]; then
+        args+=(-M "${cgroup_memory_max}")
+    fi
+
+    if [ -n "${cgroup_io_max}" ]; then
+        args+=(-I "${cgroup_io_max}")
+    fi
+
+    # To move the build back, before its cgroup is removed
+    cgroup_origin=$(sed -n 's/^0:://p' /proc/$$/cgroup)
+
+    if cgroup_dir=$(python3 "${repo_dir}/bin/cgroup-governor.py" "${args[@]}"); then
+        log "Build cgroup:${colour_reset} ${cgroup_dir}" green
+    else
+        log "Cannot create the build cgroup (v2), running without its limits" yellow
+        cgroup_dir=""
+    fi
+}
+
+# What the build used (as cgroup_* variables, and in the telemetry file), and remove its cgroup
+function governor_stop() {
+    [ -n "${cgroup_dir}" ] || return 0
+
+    local args=(-m stats -n "${build_id}" -P "$(dirname "${cgroup_dir}")" -e)
+    local cgroup_stats
+
+    if [ "${telemetry:-}" = "yes" ]; then
+        args+=(-o "${telemetry_file}")
+    fi
+
+    if cgroup_stats=$(python3 "${repo_dir}/bin/cgroup-governor.py" "${args[@]}"); then
+        eval "${cgroup_stats}"
+        log "Build used:${colour_reset} CPU $(( cgroup_cpu_usec / 1000000 ))s (throttled $(( cgroup_throttled_usec / 1000000 ))s), memory peak $(( cgroup_memory_peak / 1048576 )) MiB, read $(( cgroup_read_bytes / 1048576 )) MiB, written $(( cgroup_write_bytes / 1048576 )) MiB" green
+    fi
+
+    python3 "${repo_dir}/bin/cgroup-governor.py" -m remove -n "${build_id}" -P "$(dirname "${cgroup_dir}")" -O "${cgroup_origin}" \
+        || log "Cannot remove the build cgroup: ${cgroup_dir}" yellow
+    cgroup_dir=""
+}
+
+# Stub the tools of the architecture independent steps, before the packages are installed
+function native_steps_divert() {
+    [ "${native_steps}" = "yes" ] || return 0
+
+    python3 "${repo_dir}/bin/native-steps.py" -m divert -d "${work_dir}" -a "${architecture}" \
+        || log "Cannot divert the native steps, they run in the chroot" yellow
+}
+
+# Run the architecture independent steps: with the host's tools where its output is the same, else in the chroot
+function native_steps() {
+    local state_file="${base_dir}/native-steps.json"
+    local args=(-m run -d "${work_dir}" -a "${architecture}")
+    local emulated
+
+    if [ "${native_steps}" != "yes" ]; then
+        chroot_exec <<<"command fc-cache && fc-cache -frs"
+
+        return 0
+    fi
+
+    if [ "${native_steps_check}" = "yes" ]; then
+        args+=(-c -S "${state_file}")
+    fi
+
+    emulated=$(python3 "${repo_dir}/bin/native-steps.py" "${args[@]}")
+
+    if [ -n "${emulated}" ]; then
+        chroot_exec <<<"${emulated}"
+    fi
+
+    if [ "${native_steps_check}" = "yes" ]; then
+        python3 "${repo_dir}/bin/native-steps.py" -m compare -d "${work_dir}" -S "${state_file}" -o "${repo_dir}/logs/native-steps.jsonl" \
+            || log "The native steps differ from the chroot's, see: ${repo_dir}/logs/native-steps.jsonl" yellow
+    fi
+}
+
+# Record the caches made at build time in the manifest first boot checks, see ./bsp/scripts/firstboot-caches
+function firstboot_caches() {
+    [ "${firstboot_caches}" = "yes" ] || return 0
+
+    if [ "${firstboot_caches_verify}" = "yes" ]; then
+        chroot_exec <<<"firstboot-caches record && firstboot-caches verify"
+
+    else
+        chroot_exec <<<"firstboot-caches record"
+
+    fi
+}
+
 function sources_list() {
     # Define sources.list
     log "✅ define sources.list" green
@@ -357,6 +555,12 @@ function sources_list() {
 deb ${mirror} ${suite} ${components//,/ }
 #deb-src ${mirror} ${suite} ${components//,/ }
 EOF
+
+    # Offline build, the package cache is mounted by chroot_exec (restore_mirror puts the mirror back)
+    if [ "${deb_cache_offline}" = "yes" ]; then
+        log "Using the package cache as the only APT source (offline)" gray
+        echo "deb [trusted=yes] file:///srv/deb-cache ${suite} ${components//,/ }" >"${work_dir}"/etc/apt/sources.list
+    fi
 }
 
 # Choose a locale
@@ -472,10 +676,26 @@ function print_config() {
 
 # Calculate the space to create the image and create.
 function make_image() {
+    # Nothing newer than SOURCE_DATE_EPOCH, since ./common.d/clean_system.sh (deterministic="yes")
+    clamp_mtimes
+
+    # Index what is in the rootfs (./bin/rootfs-index.py -m report -I images/ compares the images)
+    if [ "${rootfs_index}" = "yes" ]; then
+        status "Index rootfs: ${image_name}.img.index"
+        python3 "${repo_dir}/bin/rootfs-index.py" -m index -d "${work_dir}" -o "${image_dir}/${image_name}.img.index" \
+            -n "${hw_model}-${variant}" -a "${architecture}" -C "${repo_dir}/cache/rootfs-index" -j "${num_cores}"
+    fi
+
     # Calculate the space to create the image.
-    root_size=$(du -s -B1 "${work_dir}" --exclude="${work_dir}"/boot | cut -f1)
-    root_extra=$((root_size / 1000))
-    raw_size=$(( (root_size / 1024) + (free_space * 1024) + (root_extra / 1024)  + (bootsize * 1024) + 4))
+    if [ "${root_sizing}" = "model" ]; then
+        # Smallest root filesystem (KiB) mkfs_partitions() will fit the rootfs and free_space in
+        root_kib=$(python3 "${repo_dir}/bin/rootfs-size.py" -d "${work_dir}" -e boot -t "${rootfstype:-$fstype}" -f "${free_space}" -m "${root_margin}")
+        raw_size=$(( root_kib + (bootsize * 1024) + 4))
+    else
+        root_size=$(du -s -B1 "${work_dir}" --exclude="${work_dir}"/boot | cut -f1)
+        root_extra=$((root_size / 1000))
+        raw_size=$(( (root_size / 1024) + (free_space * 1024) + (root_extra / 1024)  + (bootsize * 1024) + 4))
+    fi
     padding=$(( (512 - (raw_size % 512)) % 512 ))
     padded_size=$(( raw_size + padding ))
     img_size=$(echo "${padded_size}"Ki | numfmt --from=iec-i --to=si)
@@ -511,10 +731,71 @@ function ensure_loopdevice() {
     return 1
 }
 
+# A UUID derived from deterministic_seed & a name (deterministic="yes"), else a random one
+function seeded_uuid() {
+    local hash
+
+    if [ "${deterministic}" != "yes" ]; then
+        cat </proc/sys/kernel/random/uuid
+
+        return 0
+    fi
+
+    hash=$(printf '%s/%s' "${deterministic_seed}" "$1" | sha1sum)
+    printf '%s-%s-5%s-%x%s-%s\n' "${hash:0:8}" "${hash:8:4}" "${hash:13:3}" $(( (0x${hash:16:1} & 0x3) | 0x8 )) "${hash:17:3}" "${hash:20:12}"
+}
+
+# Replace the random IDs parted gave the partition table (deterministic="yes")
+function seed_partition_table() {
+    local img="$1"
+    local num
+
+    [ "${deterministic}" = "yes" ] || return 0
+
+    case "$(blkid -o value -s PTTYPE "$img")" in
+        dos)
+            sfdisk -q --disk-id "$img" "0x$(seeded_uuid disk | cut -c1-8)" ;;
+
+        gpt)
+            sfdisk -q --disk-id "$img" "$(seeded_uuid disk)"
+
+            for num in $(sfdisk -d "$img" | sed -n "s|^${img}\([0-9]*\) :.*|\1|p"); do
+                sfdisk -q --part-uuid "$img" "$num" "$(seeded_uuid "partuuid-${num}")"
+            done ;;
+
+    esac
+}
+
+# No file of the rootfs newer than SOURCE_DATE_EPOCH (deterministic="yes")
+function clamp_mtimes() {
+    [ "${deterministic}" = "yes" ] || return 0
+
+    find "${work_dir}" -xdev -newermt "@${SOURCE_DATE_EPOCH}" -exec touch -h -d "@${SOURCE_DATE_EPOCH}" {} +
+}
+
+# Remove what differs between two builds of the same inputs from the rootfs (deterministic="yes")
+function deterministic_rootfs() {
+    [ "${deterministic}" = "yes" ] || return 0
+
+    status "Make the rootfs reproducible (SOURCE_DATE_EPOCH=${SOURCE_DATE_EPOCH})"
+
+    # apt's logs are kept otherwise (see ./common.d/clean_system.sh)
+    find "${work_dir}/var/log" -type f ! -empty -exec truncate -s 0 {} +
+
+    # Made again on boot, it has inode numbers & ctimes
+    rm -f "${work_dir}/var/cache/ldconfig/aux-cache"
+
+    # Date of the last password change, in days
+    sed -i -E "s/^([^:]*:[^:]*:)[0-9]+:/\1$(( SOURCE_DATE_EPOCH / 86400 )):/" "${work_dir}"/etc/shadow
+
+    clamp_mtimes
+}
+
 # Set the partition variables
 function make_loop() {
     img="${image_dir}/${image_name}.img"
     num_parts=$(fdisk -l "$img" | grep -c "${img}[1-2]")
+    seed_partition_table "$img"
 
     if [ "$num_parts" = "2" ]; then
         extra=1
@@ -530,11 +811,11 @@ function make_loop() {
         fi
 
         if [[ "$bootfstype" == "vfat" ]]; then
-            boot_uuid_n="$(cat < /proc/sys/kernel/random/uuid | cut -d- -f2-3)"
+            boot_uuid_n="$(seeded_uuid boot | cut -d- -f2-3)"
             boot_uuid="$(echo "$boot_uuid_n" | tr '[:lower:]' '[:upper:]')"
             boot_uuid_n="$(echo "$boot_uuid_n" | tr -d -)"
         else
-            boot_uuid="$(cat < /proc/sys/kernel/random/uuid)"
+            boot_uuid="$(seeded_uuid boot)"
         fi
 
         rootfstype=${rootfstype:-"$fstype"}
@@ -557,6 +838,83 @@ function make_loop() {
     fi
 }
 
+# Set the partition variables for the rootless backend (no loop devices)
+# Usage: make_rootless <msdos|gpt> [<boot fstype>:<start>:<end>:<boot dir>] <root fstype>:<start>:<end>
+function make_rootless() {
+    img="${image_dir}/${image_name}.img"
+    part_label="$1"; shift
+    local root_num=1
+    local seed=""
+    disk_id="$(seeded_uuid disk | tr -d - | head -c8)"
+    assemble_args=(-i "$img" -w "${work_dir}" -l "$part_label" -t "${base_dir}")
+    [ "$part_label" = "msdos" ] && assemble_args+=(-d "$disk_id")
+
+    if [ "${deterministic}" = "yes" ]; then
+        [ "$part_label" = "gpt" ] && assemble_args+=(-d "$(seeded_uuid disk)")
+        seed=",seed=$(seeded_uuid seed)"
+    fi
+
+    if [ "$#" = "2" ]; then
+        IFS=: read -r bootfstype boot_start boot_end boot_dir <<<"$1"
+        shift
+
+        if [[ "$bootfstype" == "vfat" ]]; then
+            boot_uuid_n="$(seeded_uuid boot | cut -d- -f2-3)"
+            boot_uuid="$(echo "$boot_uuid_n" | tr '[:lower:]' '[:upper:]')"
+            boot_uuid_n="$(echo "$boot_uuid_n" | tr -d -)"
+        else
+            boot_uuid="$(seeded_uuid boot)"
+        fi
+
+        bootp="${base_dir}/boot.part"
+        root_num=2
+        assemble_args+=(-p "name=boot,fs=${bootfstype},start=${boot_start},end=${boot_end},dir=${boot_dir:-boot},uuid=${boot_uuid},label=BOOT,partuuid=$(seeded_uuid partuuid-1)${seed}")
+    fi
+
+    IFS=: read -r rootfstype root_start root_end <<<"$1"
+    rootfstype=${rootfstype:-"$fstype"}
+    rootp="${base_dir}/root.part"
+    assemble_args+=(-p "name=root,fs=${rootfstype},start=${root_start},end=${root_end},dir=/,uuid=${root_uuid},label=ROOTFS,partuuid=$(seeded_uuid "partuuid-${root_num}")${seed}")
+
+    if [ "$part_label" = "msdos" ]; then
+        root_partuuid="${disk_id}-0${root_num}"
+    fi
+}
+
+# Build the filesystems from work_dir and write them into the image (rootless backend)
+function assemble_image() {
+    status "Assemble image file (rootless)"
+    python3 "${repo_dir}/bin/assemble-image.py" "${assemble_args[@]}"
+}
+
+# Copy the rootfs into the mounted image file (parallel, keeps hardlinks, xattrs & ownership)
+# Usage: copy_rootfs <source> <destination> [<exclude> ...]
+function copy_rootfs() {
+    local src="$1"
+    local dest="$2"
+    local excludes=()
+    shift 2
+
+    for path in "$@"; do
+        excludes+=(-e "$path")
+    done
+
+    # One thread: the files are made (inodes & blocks allocated) in the same order every build
+    if [ "${deterministic}" = "yes" ]; then
+        copy_threads=1
+    fi
+
+    python3 "${repo_dir}/bin/copy-tree.py" -s "$src" -d "$dest" "${excludes[@]}" -j "${copy_threads:-$(nproc)}"
+}
+
+# Copy directory bsp into build dir, with the firmware trees materialised from
+# the blob store (hardlinks when they can be), see ./bin/blob-store.py
+function copy_bsp() {
+    mkdir -p "${work_dir}/bsp"
+    find "${repo_dir}/bsp" -mindepth 1 -maxdepth 1 ! -name blobs -exec cp -rp {} "${work_dir}/bsp/" \;
+    python3 "${repo_dir}/bin/blob-store.py" -m materialise -s "${repo_dir}/bsp" -d "${work_dir}/bsp"
+}
+
 # Create fstab file.
 function make_fstab() {
     status "Create /etc/fstab"
@@ -584,6 +942,11 @@ EOF
 
 # Create file systems
 function mkfs_partitions() {
+    local seed=()
+
+    # The directory hash seed is random otherwise
+    [ "${deterministic}" = "yes" ] && seed=(-E "hash_seed=$(seeded_uuid seed)")
+
     status "Formatting partitions"
     # Formatting boot partition.
     if [ -n "${bootp}" ]; then
@@ -593,11 +956,11 @@ function mkfs_partitions() {
 
             ext4)
                 features="^64bit,^metadata_csum";
-                mkfs -U "$boot_uuid" -O "$features" -t "$fstype" -L BOOT "${bootp}" ;;
+                mkfs -U "$boot_uuid" -O "$features" "${seed[@]}" -t "$fstype" -L BOOT "${bootp}" ;;
 
             ext2 | ext3)
                 features="^64bit"
-                mkfs -U "$boot_uuid" -O "$features" -t "$fstype" -L BOOT "${bootp}" ;;
+                mkfs -U "$boot_uuid" -O "$features" "${seed[@]}" -t "$fstype" -L BOOT "${bootp}" ;;
 
         esac
 
@@ -616,7 +979,7 @@ function mkfs_partitions() {
 
         esac
 
-        yes | mkfs -U "$root_uuid" -O "$features" -t "$fstype" -L ROOTFS "${rootp}"
+        yes | mkfs -U "$root_uuid" -O "$features" "${seed[@]}" -t "$fstype" -L ROOTFS "${rootp}"
         root_partuuid=$(blkid -s PARTUUID -o value ${rootp})
         rootfstype=$(blkid -o value -s TYPE $rootp)
 
@@ -625,19 +988,38 @@ function mkfs_partitions() {
 
 # Compress image compilation
 function compress_img() {
-    if [ "${compress:=}" = xz ]; then
-        status "Compressing file: ${image_name}.img"
+    local backend="${compress:=}"
+    local level="${compress_level:-}"
+
+    # Benchmark the backends on this image, and use the one the policy picks
+    if [ "${backend}" = auto ]; then
+        status "Benchmarking compression: ${image_name}.img"
+        local choice
+        choice=$(python3 "${repo_dir}/bin/compress-bench.py" -f "${image_dir}/${image_name}.img" -c "${compress_candidates}" \
+            -p "${compress_policy}" -b "${xz_blocksize:-16}" -j "${num_cores:=}" -o "${repo_dir}/logs/compress-bench.jsonl")
+        backend="${choice%%:*}"
+        level="${choice#*:}"
+    fi
 
-        if [ "$(arch)" == 'x86_64' ] || [ "$(arch)" == 'aarch64' ]; then
-            limit_cpu pixz -p "${num_cores:=}" "${image_dir}/${image_name}.img" # -p Nº cpu cores use
+    if [ "${backend}" = xz ]; then
+        status "Compressing file: ${image_name}.img (xz -${level:-6})"
 
-        else
-            xz --memlimit-compress=50% -T "$num_cores" "${image_dir}/${image_name}.img" # -T Nº cpu cores use
-
-        fi
+        # Same block layout on every host, so the image can be read back in parallel (see ./bin/xz-blocks.py)
+        limit_cpu python3 "${repo_dir}/bin/xz-blocks.py" -m compress -f "${image_dir}/${image_name}.img" \
+            -b "${xz_blocksize:-16}" -l "${level:-6}" -j "${num_cores:=}" # -j Nº cpu cores use
+        rm -f "${image_dir}/${image_name}.img"
 
         img="${image_dir}/${image_name}.img.xz"
 
+    elif [ "${backend}" = zstd ]; then
+        status "Compressing file: ${image_name}.img (zstd -${level:-19})"
+
+        # Levels above 19 need --ultra
+        limit_cpu zstd -q -T"${num_cores:=}" -"${level:-19}" $([ "${level:-19}" -gt 19 ] && echo --ultra) \
+            --rm "${image_dir}/${image_name}.img" # -T Nº cpu cores use
+
+        img="${image_dir}/${image_name}.img.zst"
+
     fi
 
     chmod 0644 "$img"
@@ -671,7 +1053,7 @@ function umount_partitions() {
     # Define possible mounted points
     # This function is called both if success and failed
     # If we fail early in the process, then work_dir may still have proc mounted
-    possible_mounts=("${base_dir}/root/boot" "${base_dir}/root/boot/firmware" "${base_dir}/root/proc" "${work_dir}/proc")
+    possible_mounts=("${base_dir}/root/boot" "${base_dir}/root/boot/firmware" "${base_dir}/root/proc" "${work_dir}/proc" "${work_dir}/srv/deb-cache")
 
     # Unmount boot partitions if they exist
     for mount in "${possible_mounts[@]}"; do
@@ -708,6 +1090,8 @@ function clean_build() {
 
     # Done
     log "Done" green
+    telemetry_stage ""
+    governor_stop
     total_time $SECONDS
 }
 
@@ -718,9 +1102,60 @@ function check_trap() {
     exit 1
 }
 
+# Append a stage record to the telemetry file (JSON lines)
+# Counters are cumulative for the build (this shell and all of its finished children)
+function telemetry() {
+    [ "${telemetry:-}" = "yes" ] || return 0
+
+    local event="$1"
+    local stage="$2"
+    local step="$3"
+    local stat key value read_bytes=0 write_bytes=0
+    local now="${EPOCHREALTIME:-$(date +%s.%N)}"
+
+    # EPOCHREALTIME has the locale's decimal point, JSON needs a dot
+    now="${now/,/.}"
+
+    stat=$(< /proc/$$/stat)
+    stat=(${stat##*) })
+
+    if [ -r /proc/$$/io ]; then
+        while read -r key value; do
+            case $key in
+                read_bytes:) read_bytes=$value ;;
+                write_bytes:) write_bytes=$value ;;
+            esac
+        done < /proc/$$/io
+    fi
+
+    stage="${stage//\\/\\\\}"
+    stage="${stage//\"/\\\"}"
+
+    mkdir -p "$(dirname "${telemetry_file}")"
+    printf '{"event":"%s","stage":"%s","step":%d,"build":"%s","board":"%s","arch":"%s","variant":"%s","image":"%s","host":"%s","cores":%d,"time":%s,"hz":%d,"cpu_user":%d,"cpu_sys":%d,"read_bytes":%d,"write_bytes":%d}\n' \
+        "$event" "$stage" "$step" "${build_id}" "${hw_model}" "${architecture}" "${variant}" "${image_name}" \
+        "${HOSTNAME}" "$(nproc)" "${now}" "$(getconf CLK_TCK)" \
+        $(( stat[11] + stat[13] )) $(( stat[12] + stat[14] )) "$read_bytes" "$write_bytes" >>"${telemetry_file}"
+}
+
+# End the current stage (if any) and start the next one (empty to end the build)
+function telemetry_stage() {
+    if [ -n "${telemetry_current}" ]; then
+        telemetry end "${telemetry_current}" "${telemetry_step}"
+    fi
+
+    telemetry_current="$1"
+    telemetry_step="${status_i}"
+
+    if [ -n "${telemetry_current}" ]; then
+        telemetry start "${telemetry_current}" "${telemetry_step}"
+    fi
+}
+
 # Show progress
 function status() {
     status_i=$((status_i + 1))
+    telemetry_stage "$1"
     [[ $debug = 1 ]] && timestamp="($(date +"%Y-%m-%d %H:%M:%S"))" || timestamp=""
     log "✅ ${status_i}/${status_t}:${colour_reset} $1 $timestamp" green
 }
@@ -7,7 +7,7 @@ EOF
 
 # Copy a default config, with everything commented out so people find it when
 # they go to add something when they are following instructions on a website.
-cp ./bsp/firmware/rpi/config.txt "${work_dir}"/boot/firmware/config.txt
+cp "${work_dir}"/bsp/firmware/rpi/config.txt "${work_dir}"/boot/firmware/config.txt
 echo -e "DO NOT EDIT THIS FILE\n\nThe file you are looking for has moved to /boot/firmware/config.txt" > "${work_dir}"/boot/config.txt
 
 # Copy in the udev rules to deal with Pi devices
@@ -1,6 +1,15 @@
 #!/usr/bin/env bash
 
 # Third stage
+# Keep the downloaded packages for the package cache, before apt-get clean removes them
+if [ "${deb_cache}" = "yes" ]; then
+  cat <<EOF >> "${work_dir}"/third-stage
+status_stage3 'Keep downloaded packages for the package cache'
+mkdir -p /var/cache/apt/deb-cache
+find /var/cache/apt/archives -maxdepth 1 -name '*.deb' -exec ln -f -t /var/cache/apt/deb-cache {} +
+EOF
+fi
+
 cat <<EOF >> "${work_dir}"/third-stage
 status_stage3 'Clean up apt-get'
 eatmydata apt-get -y --purge autoremove
@@ -9,6 +18,8 @@ EOF
 
 # Run third stage
 chmod 0755 "${work_dir}/third-stage"
+deb_cache_seed
 status "Run third stage"
 #systemd-nspawn_exec /third-stage
 chroot_exec /third-stage
+deb_cache_collect
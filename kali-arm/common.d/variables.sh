@@ -25,6 +25,11 @@ image_name=${image_name:-"kali-linux-${version}-${hw_model}-${variant}"}
 # Generate a random machine name to be used
 machine=$(dbus-uuidgen)
 
+# Build stage telemetry (yes or no), JSON lines appended to telemetry_file (see ./bin/build-report.py)
+telemetry="${telemetry:-no}"
+telemetry_file="${telemetry_file:-${repo_dir}/logs/telemetry.jsonl}"
+build_id="${image_name}-$(date +%s)"
+
 # Custom hostname variable
 hostname=${hostname:-kali}
 
@@ -45,15 +50,57 @@ free_space="${free_space:-1024}"
 # /boot partition in MiB
 bootsize="${bootsize:-256}"
 
-# Select compression, xz or none
+# Index the rootfs (path, mode, owner, size & hash of every file) in images/<image>.img.index (yes or no)
+rootfs_index="${rootfs_index:-no}"
+
+# Root filesystem sizing: du (rootfs size + 0.1%) or model (ext2/3/4 overhead modelled, ./bin/rootfs-size.py)
+root_sizing="${root_sizing:-du}"
+
+# root_sizing="model": safety margin on top of the rootfs, in %
+root_margin="${root_margin:-5}"
+
+# Punch holes over the free blocks of the image's ext2/3/4 partitions, before the checksum & compression (yes or no)
+punch_holes="${punch_holes:-yes}"
+
+# Select compression: xz, zstd, none or auto (benchmark the candidates on the image, pick by policy)
 compress="xz"
 
+# Compression level (default: xz 6, zstd 19)
+compress_level="${compress_level:-}"
+
+# For compress="auto": backend:level to try, and the policy (ratio, ratio:<max minutes> or time)
+compress_candidates="${compress_candidates:-xz:6,xz:9,zstd:3,zstd:19}"
+compress_policy="${compress_policy:-ratio:60}"
+
+# Size of the independently decodable xz blocks, in MiB
+xz_blocksize="${xz_blocksize:-16}"
+
 # Choose filesystem format to format root partition (ext3 or ext4).
 fstype="ext4"
 
+# Kernel build cache (yes or no) for build-scripts which compile a kernel, see ./bin/kernel-cache.py
+kernel_cache="${kernel_cache:-no}"
+kernel_cache_dir="${kernel_cache_dir:-${repo_dir}/cache/kernel}"
+kernel_cache_size="${kernel_cache_size:-50G}"
+
+# Shared package cache (yes or no) for all builds on this host, see ./bin/deb-cache.py
+# deb_cache_offline="yes" builds from the cached packages only, without the mirror
+deb_cache="${deb_cache:-no}"
+deb_cache_offline="${deb_cache_offline:-no}"
+deb_cache_dir="${deb_cache_dir:-${repo_dir}/cache/deb}"
+deb_cache_size="${deb_cache_size:-20G}"
+
+# Image assembly backend, loop (losetup, mount & rsync) or rootless (mkfs -d, no loop devices)
+# rootless is only used by build-scripts which support it, others always use loop
+image_backend="${image_backend:-loop}"
+
 # Generate a random root partition UUID to be used
 root_uuid=$(cat </proc/sys/kernel/random/uuid | less)
 
+# Reproducible images (yes or no): the same inputs give the same image, see ./bin/reproducible.py
+# Timestamps come from SOURCE_DATE_EPOCH (default: the last commit), UUIDs & seeds from deterministic_seed (default: the image name)
+deterministic="${deterministic:-no}"
+
 # Disable IPv6 (yes or no)
 disable_ipv6="yes"
 
@@ -69,6 +116,31 @@ cpu_cores="4"
 # 1 -> 100. 10 = percentage use, 50, 75, 90, etc
 cpu_limit="-1"
 
+# Run the whole build in its own cgroup (v2), so builds sharing a host do not starve each other (yes or no)
+# cpu_limit (of num_cores) is its cpu.max, and the other limits are unset if empty
+cgroup_governor="${cgroup_governor:-no}"
+
+# Delegated cgroup the builds' cgroups are made in (default: kali-arm, at the top of the hierarchy)
+cgroup_parent="${cgroup_parent:-}"
+
+# cpuset.cpus, memory.high & memory.max (e.g. 8G), io.max ("<path or MAJ:MIN> rbps=200M wbps=200M")
+cgroup_cpuset="${cgroup_cpuset:-}"
+cgroup_memory_high="${cgroup_memory_high:-}"
+cgroup_memory_max="${cgroup_memory_max:-}"
+cgroup_io_max="${cgroup_io_max:-}"
+
+# Run the architecture independent steps (fontconfig, mime, glib schemas, icon caches & locales) with the host's tools (yes or no)
+# rather than in the chroot under qemu-user, where the host's output is the same (./bin/native-steps.py)
+native_steps="${native_steps:-yes}"
+
+# Also run them in the chroot, and log any difference with the host's output to logs/native-steps.jsonl (yes or no)
+native_steps_check="${native_steps_check:-no}"
+
+# Make the caches first boot would rebuild (X fonts, mime, CA certificates & fonts) at build time (yes or no)
+# Verify: run them again in the chroot as first boot would, and leave the ones which differ to first boot (yes or no)
+firstboot_caches="${firstboot_caches:-yes}"
+firstboot_caches_verify="${firstboot_caches_verify:-yes}"
+
 # If you have your own preferred mirrors, set them here
 mirror=${mirror:-"http://http.kali.org/kali"}
 
@@ -107,6 +179,17 @@ if [ -f "${repo_dir}"/builder.txt ]; then
 
 fi
 
+# Reproducible images: derived after builder.txt, which may set them
+if [ "${deterministic}" = "yes" ]; then
+  SOURCE_DATE_EPOCH="${SOURCE_DATE_EPOCH:-$(git -C "${repo_dir}" log -1 --format=%ct 2>/dev/null || stat -c %Y "${repo_dir}/.release")}"
+  deterministic_seed="${deterministic_seed:-${image_name}}"
+  root_uuid=$(seeded_uuid root)
+
+  # mke2fs & e2fsck write the time into the filesystems
+  export SOURCE_DATE_EPOCH E2FSPROGS_FAKE_TIME="${SOURCE_DATE_EPOCH}" E2FSCK_TIME="${SOURCE_DATE_EPOCH}"
+
+fi
+
 # In case `su` was used
 PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin
 
@@ -107,7 +107,7 @@ mkdir -p "${base_dir}"/root/boot
 mount "${bootp}" "${base_dir}"/root/boot
 
 echo "Rsyncing rootfs to image file"
-rsync -HPavz -q ${work_dir}/ ${base_dir}/root/
+copy_rootfs "${work_dir}" "${base_dir}"/root
 
 cd "${base_dir}"/u-boot-sunxi/
 
@@ -80,8 +80,8 @@ status "Set the default options in /etc/default/u-boot"
 echo 'U_BOOT_MENU_LABEL="Kali Linux"' >>${work_dir}/etc/default/u-boot
 echo 'U_BOOT_PARAMETERS="console=tty1 consoleblank=0 ro rootwait"' >>${work_dir}/etc/default/u-boot
 
-status "Rsyncing rootfs into image file"
-rsync -HPavz -q ${work_dir}/ ${base_dir}/root/
+status "Copying rootfs into image file"
+copy_rootfs "${work_dir}" "${base_dir}"/root
 sync
 
 status "dd to ${loopdevice} (u-boot bootloader)"
@@ -127,8 +127,8 @@ status "Create the dirs for the partitions and mount them"
 mkdir -p "${base_dir}"/root/
 mount "${rootp}" "${base_dir}"/root
 
-echo "Rsyncing rootfs into image file"
-rsync -HPavz -q ${work_dir}/ ${base_dir}/root/
+echo "Copying rootfs into image file"
+copy_rootfs "${work_dir}" "${base_dir}"/root
 
 # Load default finish_image configs
 include finish_image
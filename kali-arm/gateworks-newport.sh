@@ -55,7 +55,7 @@ cd "${base_dir}/"
 
 # Do the kernel stuff
 status "Kernel stuff"
-git clone --depth 1 -b v5.15.15-newport https://github.com/gateworks/linux-newport "${work_dir}"/usr/src/kernel
+kernel_clone https://github.com/gateworks/linux-newport v5.15.15-newport "${work_dir}"/usr/src/kernel
 cd "${work_dir}"/usr/src/kernel
 
 # Don't change the version because of our patches
@@ -64,6 +64,7 @@ export ARCH=arm64
 export CROSS_COMPILE=aarch64-linux-gnu-
 patch -p1 <"${repo_dir}"/patches/kali-wifi-injection-5.15.patch
 patch -p1 <"${repo_dir}"/patches/0001-wireless-carl9170-Enable-sniffer-mode-promisc-flag-t.patch
+kernel_cache_start newport_defconfig "${repo_dir}"/patches/kali-wifi-injection-5.15.patch "${repo_dir}"/patches/0001-wireless-carl9170-Enable-sniffer-mode-promisc-flag-t.patch
 #build
 make -j $(grep -c processor /proc/cpuinfo) newport_defconfig
 make -j $(grep -c processor /proc/cpuinfo)
@@ -81,6 +82,7 @@ git clone --depth 1 https://github.com/cryptodev-linux/cryptodev-linux "${work_d
 cd "${work_dir}"/usr/src
 make -C cryptodev-linux KERNEL_DIR="${work_dir}"/usr/src/kernel
 make -C cryptodev-linux KERNEL_DIR="${work_dir}"/usr/src/kernel DESTDIR="${work_dir}" INSTALL_MOD_PATH="${work_dir}" install
+kernel_cache_finish
 
 # Cleanup
 cd "${work_dir}"/usr/src/kernel
@@ -139,8 +141,8 @@ else
 
 fi
 
-status "Rsyncing rootfs into image file"
-rsync -HPavz -q ${work_dir}/ ${base_dir}/root/
+status "Copying rootfs into image file"
+copy_rootfs "${work_dir}" "${base_dir}"/root
 sync
 
 status "Make sure second partition is not marked as bootable"
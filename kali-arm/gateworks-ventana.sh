@@ -152,8 +152,8 @@ else
 
 fi
 
-status "Rsyncing rootfs into image file"
-rsync -HPavz -q "${work_dir}"/ "${base_dir}"/root/
+status "Copying rootfs into image file"
+copy_rootfs "${work_dir}" "${base_dir}"/root
 sync
 
 # Load default finish_image configs
@@ -114,8 +114,8 @@ mount "${rootp}" "${base_dir}"/root
 mkdir -p "${base_dir}"/root/boot
 mount "${bootp}" "${base_dir}"/root/boot
 
-status "Rsyncing rootfs into image file"
-rsync -HPavz -q "${work_dir}"/ "${base_dir}"/root/
+status "Copying rootfs into image file"
+copy_rootfs "${work_dir}" "${base_dir}"/root
 sync
 
 # Samsung bootloaders must be signed
@@ -152,8 +152,8 @@ fi
 mkdir -p "${base_dir}"/root/boot/firmware
 mount "${bootp}" "${base_dir}"/root/boot/firmware
 
-status "Rsyncing rootfs into image file"
-rsync -HPavz -q --exclude boot/firmware "${work_dir}"/ "${base_dir}"/root/
+status "Copying rootfs into image file"
+copy_rootfs "${work_dir}" "${base_dir}"/root boot/firmware
 sync
 
 status "Rsyncing rootfs into image file (/boot)"
@@ -125,17 +125,24 @@ include clean_system
 # Calculate the space to create the image and create
 make_image
 
-# Create the disk partitions
-status "Create the disk partitions"
-parted -s "${image_dir}/${image_name}.img" mklabel msdos
-parted -s "${image_dir}/${image_name}.img" mkpart primary fat32 1MiB "${bootsize}"MiB
-parted -s -a minimal "${image_dir}/${image_name}.img" mkpart primary "$fstype" "${bootsize}"MiB 100%
+if [ "${image_backend}" = "rootless" ]; then
+    # Set the partition variables (the partitions are written by finish_image)
+    make_rootless msdos "vfat:1MiB:${bootsize}MiB:boot/firmware" "${fstype}:${bootsize}MiB:100%"
 
-# Set the partition variables
-make_loop
+else
+    # Create the disk partitions
+    status "Create the disk partitions"
+    parted -s "${image_dir}/${image_name}.img" mklabel msdos
+    parted -s "${image_dir}/${image_name}.img" mkpart primary fat32 1MiB "${bootsize}"MiB
+    parted -s -a minimal "${image_dir}/${image_name}.img" mkpart primary "$fstype" "${bootsize}"MiB 100%
+
+    # Set the partition variables
+    make_loop
 
-# Create file systems
-mkfs_partitions
+    # Create file systems
+    mkfs_partitions
+
+fi
 
 # Make fstab
 make_fstab
@@ -148,28 +155,31 @@ sed -i -e 's/net.ifnames=0/net.ifnames=0 ds=nocloud/' "${work_dir}"/boot/firmwar
 # RaspberryPi devices mount the first partition on /boot/firmware
 sed -i -e 's|/boot|/boot/firmware|' "${work_dir}"/etc/fstab
 
-# Create the dirs for the partitions and mount them
-status "Create the dirs for the partitions and mount them"
-mkdir -p "${base_dir}"/root/
+if [ "${image_backend}" != "rootless" ]; then
+    # Create the dirs for the partitions and mount them
+    status "Create the dirs for the partitions and mount them"
+    mkdir -p "${base_dir}"/root/
 
-if [[ $fstype == ext4 ]]; then
-    mount -t ext4 -o noatime,data=writeback,barrier=0 "${rootp}" "${base_dir}"/root
+    if [[ $fstype == ext4 ]]; then
+        mount -t ext4 -o noatime,data=writeback,barrier=0 "${rootp}" "${base_dir}"/root
 
-else
-    mount "${rootp}" "${base_dir}"/root
+    else
+        mount "${rootp}" "${base_dir}"/root
 
-fi
+    fi
 
-mkdir -p "${base_dir}"/root/boot/firmware
-mount "${bootp}" "${base_dir}"/root/boot/firmware
+    mkdir -p "${base_dir}"/root/boot/firmware
+    mount "${bootp}" "${base_dir}"/root/boot/firmware
 
-status "Rsyncing rootfs into image file"
-rsync -HPavz -q --exclude boot/firmware "${work_dir}"/ "${base_dir}"/root/
-sync
+    status "Copying rootfs into image file"
+    copy_rootfs "${work_dir}" "${base_dir}"/root boot/firmware
+    sync
 
-status "Rsyncing boot into image file (/boot)"
-rsync -rtx -q "${work_dir}"/boot/firmware "${base_dir}"/root/boot
-sync
+    status "Rsyncing boot into image file (/boot)"
+    rsync -rtx -q "${work_dir}"/boot/firmware "${base_dir}"/root/boot
+    sync
+
+fi
 
 # Load default finish_image configs
 include finish_image